@@ -0,0 +1,375 @@
+###############################################################################
+# bipartiteFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for working with the bipartite reaction-metabolite form of a
+# genome's network. adjacencyListFromModel expands each reaction into every
+# (reactant, product) pair, so a reaction with many participants becomes a
+# dense block of edges. Here each genome is instead stored as its incidence:
+# a sparse matrix S (metabolites x reactions, -1 for reactants and +1 for
+# products) and a reversibility mask.
+#
+# In the bipartite graph, a reactant has an edge to its reaction and the
+# reaction has an edge to each product (and the reverse, if the reaction is
+# reversible). A metabolite reaches another in this graph exactly when it does
+# in the expanded graph, so components, SCCs and seed sets computed here are
+# the same as those computed from the adjacency lists. The expanded adjacency
+# lists are only written when exportExpandedGraphs is called.
+################################################################################
+
+# Import Python packages.
+import numpy as np
+import os
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+
+# Import custom Python modules
+import graphFunctions as gf
+import idFunctions as idf
+import ioFunctions as iof
+
+################################################################################
+
+# incidenceFromModel
+# Build the incidence of a cobrapy model. Metabolites are numbered in the order
+# in which they first appear in the adjacency list written by
+# adjacencyListFromModel, so that ties between equally large components are
+# broken the same way as in graphFunctions. Metabolites which would not appear
+# in the adjacency list follow at the end. Within each column of S, entries are
+# kept in model order (reactants, then products).
+# Input: cobrapy model object
+# Output: incidence dictionary with keys 'metabolites', 'reactions', 'S'
+# (scipy CSC matrix), and 'reversible' (boolean numpy array)
+
+def incidenceFromModel(model):
+
+    metabIndex = {}
+    metabList = []
+    entryList = []
+    indptrList = [0]
+    rxnList = []
+    revList = []
+
+    for myRxn in model.reactions:
+        rxnList.append(myRxn.id)
+        revList.append(myRxn.reversibility == True)
+        reactantIds = [myReactant.id for myReactant in myRxn.reactants]
+        productIds = [myProduct.id for myProduct in myRxn.products]
+
+# Order in which adjacencyListFromModel writes the reaction's metabolites
+        orderList = []
+        for reactantId in reactantIds:
+            orderList.append(reactantId)
+            orderList.extend(productIds)
+        if myRxn.reversibility == True:
+            for productId in productIds:
+                orderList.append(productId)
+                orderList.extend(reactantIds)
+        for metabId in orderList:
+            if metabId not in metabIndex:
+                metabIndex[metabId] = len(metabList)
+                metabList.append(metabId)
+
+        entryList.extend((metabId, -1) for metabId in reactantIds)
+        entryList.extend((metabId, 1) for metabId in productIds)
+        indptrList.append(len(entryList))
+
+    for metabId, value in entryList:
+        if metabId not in metabIndex:
+            metabIndex[metabId] = len(metabList)
+            metabList.append(metabId)
+
+    rowArray = np.array([metabIndex[metabId] for metabId, value in entryList], dtype=np.int32)
+    valueArray = np.array([value for metabId, value in entryList], dtype=np.int8)
+    S = sp.csc_matrix((valueArray, rowArray, np.array(indptrList, dtype=np.int32)),
+                      shape=(len(metabList), len(rxnList)))
+
+    return {'metabolites': metabList, 'reactions': rxnList, 'S': S,
+            'reversible': np.array(revList, dtype=bool)}
+
+################################################################################
+
+# writeIncidence, readIncidence
+# Store an incidence as a compressed numpy archive.
+# Input: incidence dictionary (write only), path to the archive
+# Output: None (write), incidence dictionary (read)
+
+def writeIncidence(incidence, fileName):
+    S = incidence['S'].tocsc()
+    np.savez_compressed(fileName, metabolites=np.array(incidence['metabolites']),
+                        reactions=np.array(incidence['reactions']),
+                        data=S.data, indices=S.indices, indptr=S.indptr,
+                        shape=np.array(S.shape), reversible=incidence['reversible'])
+    return
+
+def readIncidence(fileName):
+    with np.load(fileName) as archive:
+        S = sp.csc_matrix((archive['data'], archive['indices'], archive['indptr']),
+                          shape=tuple(archive['shape']))
+        return {'metabolites': archive['metabolites'].tolist(),
+                'reactions': archive['reactions'].tolist(), 'S': S,
+                'reversible': archive['reversible']}
+
+################################################################################
+
+# restrictIncidence
+# Input: incidence dictionary, boolean array over metabolites
+# Output: incidence containing only the selected metabolites. Reactions are
+# kept, but lose their entries for the dropped metabolites.
+
+def restrictIncidence(incidence, metabMask):
+    return {'metabolites': [metab for metab, keep in zip(incidence['metabolites'], metabMask) if keep],
+            'reactions': incidence['reactions'],
+            'S': incidence['S'].tocsr()[np.flatnonzero(metabMask)].tocsc(),
+            'reversible': incidence['reversible']}
+
+################################################################################
+
+# Helper functions for the graph defined by an incidence. A reaction only
+# contributes edges if it has both reactants and products. A metabolite is a
+# node of the expanded graph if it is a reactant of any reaction, or a product
+# of a reaction which has reactants or is reversible; adjacencyListFromModel
+# writes such metabolites even when they have no edges.
+
+def reactionSides(incidence):
+    S = incidence['S'].tocoo()
+    numRxns = S.shape[1]
+    hasReactants = np.bincount(S.col[S.data < 0], minlength=numRxns) > 0
+    hasProducts = np.bincount(S.col[S.data > 0], minlength=numRxns) > 0
+    return S, hasReactants, hasProducts
+
+def graphNodeMask(incidence):
+    S, hasReactants, hasProducts = reactionSides(incidence)
+    entryMask = (S.data < 0) | (hasReactants | incidence['reversible'])[S.col]
+    nodeMask = np.zeros(S.shape[0], dtype=bool)
+    nodeMask[S.row[entryMask]] = True
+    return nodeMask
+
+# bipartiteAdjacency
+# Input: incidence dictionary
+# Output: scipy CSR adjacency matrix of the bipartite digraph. Nodes 0 to
+# (metabolites - 1) are the metabolites, and the reactions follow.
+
+def bipartiteAdjacency(incidence):
+    S, hasReactants, hasProducts = reactionSides(incidence)
+    numMetabs, numRxns = S.shape
+    activeMask = (hasReactants & hasProducts)[S.col]
+    rows = S.row[activeMask]
+    rxnNodes = S.col[activeMask] + numMetabs
+    reactantMask = S.data[activeMask] < 0
+    revMask = incidence['reversible'][S.col[activeMask]]
+
+# Edges from metabolites into reactions, then from reactions to metabolites
+    intoMask = reactantMask | revMask
+    outMask = ~reactantMask | revMask
+    sources = np.concatenate([rows[intoMask], rxnNodes[outMask]])
+    sinks = np.concatenate([rxnNodes[intoMask], rows[outMask]])
+    numNodes = numMetabs + numRxns
+    return sp.csr_matrix((np.ones(len(sources), dtype=bool), (sources, sinks)),
+                         shape=(numNodes, numNodes))
+
+# expandedEdgeCounts
+# Count the distinct edges of the expanded graph between the selected
+# metabolites, without writing them out. The counts are taken from sparse
+# products of the reactant and product blocks of S.
+# Input: incidence dictionary, boolean array over metabolites
+# Output: number of directed edges, number of undirected edges
+
+def expandedEdgeCounts(incidence, metabMask):
+    S, hasReactants, hasProducts = reactionSides(incidence)
+    keepMask = metabMask[S.row] & (hasReactants & hasProducts)[S.col]
+    reactantMask = keepMask & (S.data < 0)
+    productMask = keepMask & (S.data > 0)
+    revMask = incidence['reversible'][S.col]
+
+    reactants = sp.csr_matrix((np.ones(reactantMask.sum()), (S.row[reactantMask], S.col[reactantMask])), shape=S.shape)
+    products = sp.csr_matrix((np.ones(productMask.sum()), (S.row[productMask], S.col[productMask])), shape=S.shape)
+    revReactants = sp.csr_matrix((np.ones((reactantMask & revMask).sum()),
+                                  (S.row[reactantMask & revMask], S.col[reactantMask & revMask])), shape=S.shape)
+
+    directed = (reactants * products.T + products * revReactants.T).tocsr()
+    undirected = sp.triu(directed + directed.T)
+    return directed.nnz, undirected.nnz
+
+# componentStats
+# Input: integer array of component labels over metabolites, boolean array of
+# metabolites to include
+# Output: number of components, size of the largest component, and boolean
+# array marking the largest component. Ties are broken in favor of the
+# component whose first metabolite comes first, as in
+# graphFunctions.getEdgeStreamStats.
+
+def componentStats(labels, metabMask):
+    largestMask = np.zeros(len(labels), dtype=bool)
+    if not metabMask.any():
+        return 0, 0, largestMask
+    nodeLabels = labels[metabMask]
+    labelList, firstIndex = np.unique(nodeLabels, return_index=True)
+    labelList = labelList[np.argsort(firstIndex)]
+    sizes = np.bincount(nodeLabels)
+    largest = labelList[np.argmax(sizes[labelList])]
+    largestMask[metabMask] = nodeLabels == largest
+    return len(labelList), int(sizes[largest]), largestMask
+
+################################################################################
+
+# incidenceGraphStats
+# Equivalent of the statistics written by graphFunctions.computeGraphStats and
+# reduceToLargeComponent, computed from an incidence.
+# Input: incidence dictionary
+# Output: graph, digraph, reduced graph and reduced digraph statistics (each a
+# four-element list of nodes, edges, total components, and size of largest
+# component), and a boolean array marking the metabolites in the reduced
+# graph
+
+def incidenceGraphStats(incidence):
+
+    numMetabs = len(incidence['metabolites'])
+    nodeMask = graphNodeMask(incidence)
+    adjacency = bipartiteAdjacency(incidence)
+    numWcc, wccLabels = csgraph.connected_components(adjacency, directed=True, connection='weak')
+    numScc, sccLabels = csgraph.connected_components(adjacency, directed=True, connection='strong')
+    wccLabels = wccLabels[:numMetabs]
+    sccLabels = sccLabels[:numMetabs]
+
+    numNodes = int(nodeMask.sum())
+    directedEdges, undirectedEdges = expandedEdgeCounts(incidence, nodeMask)
+    wccCount, wccLargest, keepMask = componentStats(wccLabels, nodeMask)
+    sccCount, sccLargest, sccMask = componentStats(sccLabels, nodeMask)
+    graphStats = [numNodes, undirectedEdges, wccCount, wccLargest]
+    diGraphStats = [numNodes, directedEdges, sccCount, sccLargest]
+
+    numReduced = int(keepMask.sum())
+    directedEdges, undirectedEdges = expandedEdgeCounts(incidence, keepMask)
+    sccCount, sccLargest, sccMask = componentStats(sccLabels, keepMask)
+    reducedGraphStats = [numReduced, undirectedEdges, min(numReduced, 1), numReduced]
+    reducedDiGraphStats = [numReduced, directedEdges, sccCount, sccLargest]
+
+    return graphStats, diGraphStats, reducedGraphStats, reducedDiGraphStats, keepMask
+
+################################################################################
+
+# incidenceSeedSets
+# Compute the seed sets of a genome from its incidence: the SCCs with no
+# incoming edges which lie in the largest component. An SCC of the expanded
+# graph has an incoming edge exactly when the SCC containing it in the
+# bipartite graph does, so the condensation is taken on the bipartite graph.
+# Input: incidence dictionary
+# Output: "list of lists" of seed metabolites, each in metabolite order
+
+def incidenceSeedSets(incidence):
+
+    numMetabs = len(incidence['metabolites'])
+    nodeMask = graphNodeMask(incidence)
+    adjacency = bipartiteAdjacency(incidence)
+    numWcc, wccLabels = csgraph.connected_components(adjacency, directed=True, connection='weak')
+    numScc, sccLabels = csgraph.connected_components(adjacency, directed=True, connection='strong')
+    keepMask = componentStats(wccLabels[:numMetabs], nodeMask)[2]
+
+# Mark every SCC which is the sink of an edge between two SCCs
+    edges = adjacency.tocoo()
+    crossMask = sccLabels[edges.row] != sccLabels[edges.col]
+    hasInput = np.zeros(numScc, dtype=bool)
+    hasInput[sccLabels[edges.col[crossMask]]] = True
+
+# Group the seed metabolites by SCC, keeping metabolite order within and
+# between the groups
+    seedIndex = np.flatnonzero(keepMask & ~hasInput[sccLabels[:numMetabs]])
+    seedDict = {}
+    for index in seedIndex:
+        seedDict.setdefault(sccLabels[index], []).append(index)
+    seedList = [[incidence['metabolites'][index] for index in seedDict[label]]
+                for label in sorted(seedDict, key=lambda label: seedDict[label][0])]
+
+    return seedList
+
+################################################################################
+
+# writeExpandedGraph
+# Materialize the expanded graph of an incidence as an adjacency list and a
+# reaction edge list, in the layouts written by adjacencyListFromModel and
+# reactionEdgesFromModel.
+# Input: incidence dictionary, path prefix for the two files
+# Output: None
+
+def writeExpandedGraph(incidence, fileStem):
+
+    S = incidence['S'].tocsc()
+    metabList = incidence['metabolites']
+    adjFile = iof.openOutput(fileStem+'AdjList.txt')
+    rxnFile = iof.openOutput(fileStem+'RxnEdges.txt')
+
+    for col, rxn in enumerate(incidence['reactions']):
+        rowSlice = S.indices[S.indptr[col]:S.indptr[col+1]]
+        valueSlice = S.data[S.indptr[col]:S.indptr[col+1]]
+        reactantIds = [metabList[row] for row in rowSlice[valueSlice < 0]]
+        productIds = [metabList[row] for row in rowSlice[valueSlice > 0]]
+
+        sideList = [(reactantIds, productIds)]
+        if incidence['reversible'][col]:
+            sideList.append((productIds, reactantIds))
+        for sourceIds, sinkIds in sideList:
+            for source in sourceIds:
+                adjFile.write(source+'\t')
+                for sink in sinkIds:
+                    adjFile.write(sink+'\t')
+                    rxnFile.write(source+'\t'+sink+'\t'+rxn+'\n')
+                adjFile.write('\n')
+
+    adjFile.close()
+    rxnFile.close()
+    return
+
+################################################################################
+
+# iterIncidenceResults
+# Generator over a list of genome directories. For each genome, reads the
+# incidence written by sbmlFunctions.dirListToAdjacencyList (with
+# expand=False), writes its seed compounds as in graphFunctions.genomeSeedSets,
+# and yields its statistics and seed sets. No expanded graph is constructed.
+# Input: list of genome directories, directory containing the incidence files,
+# directory in which to write seed compounds
+# Output: yields (genome, graphStats, diGraphStats, reducedGraphStats,
+# reducedDiGraphStats, seeds) tuples
+
+def iterIncidenceResults(dirList, processedDataDir, seedDir):
+
+    namesDict = gf.readNamesDict()
+
+    for curDir in dirList:
+        incidence = readIncidence(processedDataDir+'/'+curDir+'/'+curDir+'Incidence.npz')
+        statList = list(incidenceGraphStats(incidence)[:4])
+        mySeeds = incidenceSeedSets(incidence)
+
+        if not os.path.exists(seedDir+'/'+curDir):
+            os.makedirs(seedDir+'/'+curDir)
+        seedFile = iof.openOutput(seedDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt')
+        for seed in mySeeds:
+            myWeight = 1 / float(len(seed))
+            for metab in seed:
+                seedFile.write('%s\t%s\t%f\n' % (metab, namesDict[idf.compoundId(metab)], myWeight) )
+        seedFile.close()
+
+        yield tuple([curDir] + statList + [mySeeds])
+
+################################################################################
+
+# exportExpandedGraphs
+# Write AdjList.txt and RxnEdges.txt for each genome from its incidence, for
+# use by the file-based functions in graphFunctions and elsewhere.
+# Input: list of genome directories, directory containing the incidence files
+# Output: None
+
+def exportExpandedGraphs(dirList, processedDataDir):
+
+    print 'Writing expanded adjacency lists'
+
+    for curDir in dirList:
+        incidence = readIncidence(processedDataDir+'/'+curDir+'/'+curDir+'Incidence.npz')
+        writeExpandedGraph(incidence, processedDataDir+'/'+curDir+'/'+curDir)
+
+    return
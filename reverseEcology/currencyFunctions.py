@@ -0,0 +1,496 @@
+###############################################################################
+# currencyFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for pruning currency metabolites at the level of the graph.
+# sbmlFunctions.pruneCurrencyMetabs edits the cobra model itself. The functions
+# here apply the same rules as a mask over the reaction-annotated edge list
+# (RxnEdges.txt), so that alternative currency definitions ("profiles") can be
+# compared without re-processing the SBML files. The masks must be applied to
+# the unpruned edge lists: run sbmlFunctions.dirListToAdjacencyList on the
+# models written by processSBMLforRE, without running pruneCurrencyMetabs.
+#
+# findCurrencyCandidates proposes additions to the currency lists from the
+# graphs themselves: metabolites which are hubs (high degree and betweenness)
+# across many genomes and merged graphs, and metabolite pairs which are
+# exchanged in many reactions. The candidates are written as a profile in the
+# packageData formats for review.
+################################################################################
+
+# Import Python packages.
+import hashlib
+import multiprocessing
+import numpy as np
+import os
+import pandas as pd
+import scipy.sparse as sp
+
+# Import custom Python modules
+import graphFunctions as gf
+import ioFunctions as iof
+import reportFunctions as rf
+
+# Define path for data included in the package
+dataPath = os.path.dirname(os.path.abspath(__file__))+'/packageData'
+
+################################################################################
+
+# readCurrencyProfile
+# Read a pruning profile from files in the packageData formats: tab-delimited
+# pairs of metabolites, tab-delimited aminotransfer pairs, and one singleton
+# metabolite per line. Any file not given defaults to the package's own list.
+# Input: paths to the pair, amino pair, and singleton files
+# Output: dictionary with keys 'pairs', 'aminoPairs', and 'singletons'
+
+def readCurrencyProfile(pairFile=None, aminoFile=None, singletonFile=None):
+
+    if pairFile is None:
+        pairFile = dataPath+'/currencyRemovePairs.txt'
+    if aminoFile is None:
+        aminoFile = dataPath+'/currencyAminoPairs.txt'
+    if singletonFile is None:
+        singletonFile = dataPath+'/currencyRemoveSingletons.txt'
+
+    profile = {}
+    with open(pairFile) as myFile:
+        profile['pairs'] = [line.strip().split('\t') for line in myFile if line.strip()]
+    with open(aminoFile) as myFile:
+        profile['aminoPairs'] = [line.strip().split('\t') for line in myFile if line.strip()]
+    with open(singletonFile) as myFile:
+        profile['singletons'] = [line.strip() for line in myFile if line.strip()]
+
+    return profile
+
+# profileHash
+# Fingerprint of a profile's content. Pairs are applied in order, so their
+# order is part of the fingerprint.
+# Input: pruning profile
+# Output: hexadecimal hash
+
+def profileHash(profile):
+    myHash = hashlib.sha1()
+    for key in ['pairs', 'aminoPairs']:
+        myHash.update('\n'.join('\t'.join(pair) for pair in profile[key]))
+        myHash.update('\n\n')
+    myHash.update('\n'.join(profile['singletons']))
+    return myHash.hexdigest()
+
+################################################################################
+
+# readReactionEdges
+# Read a reaction-annotated edge list, as written by
+# sbmlFunctions.reactionEdgesFromModel.
+# Input: path to the edge list
+# Output: lists of edge sources, sinks, and reactions
+
+def readReactionEdges(fileName):
+    sourceList = []
+    sinkList = []
+    rxnList = []
+    with iof.openFile(iof.findFile(fileName)) as inFile:
+        for line in inFile:
+            tokens = line.rstrip('\n').split('\t')
+            if len(tokens) == 3:
+                sourceList.append(tokens[0])
+                sinkList.append(tokens[1])
+                rxnList.append(tokens[2])
+    return sourceList, sinkList, rxnList
+
+################################################################################
+
+# currencyRemovalSet
+# Determine which metabolites pruneCurrencyMetabs would drop from a reaction.
+# Pairs are checked in file order, and each removal affects later checks, as
+# in the model-based pruning. Aminotransfer pairs are only removed if ammonia
+# does not participate in the reaction. Singletons are removed wherever they
+# occur.
+# Input: set of metabolites participating in a reaction, pruning profile
+# Output: set of metabolites to drop from the reaction
+
+def currencyRemovalSet(metabSet, profile):
+    remainSet = set(metabSet)
+
+    for pair in profile['pairs']:
+        if set(pair) <= remainSet:
+            remainSet.difference_update(pair)
+
+    for pair in profile['aminoPairs']:
+        if (set(pair) <= remainSet) and ('cpd00013_c' not in remainSet):
+            remainSet.difference_update(pair)
+
+    remainSet.difference_update(profile['singletons'])
+
+    return set(metabSet) - remainSet
+
+################################################################################
+
+# pruneEdgeMasks
+# Compute a keep-mask over a reaction-annotated edge list for each of several
+# pruning profiles in a single pass over the reactions. Because pruning only
+# removes metabolites from reactions, the pruned graph consists of exactly the
+# edges whose endpoints both survive for that reaction. Reactions left without
+# reactants or products therefore contribute no edges, as in the model-based
+# pruning.
+# Input: lists of edge sources, sinks, and reactions, dictionary of
+# {profile name: profile}
+# Output: dictionary of {profile name: boolean numpy array}
+
+def pruneEdgeMasks(sourceList, sinkList, rxnList, profileDict):
+
+# Group edges by reaction and collect the metabolites of each reaction
+    rxnEdgeDict = {}
+    rxnMetabDict = {}
+    for index, rxn in enumerate(rxnList):
+        rxnEdgeDict.setdefault(rxn, []).append(index)
+        rxnMetabDict.setdefault(rxn, set()).update([sourceList[index], sinkList[index]])
+
+    maskDict = {}
+    for profileName in profileDict:
+        maskDict[profileName] = np.ones(len(rxnList), dtype=bool)
+
+    for rxn in rxnEdgeDict:
+        for profileName in profileDict:
+            removeSet = currencyRemovalSet(rxnMetabDict[rxn], profileDict[profileName])
+            if len(removeSet) == 0:
+                continue
+            for index in rxnEdgeDict[rxn]:
+                if sourceList[index] in removeSet or sinkList[index] in removeSet:
+                    maskDict[profileName][index] = False
+
+    return maskDict
+
+################################################################################
+
+# computePruneProfiles
+# For each genome, compute the pruning masks for all profiles and cache them
+# side by side in <genome>PruneMasks.npz, keyed by the hash of each profile's
+# content (see profileHash), so that a profile whose lists change is
+# recomputed rather than matched by name. Masks for profiles not in
+# 'profileDict' are kept in the archive. If the genome's RxnEdges.txt is newer
+# than the archive, all cached masks are discarded. RxnEdges.txt must be the
+# unpruned edge list (see the notes at the top of this file).
+# Input: list of genome directories, directory containing RxnEdges.txt files,
+# dictionary of {profile name: profile}
+# Output: None
+
+def computePruneProfiles(dirList, processedDataDir, profileDict):
+
+    print 'Computing currency pruning profiles'
+
+    hashDict = dict((profileHash(profile), profile) for profile in profileDict.values())
+
+    for curDir in dirList:
+        edgeFile = iof.findFile(processedDataDir+'/'+curDir+'/'+curDir+'RxnEdges.txt')
+        cacheFile = processedDataDir+'/'+curDir+'/'+curDir+'PruneMasks.npz'
+
+        maskDict = {}
+        if os.path.exists(cacheFile) and os.path.getmtime(cacheFile) >= os.path.getmtime(edgeFile):
+            with np.load(cacheFile) as cache:
+                maskDict = dict((key, cache[key]) for key in cache.files)
+        missingDict = dict((key, hashDict[key]) for key in hashDict if key not in maskDict)
+        if len(missingDict) == 0:
+            continue
+
+        sourceList, sinkList, rxnList = readReactionEdges(edgeFile)
+        maskDict.update(pruneEdgeMasks(sourceList, sinkList, rxnList, missingDict))
+        np.savez_compressed(cacheFile, **maskDict)
+
+    return
+
+################################################################################
+
+# writeProfileGraphs
+# Write the adjacency list and reaction edge list of each genome as pruned by
+# one profile. Files are written to <profileDataDir>/<genome>/ using the usual
+# file names, so the graph and seed functions can be run on 'profileDataDir'
+# unchanged. The profile's masks must have been computed by
+# computePruneProfiles.
+# Input: list of genome directories, directory containing RxnEdges.txt files
+# and cached masks, profile name, profile, output directory
+# Output: None
+
+def writeProfileGraphs(dirList, processedDataDir, profileName, profile, profileDataDir):
+
+    print 'Writing graphs for pruning profile '+profileName
+
+    maskKey = profileHash(profile)
+    for curDir in dirList:
+        sourceList, sinkList, rxnList = readReactionEdges(processedDataDir+'/'+curDir+'/'+curDir+'RxnEdges.txt')
+        with np.load(processedDataDir+'/'+curDir+'/'+curDir+'PruneMasks.npz') as cache:
+            keepMask = cache[maskKey]
+
+        if not os.path.exists(profileDataDir+'/'+curDir):
+            os.makedirs(profileDataDir+'/'+curDir)
+
+# Adjacency list in the tab-delimited layout of adjacencyListFromModel, with
+# consecutive edges from the same source written on one line
+        adjFile = iof.openOutput(profileDataDir+'/'+curDir+'/'+curDir+'AdjList.txt')
+        rxnFile = iof.openOutput(profileDataDir+'/'+curDir+'/'+curDir+'RxnEdges.txt')
+        lastKey = None
+        for index in np.flatnonzero(keepMask):
+            curKey = (rxnList[index], sourceList[index])
+            if curKey != lastKey:
+                if lastKey is not None:
+                    adjFile.write('\n')
+                adjFile.write(sourceList[index]+'\t')
+                lastKey = curKey
+            adjFile.write(sinkList[index]+'\t')
+            rxnFile.write(sourceList[index]+'\t'+sinkList[index]+'\t'+rxnList[index]+'\n')
+        if lastKey is not None:
+            adjFile.write('\n')
+        adjFile.close()
+        rxnFile.close()
+
+    return
+
+################################################################################
+
+# undirectedDegrees
+# Number of distinct neighbors of each node, ignoring edge direction,
+# duplicate edges and self-loops.
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: integer array of degrees
+
+def undirectedDegrees(numNodes, sources, sinks):
+    loopMask = sources != sinks
+    pairArray = np.unique(np.minimum(sources, sinks)[loopMask]*numNodes + np.maximum(sources, sinks)[loopMask])
+    lowArray, highArray = np.divmod(pairArray, max(numNodes, 1))
+    return np.bincount(lowArray, minlength=numNodes) + np.bincount(highArray, minlength=numNodes)
+
+################################################################################
+
+# approximateBetweenness
+# Estimate the (directed, normalized) betweenness centrality of each node from
+# shortest paths starting at a random sample of source nodes (Brandes'
+# algorithm with pivots, as in networkx.betweenness_centrality with 'k'). The
+# sources are processed in chunks, one column per source, so each BFS level
+# is a sparse matrix product over the whole chunk.
+# Input: number of nodes, integer arrays of edge sources and sinks, number of
+# sampled sources, random seed, number of sources per chunk
+# Output: float array of betweenness values
+
+def approximateBetweenness(numNodes, sources, sinks, numSamples=100, seed=0, chunkSize=64):
+
+    betweenness = np.zeros(numNodes)
+    if numNodes < 3:
+        return betweenness
+
+    loopMask = sources != sinks
+    adjacency = sp.csr_matrix((np.ones(loopMask.sum()), (sources[loopMask], sinks[loopMask])),
+                              shape=(numNodes, numNodes))
+# Collapse duplicate edges
+    adjacency.data[:] = 1
+    adjacencyT = adjacency.T.tocsr()
+
+    numSamples = min(numSamples, numNodes)
+    pivotArray = np.random.RandomState(seed).choice(numNodes, numSamples, replace=False)
+
+    for chunkStart in range(0, numSamples, chunkSize):
+        pivots = pivotArray[chunkStart:chunkStart+chunkSize]
+        columns = np.arange(len(pivots))
+
+# Forward pass: BFS levels and number of shortest paths from each pivot
+        distances = np.full((numNodes, len(pivots)), -1, dtype=int)
+        distances[pivots, columns] = 0
+        sigma = np.zeros((numNodes, len(pivots)))
+        sigma[pivots, columns] = 1
+        level = 0
+        while True:
+            paths = adjacencyT.dot(sigma * (distances == level))
+            newMask = (paths > 0) & (distances < 0)
+            if not newMask.any():
+                break
+            level = level + 1
+            distances[newMask] = level
+            sigma[newMask] = paths[newMask]
+
+# Backward pass: accumulate dependencies from the deepest level up
+        delta = np.zeros((numNodes, len(pivots)))
+        safeSigma = np.where(sigma > 0, sigma, 1)
+        for curLevel in range(level, 0, -1):
+            coeff = np.where(distances == curLevel, (1 + delta) / safeSigma, 0)
+            delta = delta + np.where(distances == curLevel - 1, sigma * adjacency.dot(coeff), 0)
+        delta[pivots, columns] = 0
+        betweenness = betweenness + delta.sum(axis=1)
+
+    return betweenness * numNodes / float(numSamples) / ((numNodes - 1) * (numNodes - 2))
+
+################################################################################
+
+# reactionPairCounts
+# Count, for each unordered pair of metabolites joined by a (reactant,
+# product) edge, the reactions in which the pair occurs, and how many of
+# those reactions also involve ammonia (the condition under which
+# aminotransfer pairs are retained, see currencyRemovalSet).
+# Input: lists of edge sources, sinks, and reactions
+# Output: dictionary of {(metabolite, metabolite): [reactions, reactions with
+# ammonia]}, number of reactions
+
+def reactionPairCounts(sourceList, sinkList, rxnList):
+
+    rxnPairDict = {}
+    rxnMetabDict = {}
+    for source, sink, rxn in zip(sourceList, sinkList, rxnList):
+        if source != sink:
+            rxnPairDict.setdefault(rxn, set()).add((min(source, sink), max(source, sink)))
+        rxnMetabDict.setdefault(rxn, set()).update([source, sink])
+
+    pairCountDict = {}
+    for rxn in rxnPairDict:
+        hasAmmonia = 'cpd00013_c' in rxnMetabDict[rxn]
+        for pair in rxnPairDict[rxn]:
+            counts = pairCountDict.setdefault(pair, [0, 0])
+            counts[0] = counts[0] + 1
+            counts[1] = counts[1] + hasAmmonia
+
+    return pairCountDict, len(rxnMetabDict)
+
+# graphCurrencyStats
+# Degree, approximate betweenness, and (if the graph has a reaction edge
+# list) reaction pair counts of one genome or merged graph.
+# Input: (graph name, directory containing the graphs, number of sampled
+# sources, random seed) tuple, so that it can be mapped over a pool
+# Output: dictionary with keys 'name', 'nodes', 'degrees', 'betweenness',
+# 'pairCounts' and 'numRxns' (None for graphs without RxnEdges.txt)
+
+def graphCurrencyStats(job):
+
+    curDir, processedDataDir, numSamples, seed = job
+    nodeList, sources, sinks = gf.readEdgeArrays(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt')
+    stats = {'name': curDir, 'nodes': nodeList, 'pairCounts': None, 'numRxns': None,
+             'degrees': undirectedDegrees(len(nodeList), sources, sinks),
+             'betweenness': approximateBetweenness(len(nodeList), sources, sinks, numSamples, seed)}
+
+    edgeFile = processedDataDir+'/'+curDir+'/'+curDir+'RxnEdges.txt'
+    if iof.fileExists(edgeFile):
+        stats['pairCounts'], stats['numRxns'] = reactionPairCounts(*readReactionEdges(edgeFile))
+
+    return stats
+
+################################################################################
+
+# findCurrencyCandidates
+# Rank metabolites and metabolite pairs as candidate currency metabolites
+# across a set of graphs (genomes and/or merged graphs from
+# graphFunctions.createMergedGraph), computed in parallel over 'numProcs'
+# processes. Metabolites are ranked by their mean betweenness over the graphs
+# containing them; pairs by the mean number of reactions exchanging them, over
+# the genomes with reaction edge lists. Entries already in 'profile' are marked
+# as listed, and the top unlisted entries found in at least 'minFraction' of
+# the graphs become candidates. Candidate pairs which occur with ammonia are
+# treated as aminotransfer pairs, and metabolites in any pair are not proposed
+# as singletons.
+#
+# Written to outputDir: CurrencyMetabRanking.csv, CurrencyPairRanking.csv,
+# CurrencyDegreeDistribution.csv, and the profile files
+# currencyRemovePairs.txt, currencyAminoPairs.txt and
+# currencyRemoveSingletons.txt, holding the existing entries followed by the
+# candidates. The profile can be read with readCurrencyProfile and compared
+# to the existing one with computePruneProfiles.
+# Input: list of graph names, directory containing the graphs, output
+# directory, existing profile (default: the package's lists), number of
+# sampled sources for betweenness, number of metabolite and pair candidates,
+# minimum fraction of graphs, number of processes, random seed
+# Output: candidate profile dictionary
+
+def findCurrencyCandidates(graphList, processedDataDir, outputDir, profile=None, numSamples=100,
+                           numMetabs=20, numPairs=20, minFraction=0.5, numProcs=1, seed=0):
+
+    print 'Ranking candidate currency metabolites'
+
+    if profile is None:
+        profile = readCurrencyProfile()
+    if not os.path.exists(outputDir):
+        os.makedirs(outputDir)
+
+    jobList = [(curDir, processedDataDir, numSamples, seed) for curDir in graphList]
+    if numProcs > 1:
+        pool = multiprocessing.Pool(numProcs)
+        statsList = pool.map(graphCurrencyStats, jobList)
+        pool.close()
+        pool.join()
+    else:
+        statsList = map(graphCurrencyStats, jobList)
+
+# Per-metabolite totals across graphs
+    metabDict = {}
+    for stats in statsList:
+        for metab, degree, betweenness in zip(stats['nodes'], stats['degrees'].tolist(),
+                                              stats['betweenness'].tolist()):
+            totals = metabDict.setdefault(metab, [0, 0, 0.0])
+            totals[0] = totals[0] + 1
+            totals[1] = totals[1] + degree
+            totals[2] = totals[2] + betweenness
+    metabDF = pd.DataFrame([[metab, totals[0] / float(len(statsList)), totals[1] / float(totals[0]),
+                             totals[2] / totals[0]] for metab, totals in metabDict.items()],
+                           columns=['Metabolite', 'GraphFraction', 'MeanDegree', 'MeanBetweenness'])
+
+# Per-pair totals across genomes with reaction edge lists
+    pairDict = {}
+    numGenomes = 0
+    for stats in statsList:
+        if stats['pairCounts'] is None:
+            continue
+        numGenomes = numGenomes + 1
+        for pair, counts in stats['pairCounts'].items():
+            totals = pairDict.setdefault(pair, [0, 0, 0, 0.0])
+            totals[0] = totals[0] + 1
+            totals[1] = totals[1] + counts[0]
+            totals[2] = totals[2] + counts[1]
+            totals[3] = totals[3] + counts[0] / float(stats['numRxns'])
+    pairDF = pd.DataFrame([[pair[0], pair[1], totals[0] / float(numGenomes), totals[1] / float(totals[0]),
+                            totals[3] / totals[0], totals[2] / float(totals[1])]
+                           for pair, totals in pairDict.items()],
+                          columns=['Metabolite1', 'Metabolite2', 'GenomeFraction', 'MeanReactions',
+                                   'MeanReactionFraction', 'AmmoniaFraction'])
+
+# Mark entries of the existing profile
+    listedPairs = set(tuple(sorted(pair)) for pair in profile['pairs'] + profile['aminoPairs'])
+    metabDF['Listed'] = metabDF['Metabolite'].isin(profile['singletons'])
+    pairDF['Listed'] = [(metab1, metab2) in listedPairs for metab1, metab2 in
+                        zip(pairDF['Metabolite1'], pairDF['Metabolite2'])]
+    metabDF = metabDF.sort_values(['MeanBetweenness', 'MeanDegree', 'Metabolite'],
+                                  ascending=[False, False, True]).reset_index(drop=True)
+    pairDF = pairDF.sort_values(['MeanReactions', 'GenomeFraction', 'Metabolite1', 'Metabolite2'],
+                                ascending=[False, False, True, True]).reset_index(drop=True)
+    metabDF.to_csv(outputDir+'/CurrencyMetabRanking.csv', index=False)
+    pairDF.to_csv(outputDir+'/CurrencyPairRanking.csv', index=False)
+
+# Pooled degree distribution of all graphs
+    edges, counts = rf.integerHistogram(np.concatenate([stats['degrees'] for stats in statsList] +
+                                                       [np.zeros(0, dtype=int)]), 1)
+    pd.DataFrame({'Degree': edges[:-1], 'Fraction': rf.countsToFractions(counts)}).to_csv(
+        outputDir+'/CurrencyDegreeDistribution.csv', index=False, columns=['Degree', 'Fraction'])
+
+# Select candidates
+    candidatePairDF = pairDF[~pairDF['Listed'] & (pairDF['GenomeFraction'] >= minFraction)].head(numPairs)
+    candidateProfile = {'pairs': list(profile['pairs']), 'aminoPairs': list(profile['aminoPairs']),
+                        'singletons': list(profile['singletons'])}
+    for metab1, metab2, ammoniaFraction in zip(candidatePairDF['Metabolite1'], candidatePairDF['Metabolite2'],
+                                               candidatePairDF['AmmoniaFraction']):
+        if ammoniaFraction > 0:
+            candidateProfile['aminoPairs'].append([metab1, metab2])
+        else:
+            candidateProfile['pairs'].append([metab1, metab2])
+
+    pairMetabSet = set(metab for pair in candidateProfile['pairs'] + candidateProfile['aminoPairs'] for metab in pair)
+    candidateMetabDF = metabDF[~metabDF['Listed'] & ~metabDF['Metabolite'].isin(pairMetabSet) &
+                               (metabDF['GraphFraction'] >= minFraction)].head(numMetabs)
+    candidateProfile['singletons'].extend(candidateMetabDF['Metabolite'])
+
+    print '%i candidate pairs and %i candidate singletons' % (len(candidatePairDF), len(candidateMetabDF))
+
+# Write the candidate profile in the packageData formats
+    for key, fileName in [('pairs', 'currencyRemovePairs.txt'), ('aminoPairs', 'currencyAminoPairs.txt')]:
+        with open(outputDir+'/'+fileName, 'w') as outFile:
+            for pair in candidateProfile[key]:
+                outFile.write('\t'.join(pair)+'\n')
+    with open(outputDir+'/currencyRemoveSingletons.txt', 'w') as outFile:
+        for metab in candidateProfile['singletons']:
+            outFile.write(metab+'\n')
+
+    return candidateProfile
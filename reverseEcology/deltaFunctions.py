@@ -0,0 +1,254 @@
+###############################################################################
+# deltaFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for storing the genomes of a taxonomic group as a shared
+# core plus per-genome deltas. Genomes in the same tribe share most of their
+# reaction edges, so each group's core edge set is stored once, and each
+# genome as the edges it adds to and removes from the core. Everything for a
+# group is kept in a single archive, <deltaDir>/<group>/<group>Deltas.npz.
+#
+# Edges are the (source, sink, reaction) triples of RxnEdges.txt, each encoded
+# as one integer. Metabolites written to AdjList.txt without any edges are
+# stored per genome, so a genome's graph is reconstructed exactly (up to node
+# order).
+################################################################################
+
+# Import Python packages.
+import networkx as nx
+import numpy as np
+import os
+
+# Import custom Python modules
+import currencyFunctions as cf
+import graphFunctions as gf
+import ioFunctions as iof
+
+################################################################################
+
+# readGenomeEdges
+# Read the reaction edges and the edge-free metabolites of a genome.
+# Input: genome directory, directory containing the adjacency and reaction
+# edge lists
+# Output: list of (source, sink, reaction) tuples, list of metabolites with no
+# edges
+
+def readGenomeEdges(curDir, processedDataDir):
+    sourceList, sinkList, rxnList = cf.readReactionEdges(processedDataDir+'/'+curDir+'/'+curDir+'RxnEdges.txt')
+    nodeList = gf.readEdgeArrays(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt')[0]
+    edgeNodeSet = set(sourceList) | set(sinkList)
+    isolatedList = [node for node in nodeList if node not in edgeNodeSet]
+    return zip(sourceList, sinkList, rxnList), isolatedList
+
+################################################################################
+
+# buildGroupDeltas
+# Write the core-plus-delta archive of each group. An edge is placed in the
+# core if it occurs in more than 'coreFraction' of the group's genomes. With
+# the default of one half, each edge is stored in whichever of the two forms
+# takes fewer entries, so the total number of stored edges is minimal. If
+# 'removeFiles' is True, each genome's AdjList.txt and RxnEdges.txt are
+# deleted once its group's archive has been written (see writeGenomeFiles).
+# Input: dictionary of {group: [genomes]} (see
+# metadataFunctions.importTaxonomy), directory containing the adjacency and
+# reaction edge lists, output directory, core fraction, removeFiles flag
+# Output: dictionary of {group: (edges in the genome files, edges stored)}
+
+def buildGroupDeltas(groupSampleDict, processedDataDir, deltaDir, coreFraction=0.5, removeFiles=False):
+
+    print 'Building core and delta edge sets'
+
+    sizeDict = {}
+    for group in sorted(groupSampleDict):
+        genomeList = list(groupSampleDict[group])
+
+# Intern metabolites and reactions across the group
+        nodeIndex = {}
+        rxnIndex = {}
+        genomeEdgeList = []
+        genomeIsolatedList = []
+        for curDir in genomeList:
+            edgeList, isolatedList = readGenomeEdges(curDir, processedDataDir)
+            for source, sink, rxn in edgeList:
+                for node in (source, sink):
+                    if node not in nodeIndex:
+                        nodeIndex[node] = len(nodeIndex)
+                if rxn not in rxnIndex:
+                    rxnIndex[rxn] = len(rxnIndex)
+            for node in isolatedList:
+                if node not in nodeIndex:
+                    nodeIndex[node] = len(nodeIndex)
+            genomeEdgeList.append(edgeList)
+            genomeIsolatedList.append(isolatedList)
+
+        numNodes = max(len(nodeIndex), 1)
+        numRxns = max(len(rxnIndex), 1)
+        keyList = []
+        for edgeList in genomeEdgeList:
+            keyArray = np.array([(nodeIndex[source]*numNodes + nodeIndex[sink])*numRxns + rxnIndex[rxn]
+                                 for source, sink, rxn in edgeList], dtype=np.int64)
+            keyList.append(np.unique(keyArray))
+
+# The core holds the edges found in more than coreFraction of the genomes
+        allKeys, counts = np.unique(np.concatenate(keyList + [np.zeros(0, dtype=np.int64)]), return_counts=True)
+        coreKeys = allKeys[counts > coreFraction*len(genomeList)]
+
+        addedList = [np.setdiff1d(keyArray, coreKeys, assume_unique=True) for keyArray in keyList]
+        removedList = [np.setdiff1d(coreKeys, keyArray, assume_unique=True) for keyArray in keyList]
+        isolatedArrays = [np.array([nodeIndex[node] for node in isolatedList], dtype=np.int64)
+                          for isolatedList in genomeIsolatedList]
+
+        nodeList = sorted(nodeIndex, key=nodeIndex.get)
+        rxnList = sorted(rxnIndex, key=rxnIndex.get)
+        if not os.path.exists(deltaDir+'/'+group):
+            os.makedirs(deltaDir+'/'+group)
+        np.savez_compressed(deltaDir+'/'+group+'/'+group+'Deltas.npz',
+                            genomes=np.array(genomeList), nodes=np.array(nodeList),
+                            reactions=np.array(rxnList), core=coreKeys,
+                            addedPtr=raggedPointers(addedList), added=raggedValues(addedList),
+                            removedPtr=raggedPointers(removedList), removed=raggedValues(removedList),
+                            isolatedPtr=raggedPointers(isolatedArrays), isolated=raggedValues(isolatedArrays))
+
+        if removeFiles:
+            for curDir in genomeList:
+                for suffix in ['AdjList.txt', 'RxnEdges.txt']:
+                    fileName = iof.findFile(processedDataDir+'/'+curDir+'/'+curDir+suffix)
+                    if os.path.exists(fileName):
+                        os.remove(fileName)
+
+        sizeDict[group] = (sum(len(keyArray) for keyArray in keyList),
+                           len(coreKeys) + sum(len(keyArray) for keyArray in addedList + removedList))
+        print '%s: %i genomes, %i edges stored for %i genome edges' % (group, len(genomeList),
+                                                                     sizeDict[group][1], sizeDict[group][0])
+
+    return sizeDict
+
+# raggedPointers, raggedValues
+# Store a list of integer arrays as one array of values and one of offsets.
+
+def raggedPointers(arrayList):
+    return np.concatenate([[0], np.cumsum([len(array) for array in arrayList])]).astype(np.int64)
+
+def raggedValues(arrayList):
+    return np.concatenate(list(arrayList) + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+
+################################################################################
+
+# readGroupDeltas
+# Input: path to a group's archive
+# Output: dictionary holding the archive's arrays, with 'genomeIndex' mapping
+# each genome to its position
+
+def readGroupDeltas(fileName):
+    with np.load(fileName) as archive:
+        deltas = dict((key, archive[key]) for key in archive.files)
+    deltas['nodes'] = deltas['nodes'].tolist()
+    deltas['reactions'] = deltas['reactions'].tolist()
+    deltas['genomeIndex'] = dict((genome, index) for index, genome in enumerate(deltas['genomes'].tolist()))
+    return deltas
+
+def raggedRow(deltas, name, index):
+    return deltas[name][deltas[name+'Ptr'][index]:deltas[name+'Ptr'][index+1]]
+
+# decodeKeys
+# Input: deltas dictionary, array of encoded edges
+# Output: integer arrays of sources, sinks, and reactions
+
+def decodeKeys(deltas, keyArray):
+    numNodes = max(len(deltas['nodes']), 1)
+    numRxns = max(len(deltas['reactions']), 1)
+    pairArray, rxnArray = np.divmod(keyArray, numRxns)
+    sourceArray, sinkArray = np.divmod(pairArray, numNodes)
+    return sourceArray, sinkArray, rxnArray
+
+################################################################################
+
+# genomeReactionEdges
+# Reconstruct a genome's reaction edges as (core - removed) + added.
+# Input: deltas dictionary, genome name
+# Output: list of (source, sink, reaction) tuples, list of metabolites with no
+# edges
+
+def genomeReactionEdges(deltas, genome):
+    index = deltas['genomeIndex'][genome]
+    keyArray = np.union1d(np.setdiff1d(deltas['core'], raggedRow(deltas, 'removed', index), assume_unique=True),
+                          raggedRow(deltas, 'added', index))
+    sourceArray, sinkArray, rxnArray = decodeKeys(deltas, keyArray)
+    nodeList = deltas['nodes']
+    rxnList = deltas['reactions']
+    edgeList = [(nodeList[source], nodeList[sink], rxnList[rxn])
+                for source, sink, rxn in zip(sourceArray.tolist(), sinkArray.tolist(), rxnArray.tolist())]
+    isolatedList = [nodeList[node] for node in raggedRow(deltas, 'isolated', index).tolist()]
+    return edgeList, isolatedList
+
+# genomeGraph
+# Input: deltas dictionary, genome name
+# Output: networkx digraph of the genome, as read from its AdjList.txt
+
+def genomeGraph(deltas, genome):
+    edgeList, isolatedList = genomeReactionEdges(deltas, genome)
+    myDiGraph = nx.DiGraph()
+    myDiGraph.add_nodes_from(isolatedList)
+    myDiGraph.add_edges_from((source, sink) for source, sink, rxn in edgeList)
+    return myDiGraph
+
+# writeGenomeFiles
+# Write a genome's AdjList.txt and RxnEdges.txt from the deltas, for use by
+# the file-based functions in graphFunctions and elsewhere. The graph is also
+# written in any other formats listed in ioFunctions.outputFormats.
+# Input: deltas dictionary, genome name, output directory
+# Output: None
+
+def writeGenomeFiles(deltas, genome, outputDir):
+    if not os.path.exists(outputDir+'/'+genome):
+        os.makedirs(outputDir+'/'+genome)
+    iof.writeGraph(genomeGraph(deltas, genome), outputDir+'/'+genome+'/'+genome, requiredFormats=['adjlist'])
+    edgeList = genomeReactionEdges(deltas, genome)[0]
+    with iof.openOutput(outputDir+'/'+genome+'/'+genome+'RxnEdges.txt') as rxnFile:
+        for source, sink, rxn in edgeList:
+            rxnFile.write(source+'\t'+sink+'\t'+rxn+'\n')
+    return
+
+################################################################################
+
+# mergedGroupGraph
+# Build the union of a group's genome graphs directly from the core and the
+# deltas. A core edge is left out only if every genome removes it.
+# Input: deltas dictionary
+# Output: networkx digraph
+
+def mergedGroupGraph(deltas):
+    numGenomes = len(deltas['genomes'])
+    removedKeys, removedCounts = np.unique(deltas['removed'], return_counts=True)
+    droppedKeys = removedKeys[removedCounts == numGenomes]
+    keyArray = np.union1d(np.setdiff1d(deltas['core'], droppedKeys, assume_unique=True), deltas['added'])
+
+    sourceArray, sinkArray, rxnArray = decodeKeys(deltas, keyArray)
+    nodeList = deltas['nodes']
+    mergedGraph = nx.DiGraph()
+    mergedGraph.add_nodes_from(nodeList[node] for node in np.unique(deltas['isolated']).tolist())
+    mergedGraph.add_edges_from((nodeList[source], nodeList[sink])
+                               for source, sink in zip(sourceArray.tolist(), sinkArray.tolist()))
+    return mergedGraph
+
+# createMergedGraphFromDeltas
+# Equivalent of graphFunctions.createMergedGraph which reads each group's
+# archive rather than the adjacency list of every genome.
+# Input: list of groups, directory containing the archives, output directory
+# Output: None
+
+def createMergedGraphFromDeltas(groupList, deltaDir, processedDataDir):
+
+    print 'Merging genomes from specified taxonomic group'
+
+    for group in groupList:
+        deltas = readGroupDeltas(deltaDir+'/'+group+'/'+group+'Deltas.npz')
+        if not os.path.exists(processedDataDir+'/'+group):
+            os.makedirs(processedDataDir+'/'+group)
+        iof.writeGraph(mergedGroupGraph(deltas), processedDataDir+'/'+group+'/'+group, requiredFormats=['adjlist'])
+
+    return
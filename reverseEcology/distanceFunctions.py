@@ -0,0 +1,209 @@
+###############################################################################
+# distanceFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for placing each metabolite of a reduced digraph relative
+# to its seed sets. For every metabolite two quantities are computed:
+#
+#   distance: length of the shortest directed path from any seed metabolite
+#             (zero for the seeds themselves)
+#   depth:    topological layer of the metabolite's SCC in the condensation,
+#             i.e. the length of the longest path from a seed SCC
+#
+# Seed sets are the SCCs with no incoming edges, as in
+# graphFunctions.computeSeedSets, so every metabolite has a finite distance
+# and depth. Graphs are held as CSR arrays, and several genomes are processed
+# together as one block-diagonal graph, so each BFS level and each layer of the
+# topological sort is a single set of array operations across the batch.
+################################################################################
+
+# Import Python packages.
+import numpy as np
+import os
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+
+# Import custom Python modules
+import graphFunctions as gf
+import ioFunctions as iof
+
+################################################################################
+
+# edgesToCSR
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: CSR row pointer and column index arrays, with each row's columns in
+# edge order
+
+def edgesToCSR(numNodes, sources, sinks):
+    order = np.argsort(sources, kind='mergesort')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=numNodes))]).astype(int)
+    return indptr, np.asarray(sinks, dtype=int)[order]
+
+# csrNeighbors
+# Gather the out-neighbors of a set of nodes without a Python loop over nodes.
+# Input: CSR row pointer and column index arrays, array of nodes
+# Output: array of the neighbors of all the nodes (with repeats)
+
+def csrNeighbors(indptr, indices, nodes):
+    starts = indptr[nodes]
+    lengths = indptr[nodes+1] - starts
+    total = lengths.sum()
+    if total == 0:
+        return np.zeros(0, dtype=int)
+# Offset of each gathered position from the start of its own row
+    rowStarts = np.cumsum(lengths) - lengths
+    positions = np.arange(total) - np.repeat(rowStarts - starts, lengths)
+    return indices[positions]
+
+################################################################################
+
+# multiSourceBFS
+# Unweighted shortest distances from the nearest of a set of sources. Each
+# iteration expands the whole frontier at once.
+# Input: CSR row pointer and column index arrays, boolean array marking the
+# sources
+# Output: integer array of distances (-1 for unreachable nodes)
+
+def multiSourceBFS(indptr, indices, sourceMask):
+    distances = np.where(sourceMask, 0, -1)
+    frontier = np.flatnonzero(sourceMask)
+    level = 0
+    while len(frontier) > 0:
+        level = level + 1
+        neighbors = np.unique(csrNeighbors(indptr, indices, frontier))
+        frontier = neighbors[distances[neighbors] < 0]
+        distances[frontier] = level
+    return distances
+
+# condensationLayers
+# Label the SCCs of a digraph and layer its condensation by Kahn's algorithm:
+# the SCCs with no incoming edges form layer zero, and each SCC is placed one
+# layer below the deepest of its predecessors.
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: integer array of the SCC label of each node, integer array of the
+# layer of each SCC
+
+def condensationLayers(numNodes, sources, sinks):
+    adjacency = sp.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, sinks)),
+                              shape=(numNodes, numNodes))
+    numScc, sccLabels = csgraph.connected_components(adjacency, directed=True, connection='strong')
+
+# Distinct edges between different SCCs
+    sccSources = sccLabels[sources]
+    sccSinks = sccLabels[sinks]
+    crossMask = sccSources != sccSinks
+    sccEdges = np.unique(sccSources[crossMask]*numScc + sccSinks[crossMask])
+    sccSources, sccSinks = np.divmod(sccEdges, max(numScc, 1))
+    indptr, indices = edgesToCSR(numScc, sccSources, sccSinks)
+
+    inDegree = np.bincount(sccSinks, minlength=numScc)
+    layers = np.full(numScc, -1, dtype=int)
+    frontier = np.flatnonzero(inDegree == 0)
+    layer = 0
+    while len(frontier) > 0:
+        layers[frontier] = layer
+        successors = csrNeighbors(indptr, indices, frontier)
+        inDegree = inDegree - np.bincount(successors, minlength=numScc)
+        successors = np.unique(successors)
+        frontier = successors[inDegree[successors] == 0]
+        layer = layer + 1
+
+    return sccLabels, layers
+
+# seedDistances
+# Distance from the seeds and topological depth of each node of a digraph (or
+# of a block-diagonal batch of digraphs, which have no edges between them).
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: integer arrays of distances and depths
+
+def seedDistances(numNodes, sources, sinks):
+    sccLabels, layers = condensationLayers(numNodes, sources, sinks)
+    depths = layers[sccLabels]
+    indptr, indices = edgesToCSR(numNodes, sources, sinks)
+    distances = multiSourceBFS(indptr, indices, depths == 0)
+    return distances, depths
+
+################################################################################
+
+# iterSeedDistances
+# Generator over a list of genome directories. The reduced digraphs of
+# 'batchSize' genomes are read and concatenated into one graph, with each
+# genome's node IDs offset past the previous genome's, and seedDistances is
+# run once for the batch. For each genome, the distance and depth of every
+# metabolite are written to <seedDir>/<genome>/<genome>SeedDistances.txt, one
+# tab-delimited row (metabolite, distance, depth) per metabolite.
+# Input: list of genome directories, directory containing the reduced
+# adjacency lists, directory containing the seed compounds, batch size
+# Output: yields (genome, metabolites, distances, depths) tuples
+
+def iterSeedDistances(dirList, processedDataDir, seedDir, batchSize=100):
+
+    for batchStart in range(0, len(dirList), batchSize):
+        batchList = dirList[batchStart:batchStart+batchSize]
+
+        nodeLists = []
+        sourceList = []
+        sinkList = []
+        offset = 0
+        for curDir in batchList:
+            nodeList, sources, sinks = gf.readEdgeArrays(processedDataDir+'/'+curDir+'/'+curDir+'RedAdjList.txt')
+            nodeLists.append(nodeList)
+            sourceList.append(sources + offset)
+            sinkList.append(sinks + offset)
+            offset = offset + len(nodeList)
+
+        distances, depths = seedDistances(offset, np.concatenate(sourceList + [np.zeros(0, dtype=int)]),
+                                          np.concatenate(sinkList + [np.zeros(0, dtype=int)]))
+
+        offset = 0
+        for curDir, nodeList in zip(batchList, nodeLists):
+            myDistances = distances[offset:offset+len(nodeList)]
+            myDepths = depths[offset:offset+len(nodeList)]
+            offset = offset + len(nodeList)
+
+            if not os.path.exists(seedDir+'/'+curDir):
+                os.makedirs(seedDir+'/'+curDir)
+            with iof.openOutput(seedDir+'/'+curDir+'/'+curDir+'SeedDistances.txt') as distFile:
+                for metab, distance, depth in zip(nodeList, myDistances.tolist(), myDepths.tolist()):
+                    distFile.write('%s\t%i\t%i\n' % (metab, distance, depth))
+
+            yield curDir, nodeList, myDistances, myDepths
+
+# readSeedDistances
+# Input: path to a SeedDistances.txt file
+# Output: dictionary of {metabolite: (distance, depth)}
+
+def readSeedDistances(fileName):
+    distDict = {}
+    with iof.openFile(iof.findFile(fileName)) as inFile:
+        for line in inFile:
+            metab, distance, depth = line.rstrip('\n').split('\t')
+            distDict[metab] = (int(distance), int(depth))
+    return distDict
+
+################################################################################
+
+# computeSeedDistances
+# Compute and write the seed distances and depths of each genome (see
+# iterSeedDistances). Run after graphFunctions.computeSeedSets.
+# Input: list of genome directories, directory containing the reduced
+# adjacency lists, directory containing the seed compounds, batch size
+# Output: array with one row per genome giving the number of seed metabolites,
+# the largest distance from a seed, and the number of layers of the
+# condensation
+
+def computeSeedDistances(dirList, processedDataDir, seedDir, batchSize=100):
+
+    print 'Computing distances from seed sets'
+
+    distStatArray = np.zeros((len(dirList), 3), dtype=int)
+    for row, (curDir, nodeList, distances, depths) in enumerate(iterSeedDistances(dirList, processedDataDir,
+                                                                                   seedDir, batchSize)):
+        if len(nodeList) > 0:
+            distStatArray[row] = [np.sum(distances == 0), distances.max(), depths.max() + 1]
+
+    return distStatArray
@@ -13,12 +13,19 @@
 import networkx as nx
 import numpy as np
 import matplotlib.pyplot as plt
-import re
 
 import csv
+import hashlib
 import os
 import itertools
 
+# Import custom Python modules
+import idFunctions as idf
+import ioFunctions as iof
+import metadataFunctions as mf
+import reportFunctions as rf
+import storeFunctions as stf
+
 # Define path for data included in the package
 dataPath = os.path.dirname(os.path.abspath(__file__))+'/packageData'
 
@@ -60,46 +67,221 @@ def getDiGraphStats(diGraph):
 
 ################################################################################
 
+# readEdgeArrays
+# Read an adjacency list into integer edge arrays. Each metabolite is interned
+# to an integer ID in order of first appearance, matching the node order
+# networkx uses when reading the same file.
+# Input: path to an adjacency list
+# Output: list of node names, and integer numpy arrays of edge sources and sinks
+
+def readEdgeArrays(fileName):
+    nodeIndex = {}
+    nodeList = []
+    sourceList = []
+    sinkList = []
+    with iof.openFile(iof.findFile(fileName)) as inFile:
+        for line in inFile:
+            if line.startswith('#'):
+                continue
+            tokens = line.split()
+            idList = []
+            for token in tokens:
+                if token not in nodeIndex:
+                    nodeIndex[token] = len(nodeList)
+                    nodeList.append(token)
+                idList.append(nodeIndex[token])
+            for sink in idList[1:]:
+                sourceList.append(idList[0])
+                sinkList.append(sink)
+    return nodeList, np.array(sourceList, dtype=int), np.array(sinkList, dtype=int)
+
+# genomeEdgeArrays
+# Read one of a genome's graphs as integer edge arrays, from its file or, if a
+# result store connection is given, from the database (see storeFunctions).
+# Input: genome directory, directory containing the graph files, edge kind
+# ('adj' for AdjList.txt, 'red' for RedAdjList.txt), connection or None
+# Output: same as readEdgeArrays
+
+def genomeEdgeArrays(curDir, processedDataDir, kind, conn=None):
+    if conn is not None:
+        return stf.loadEdgeArrays(conn, curDir, kind)
+    return readEdgeArrays(processedDataDir+'/'+curDir+'/'+curDir+stf.edgeFileDict[kind])
+
+################################################################################
+
+# unionFindComponents
+# Label the connected components of the undirected graph defined by an edge
+# stream, using an array-backed union-find with path compression and union by
+# size. No graph object is constructed.
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: integer array giving the component root of each node, and integer
+# array giving the size of each root's component
+
+def unionFindComponents(numNodes, sources, sinks):
+    parent = range(numNodes)
+    size = [1]*numNodes
+
+    for source, sink in itertools.izip(sources.tolist(), sinks.tolist()):
+# Find the root of each endpoint, compressing paths along the way
+        rootA = source
+        while parent[rootA] != rootA:
+            parent[rootA] = parent[parent[rootA]]
+            rootA = parent[rootA]
+        rootB = sink
+        while parent[rootB] != rootB:
+            parent[rootB] = parent[parent[rootB]]
+            rootB = parent[rootB]
+# Attach the smaller tree beneath the larger
+        if rootA != rootB:
+            if size[rootA] < size[rootB]:
+                rootA, rootB = rootB, rootA
+            parent[rootB] = rootA
+            size[rootA] = size[rootA] + size[rootB]
+
+# Final pass so every node points directly at its root
+    for node in range(numNodes):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        parent[node] = root
+
+    return np.array(parent, dtype=int), np.array(size, dtype=int)
+
+################################################################################
+
+# countUndirectedEdges
+# Count the edges of the undirected graph defined by an edge stream, treating
+# (a, b) and (b, a) as the same edge and collapsing duplicates.
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: number of undirected edges
+
+def countUndirectedEdges(numNodes, sources, sinks):
+    if len(sources) == 0:
+        return 0
+    lowArray = np.minimum(sources, sinks)
+    highArray = np.maximum(sources, sinks)
+    return len(np.unique(lowArray*numNodes + highArray))
+
+################################################################################
+
+# getEdgeStreamStats
+# Equivalent of getGraphStats computed from integer edge arrays rather than a
+# networkx graph. Edges are counted as undirected, with duplicates collapsed.
+# Also returns a mask of nodes belonging to the largest component.
+# Input: number of nodes, integer arrays of edge sources and sinks
+# Output: statistics list (nodes, edges, total components, size of largest
+# component), and boolean numpy array marking nodes in the largest component
+
+def getEdgeStreamStats(numNodes, sources, sinks):
+    statRow = [0]*4
+    statRow[0] = numNodes
+    statRow[1] = countUndirectedEdges(numNodes, sources, sinks)
+
+    roots, sizes = unionFindComponents(numNodes, sources, sinks)
+    keepMask = np.zeros(numNodes, dtype=bool)
+    if numNodes > 0:
+# Order components by their first node, as networkx does, so that ties in size
+# are broken the same way as sorting nx.connected_components
+        rootList, firstIndex = np.unique(roots, return_index=True)
+        rootList = rootList[np.argsort(firstIndex)]
+        largestRoot = rootList[np.argmax(sizes[rootList])]
+        statRow[2] = len(rootList)
+        statRow[3] = int(sizes[largestRoot])
+        keepMask = roots == largestRoot
+    return statRow, keepMask
+
+################################################################################
+
+# genomeFingerprint
+# Fingerprint the canonical edge set of a genome's adjacency list: its sorted
+# nodes and sorted distinct edges. Genomes with the same fingerprint have the
+# same graph, statistics and seed sets. If two components tie for largest, the
+# one kept by reduceToLargeComponent depends on node order, so the order is
+# then included as well. The fingerprint is cached in <genome>Fingerprint.txt
+# and reused while it is newer than the adjacency list. Genomes held in a
+# result store are fingerprinted from the database, without a cache file.
+# Input: genome directory, directory containing the adjacency lists,
+# connection or None
+# Output: hexadecimal fingerprint
+
+def genomeFingerprint(curDir, processedDataDir, conn=None):
+
+    if conn is None:
+        adjFile = iof.findFile(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt')
+        cacheFile = processedDataDir+'/'+curDir+'/'+curDir+'Fingerprint.txt'
+        if os.path.exists(cacheFile) and os.path.getmtime(cacheFile) >= os.path.getmtime(adjFile):
+            with open(cacheFile) as inFile:
+                return inFile.read().strip()
+
+    nodeList, sources, sinks = genomeEdgeArrays(curDir, processedDataDir, 'adj', conn)
+    edgeSet = set(itertools.izip(sources.tolist(), sinks.tolist()))
+    myHash = hashlib.sha1()
+    myHash.update('\n'.join(sorted(nodeList)))
+    myHash.update('\n\n')
+    myHash.update('\n'.join(sorted(nodeList[source]+'\t'+nodeList[sink] for source, sink in edgeSet)))
+
+    if len(nodeList) > 0:
+        roots, sizes = unionFindComponents(len(nodeList), sources, sinks)
+        rootSizes = sizes[np.unique(roots)]
+        if (rootSizes == rootSizes.max()).sum() > 1:
+            myHash.update('\n\n')
+            myHash.update('\n'.join(nodeList))
+
+    fingerprint = myHash.hexdigest()
+    if conn is None:
+        with open(cacheFile, 'w') as outFile:
+            outFile.write(fingerprint+'\n')
+    return fingerprint
+
+# copyGenomeFiles
+# Copy the output files of one genome to another genome with the same
+# fingerprint: every file in the source genome's directory whose name begins
+# with <source genome><prefix>, renamed for the target genome.
+# Input: directory containing the genome directories, source genome, target
+# genome, file name prefix (e.g., 'Red' or 'SCC')
+# Output: None
+
+def copyGenomeFiles(outputDir, sourceDir, targetDir, prefix):
+    if not os.path.exists(outputDir+'/'+targetDir):
+        os.makedirs(outputDir+'/'+targetDir)
+    for fileName in sorted(os.listdir(outputDir+'/'+sourceDir)):
+        if fileName.startswith(sourceDir+prefix):
+            iof.copyOutput(outputDir+'/'+sourceDir+'/'+fileName,
+                           outputDir+'/'+targetDir+'/'+targetDir+fileName[len(sourceDir):])
+    return
+
+# reportDedup
+# Print how many genomes were computed and how many reused the results of an
+# identical genome.
+# Input: description of the stage, number of genomes, number of genomes
+# computed
+# Output: None
+
+def reportDedup(stage, numGenomes, numComputed):
+    print '%s: computed %i of %i genomes, reused results for %i' % (stage, numComputed, numGenomes,
+                                                                   numGenomes - numComputed)
+    return
+
+################################################################################
+
 # plotGraphStats
 # Plot summary statistics of a collection of graph objects. The function plots
 # historams of:
 #   graph size (number of nodes)
 #   total number of components
 #   size of largest compmonent, as fraction of total nodes
+# The distributions are computed by reportFunctions.graphStatDistributions;
+# use reportFunctions.writeReport to render them to files instead.
 # Input: array containing one row for each graph object. Array columns
 # correspond to: the number of nodes (metabolites), edges, total components,
 # and size of the largest component.
 # Output: collection of plots
 
 def plotGraphStats(graphStatArray):
-# Histogram of number of nodes
-    myWeight = np.ones_like(graphStatArray[:,0]) / float(len(graphStatArray[:,0]))
-    plt.figure(1)
-    binWidth = 10
-    binMin = (min(graphStatArray[:,0]) / binWidth)*binWidth
-    binMax = ((max(graphStatArray[:,0]) / binWidth)*binWidth) + binWidth
-    plt.hist(graphStatArray[:,0], bins=range(binMin, binMax + binWidth, binWidth), weights=myWeight)
-    plt.xlabel('Total Nodes')
-    plt.xlim(binMin, binMax)
-    plt.ylabel('Fraction of Graphs')
-
-# Histogram of number of components
-    myWeight = np.ones_like(graphStatArray[:,2]) / float(len(graphStatArray[:,2]))
-    plt.figure(2)
-    binWidth = 1
-    binMin = min(graphStatArray[:,2])
-    binMax = max(graphStatArray[:,2]) + binWidth
-    plt.hist(graphStatArray[:,2], bins=range(binMin, binMax + binWidth, binWidth), weights=myWeight)
-    plt.xlabel('Number of Components')
-    plt.ylabel('Fraction of Graphs')
-
-# Histogram of largest component size
-    myArray = np.true_divide(graphStatArray[:,3], graphStatArray[:,0]);
-    myWeight = np.ones_like(myArray) / float(len(myArray))
-    plt.figure(3)
-    plt.hist(myArray, weights=myWeight)
-    plt.xlabel('Fraction of Nodes in Largest Component')
-    plt.ylabel('Fraction of Graphs')
+
+    distDict = rf.graphStatDistributions(graphStatArray)[0]
+    for name in ['graphNodes', 'graphComponents', 'graphLargestFraction']:
+        rf.drawHistogram(plt.figure().gca(), distDict[name])
 
     return
 
@@ -108,58 +290,22 @@ def plotGraphStats(graphStatArray):
 # plotSeedStats
 # Plot summary statistics of a collection of seed sets. The function plots
 # historams of:
-#   digraph size (number of nodes)
-#   total number of components
-#   size of largest compmonent, as fraction of total nodes
+#   number of seed sets in each graph
+#   size of individual seed sets
+#   size of individual seed sets, zoomed to exclude seed sets of size one
 # Inputs:
 #  seedSetList: "List of lists" of seed metabolites. Each element is a list of nodes belonging
 #   to an SCC which is also a seed set.
 #  reducedGraphStatArray: array containing one row for each graph object. Array
 #   columns correspond to: the number of nodes (metabolites), edges, total
 #   components, and size of the largest component.
-#  modelStatArray: array containing one row for each original SBML file/model.
-#    Array columns correspond to:  the number of genes, metabolites, and reactions
-#    in the SBML file.
 # Output: collection of plots
 
 def plotSeedStatsForTribes(seedSetList, reducedGraphStatArray):
-# Histogram of total number of seed sets
-    myNumSeedSets = []
-    mySizeOfSeedSets = []
-
-    for setOfSeedSets in seedSetList:
-        myNumSeedSets.append(len(setOfSeedSets))
-        for seedSet in setOfSeedSets:
-            mySizeOfSeedSets.append(len(seedSet))
-
-    myWeight = np.ones_like(myNumSeedSets) / float(len(myNumSeedSets))
-    plt.figure(12)
-    binWidth = 10
-    binMin = (min(myNumSeedSets) / binWidth)*binWidth
-    binMax = ((max(myNumSeedSets) / binWidth)*binWidth) + binWidth
-    plt.hist(myNumSeedSets, bins=range(binMin, binMax + binWidth, binWidth), weights=myWeight)
-    plt.xlabel('Number of Seed Sets')
-    plt.ylabel('Fraction of Graphs')
-
-# Histogram of size of individual seed sets
-    myWeight = np.ones_like(mySizeOfSeedSets) / float(len(mySizeOfSeedSets))
-    plt.figure(13)
-    binWidth = 1
-    binMin = min(mySizeOfSeedSets)
-    binMax = max(mySizeOfSeedSets) + binWidth
-    plt.hist(mySizeOfSeedSets, bins=range(binMin, binMax + binWidth, binWidth), weights=myWeight)
-    plt.xlabel('Metabolites in Seed Set')
-    plt.xlim(0, max(mySizeOfSeedSets)+1)
-    plt.ylim(0, 1)
-    plt.ylabel('Fraction of Seed Sets')
-
-# Zoomed histogram of size of individual seed sets
-    plt.figure(14)
-    [n, bins, patches] = plt.hist(mySizeOfSeedSets, bins=range(binMin, binMax + binWidth, binWidth), weights=myWeight)
-    plt.xlabel('Metabolites in Seed Set (Zoomed)')
-    plt.xlim(0, max(mySizeOfSeedSets)+1)
-    plt.ylim(0, 1.1*n[1])
-    plt.ylabel('Fraction of Seed Sets (Zoomed)')
+
+    distDict = rf.seedStatDistributions(*rf.seedSetArrays(seedSetList))[0]
+    for name in ['seedSetCount', 'seedSetSize', 'seedSetSizeZoomed']:
+        rf.drawHistogram(plt.figure().gca(), distDict[name])
 
     return
 
@@ -168,7 +314,7 @@ def plotSeedStatsForTribes(seedSetList, reducedGraphStatArray):
 # createMergedGraph
 # In this function, all samples from a tribe are identified. Each sample is
 # converted to a graph object and merged with the previous graph. The final
-# graph is written to file.
+# graph is written to file in the formats given by ioFunctions.outputFormats.
 
 def createMergedGraph(groupSampleDict, processedDataDir, rawModelDir):
 
@@ -185,8 +331,8 @@ def createMergedGraph(groupSampleDict, processedDataDir, rawModelDir):
         for sample in groupSampleDict[group]:
 
 # Read in adjacency list and convert to digraph object
-            myDiGraph = nx.read_adjlist(rawModelDir+'/'+sample+'/'+sample+'AdjList.txt',
-                                create_using=nx.DiGraph())
+            with iof.openFile(iof.findFile(rawModelDir+'/'+sample+'/'+sample+'AdjList.txt')) as inFile:
+                myDiGraph = nx.read_adjlist(inFile, create_using=nx.DiGraph())
 
 # Append to the previous graph
             mergedGraph = nx.compose(mergedGraph, myDiGraph)
@@ -195,20 +341,302 @@ def createMergedGraph(groupSampleDict, processedDataDir, rawModelDir):
         if not os.path.exists(processedDataDir+'/'+group):
             os.makedirs(processedDataDir+'/'+group)
 
-        nx.write_adjlist(mergedGraph, processedDataDir+'/'+group+'/'+group+'AdjList.txt')
-        nx.write_graphml(mergedGraph, processedDataDir+'/'+group+'/'+group+'Graph.xml')
+        iof.writeGraph(mergedGraph, processedDataDir+'/'+group+'/'+group, requiredFormats=['adjlist'])
 
     return
 
 ################################################################################
 
+# iterGraphStats
+# Generator over a list of genome directories. For each genome, reads in the
+# adjacency list and converts it to both a graph and a digraph, then yields the
+# statistics for each. The graph objects are discarded before the next genome
+# is read, so memory use does not grow with the number of genomes.
+# Input: list of genome directories, directory containing the adjacency lists
+# Output: yields (genome, graphStats, diGraphStats) tuples, where each stats
+# entry is a four-element list as returned by getGraphStats/getDiGraphStats.
+# If a dictionary is given as 'dedupCache', genomes are fingerprinted (see
+# genomeFingerprint) and results are computed once per fingerprint. The
+# dictionary is filled with {fingerprint: (first genome, results...)}. If a
+# result store connection is given as 'conn', the adjacency lists are read
+# from the database.
+
+def iterGraphStats(dirList, processedDataDir, dedupCache=None, conn=None):
+
+    for curDir in dirList:
+# Reuse the results of an identical genome, if one has been seen
+        if dedupCache is not None:
+            fingerprint = genomeFingerprint(curDir, processedDataDir, conn)
+            if fingerprint in dedupCache:
+                yield (curDir,) + dedupCache[fingerprint][1:]
+                continue
+
+# Read in adjacency list as integer edge arrays. Statistics for the undirected
+# graph are computed directly from the edge stream by union-find.
+        nodeList, sources, sinks = genomeEdgeArrays(curDir, processedDataDir, 'adj', conn)
+        graphStats, keepMask = getEdgeStreamStats(len(nodeList), sources, sinks)
+
+# Convert the edge arrays to a digraph object
+        myDiGraph = nx.DiGraph()
+        myDiGraph.add_nodes_from(nodeList)
+        myDiGraph.add_edges_from((nodeList[source], nodeList[sink]) for source, sink in itertools.izip(sources, sinks))
+        diGraphStats = getDiGraphStats(myDiGraph)
+
+        if dedupCache is not None:
+            dedupCache[fingerprint] = (curDir, graphStats, diGraphStats)
+        yield curDir, graphStats, diGraphStats
+
+################################################################################
+
+# iterReducedGraphs
+# Generator over a list of genome directories. For each genome, identifies the
+# largest component of the network graph, discards nodes outside of it, writes
+# the reduced digraph to file, and yields statistics on the reduced graph and
+# digraph. Only one genome is held in memory at a time.
+# Input: list of genome directories, directory containing the adjacency lists
+# Output: yields (genome, reducedGraphStats, reducedDiGraphStats) tuples. If
+# 'dedupCache' is given, genomes identical to one already seen have the
+# reduced graph files copied rather than recomputed (see iterGraphStats). If
+# 'conn' is given, graphs are read from and written to the result store
+# instead of files; the caller commits.
+
+def iterReducedGraphs(dirList, processedDataDir, dedupCache=None, conn=None):
+
+    for curDir in dirList:
+        if dedupCache is not None:
+            fingerprint = genomeFingerprint(curDir, processedDataDir, conn)
+            if fingerprint in dedupCache:
+                if conn is not None:
+                    stf.copyGenomeRows(conn, dedupCache[fingerprint][0], curDir, ['red'])
+                else:
+                    copyGenomeFiles(processedDataDir, dedupCache[fingerprint][0], curDir, 'Red')
+                yield (curDir,) + dedupCache[fingerprint][1:]
+                continue
+
+# Read in adjacency list as integer edge arrays
+        nodeList, sources, sinks = genomeEdgeArrays(curDir, processedDataDir, 'adj', conn)
+
+# Identify the largest connected component of the undirected graph by
+# union-find. Both endpoints of an edge lie in the same component, so the
+# directed edges to keep are selected by masking on their source.
+        graphStats, keepMask = getEdgeStreamStats(len(nodeList), sources, sinks)
+        edgeMask = keepMask[sources]
+        sources = sources[edgeMask]
+        sinks = sinks[edgeMask]
+
+# Statistics of the reduced graph: a single component containing all remaining
+# nodes
+        reducedNodes = int(keepMask.sum())
+        reducedStats = [reducedNodes, countUndirectedEdges(len(nodeList), sources, sinks),
+                        min(reducedNodes, 1), reducedNodes]
+
+# Build the reduced digraph from the retained nodes and edges
+        myDiGraph = nx.DiGraph()
+        myDiGraph.add_nodes_from(nodeList[node] for node in np.flatnonzero(keepMask))
+        myDiGraph.add_edges_from((nodeList[source], nodeList[sink]) for source, sink in itertools.izip(sources, sinks))
+
+# Write the reduced digraph to file. The adjacency list is always written,
+# since computeSeedSets reads it.
+        if conn is not None:
+            stf.storeGraph(conn, curDir, 'red', myDiGraph)
+        else:
+            iof.writeGraph(myDiGraph, processedDataDir+'/'+curDir+'/'+curDir+'Red', requiredFormats=['adjlist'])
+        reducedDiStats = getDiGraphStats(myDiGraph)
+
+        if dedupCache is not None:
+            dedupCache[fingerprint] = (curDir, reducedStats, reducedDiStats)
+        yield curDir, reducedStats, reducedDiStats
+
+################################################################################
+
+# readNamesDict
+# Read metabMap.csv in as a dictionary mapping Model SEED metabolite
+# identifiers to their common names. Note: The file metabMap.csv was created
+# manually from the seed database, and should be updated to reflect the
+# particulars of your data set.
+# Input: None
+# Output: dictionary of {metabolite ID: common name}
+
+def readNamesDict():
+    with open(dataPath+'/metabMap.csv', mode='rU') as inFile:
+        reader = csv.reader(inFile)
+        namesDict = dict((rows[0],rows[1]) for rows in reader)
+    return namesDict
+
+################################################################################
+
+# genomeSeedSets
+# Computes the seed sets of a single genome's reduced digraph (see
+# computeSeedSets) and writes the condensation and seed compounds to file.
+# Input: genome directory, directory containing the reduced adjacency list,
+# directory in which to write seed compounds, dictionary of metabolite names
+# (from readNamesDict), result store connection or None. If 'conn' is given,
+# the reduced digraph is read from the database and the condensation, SCC
+# members and seed compounds are written to it instead of to files.
+# Output: "list of lists" of seed metabolites for that genome
+
+def genomeSeedSets(curDir, processedDataDir, seedDir, namesDict, conn=None):
+
+    # Read in adjacency list and convert to digraph object
+    if conn is not None:
+        myDiGraph = stf.loadEdges(conn, curDir, 'red')
+    else:
+        with iof.openFile(iof.findFile(processedDataDir+'/'+curDir+'/'+curDir+'RedAdjList.txt')) as inFile:
+            myDiGraph = nx.read_adjlist(inFile, create_using=nx.DiGraph())
+
+    # Compute the list of SCCs for the digraph as well as its condensation
+    myCondensation = nx.condensation(myDiGraph)
+
+    # The condensation carries its SCC mapping as graph and node attributes, which
+    # GraphML cannot represent. Write a copy containing only its structure.
+    mySCCGraph = nx.DiGraph()
+    mySCCGraph.add_nodes_from(myCondensation.nodes())
+    mySCCGraph.add_edges_from(myCondensation.edges())
+    if conn is not None:
+        stf.storeGraph(conn, curDir, 'scc', mySCCGraph)
+    else:
+        iof.writeGraph(mySCCGraph, processedDataDir+'/'+curDir+'/'+curDir+'SCC', requiredFormats=['adjlist'])
+
+
+    # Invert the mapping dictionary to map SCC nodes to their original compoundsm
+    mapDict = dict()
+    for key in myCondensation.graph.items()[0][1].keys():
+        value = str(myCondensation.graph.items()[0][1][key])
+        # If the value exists as a key in mapDict, append the new value
+        if value in mapDict.keys():
+            mapDict[value].append(str(key))
+            # Otherwise create it
+        else:
+            mapDict[value] = [str(key)]
+
+    if conn is not None:
+        stf.storeSCCDict(conn, curDir, mapDict)
+    else:
+        dictFile=iof.openOutput(processedDataDir+'/'+curDir+'/'+curDir+'SCCDict.txt')
+        for key in mapDict.keys():
+            dictFile.write(str(key)+',')
+            dictFile.write(",".join(str(value) for value in mapDict[key]))
+            dictFile.write('\n')
+        dictFile.close()
+
+    # "List of lists" of seed metabolites. Each element is a list of nodes belonging
+    # to an SCC which is also a seed set.
+    mySeeds = []
+
+    # For each node (SCC) of the condensation, examine each its in-degree. If the
+    # in-degree is zero (only outgoing edges), the SCC is a seed set. Append the
+    # SCC (as a list of nodes) to the list of seed sets.
+    for node in myCondensation.nodes():
+        inDeg = myCondensation.in_degree(node)
+        if inDeg == 0:
+            mySeeds.append(mapDict[str(node)])
+
+    # Compute weights for each seed metabolite and write to file. Each row of the
+    # output file contains a metabolite and its weight (1 / size of the seed set).
+    # The Model SEED metabolite identifier is replaced with its common name.
+
+    if conn is not None:
+        stf.storeSeeds(conn, curDir, [(metab, namesDict[idf.compoundId(metab)], 1 / float(len(seed)))
+                                      for seed in mySeeds for metab in seed])
+        return mySeeds
+
+    if not os.path.exists(seedDir+'/'+curDir):
+        os.makedirs(seedDir+'/'+curDir)
+    seedFile = iof.openOutput(seedDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt')
+    for seed in mySeeds:
+        myWeight = 1 / float(len(seed))
+        for metab in seed:
+            seedFile.write('%s\t%s\t%f\n' % (metab, namesDict[idf.compoundId(metab)], myWeight) )
+    seedFile.close()
+
+    return mySeeds
+
+################################################################################
+
+# iterSeedSets
+# Generator over a list of genome directories. For each reduced digraph,
+# computes its seed sets via genomeSeedSets and yields them. Only one genome is
+# held in memory at a time.
+# Input: list of genome directories, directory containing the reduced
+# adjacency lists, directory in which to write seed compounds
+# Output: yields (genome, seeds) tuples, where seeds is a "list of lists" of
+# seed metabolites for that genome. If 'dedupCache' is given, genomes
+# identical to one already seen have the condensation and seed compound files
+# copied rather than recomputed (see iterGraphStats). If 'conn' is given,
+# results are read from and written to the result store (see genomeSeedSets);
+# the caller commits.
+
+def iterSeedSets(dirList, processedDataDir, seedDir, dedupCache=None, conn=None):
+
+    # Read in the metabolite names once for the whole collection
+    namesDict = readNamesDict()
+
+    for curDir in dirList:
+        yield curDir, dedupSeedSets(curDir, processedDataDir, seedDir, namesDict, dedupCache, conn)
+
+# dedupSeedSets
+# Compute the seed sets of a genome via genomeSeedSets, or copy them from an
+# identical genome listed in 'dedupCache'.
+
+def dedupSeedSets(curDir, processedDataDir, seedDir, namesDict, dedupCache, conn=None):
+    if dedupCache is None:
+        return genomeSeedSets(curDir, processedDataDir, seedDir, namesDict, conn)
+
+    fingerprint = genomeFingerprint(curDir, processedDataDir, conn)
+    if fingerprint in dedupCache:
+        sourceDir, mySeeds = dedupCache[fingerprint]
+        if conn is not None:
+            stf.copyGenomeRows(conn, sourceDir, curDir, ['scc'], copySeeds=True)
+        else:
+            copyGenomeFiles(processedDataDir, sourceDir, curDir, 'SCC')
+            copyGenomeFiles(seedDir, sourceDir, curDir, 'SeedCompounds')
+        return mySeeds
+
+    mySeeds = genomeSeedSets(curDir, processedDataDir, seedDir, namesDict, conn)
+    dedupCache[fingerprint] = (curDir, mySeeds)
+    return mySeeds
+
+################################################################################
+
+# iterGenomeResults
+# Generator which runs the full per-genome graph pipeline: reduction to the
+# largest component followed by computation of seed sets. Each genome is
+# processed to completion before the next is read, so downstream consumers
+# can start work on the first record without waiting for the whole collection.
+# Input: list of genome directories, directory containing the adjacency lists,
+# directory in which to write seed compounds
+# Output: yields (genome, stats, seeds) tuples, where stats is the four-element
+# statistics list for the reduced graph and seeds is a "list of lists" of seed
+# metabolites. If 'dedupCache' is given, seed sets are shared between
+# identical genomes as in iterSeedSets, and if 'conn' is given, results are
+# kept in the result store.
+
+def iterGenomeResults(dirList, processedDataDir, seedDir, dedupCache=None, conn=None):
+
+    namesDict = readNamesDict()
+    reducedCache = None
+    if dedupCache is not None:
+        reducedCache = {}
+
+    for curDir, redStats, redDiStats in iterReducedGraphs(dirList, processedDataDir, reducedCache, conn):
+        yield curDir, redStats, dedupSeedSets(curDir, processedDataDir, seedDir, namesDict, dedupCache, conn)
+
+################################################################################
+
 # computeGraphStats
 # This functions reads in the adjacency lists from the given directory and
 # creates graph and directed graph (digraph) representations of each list. The
 # objects are created using the networkX package. Summary statistics for the
-# graph and directed graph are also reported and written to file.
+# graph and directed graph are also reported and written to file. If 'shard'
+# is given, the summary files are written as partials for that shard (see
+# metadataFunctions.mergeShardSummaries). If 'dedup' is True, genomes with
+# identical graphs share one computation (see genomeFingerprint); unless a
+# result store is used, this writes a <genome>Fingerprint.txt cache next to
+# each adjacency list. If a result store connection is given as 'conn', the
+# adjacency lists are read from the database and the statistics are also
+# stored in it.
 
-def computeGraphStats(dirList, processedDataDir, summaryStatsDir):
+def computeGraphStats(dirList, processedDataDir, summaryStatsDir, shard=None, dedup=False, conn=None):
 
 # Check that folders exist and create them if necessary
     if not os.path.exists(summaryStatsDir):
@@ -224,56 +652,48 @@ def computeGraphStats(dirList, processedDataDir, summaryStatsDir):
     diGraphStatArray = np.empty([numSubDir, 4], dtype = int)
 
 # Create files to record the summary statistics.
-    graphFile = open(summaryStatsDir+'/'+'GraphStatistics.txt', 'w')
+    graphFile = open(summaryStatsDir+'/'+mf.shardFileName('GraphStatistics.txt', shard), 'w')
     graphFile.write('Model,Nodes,Edges,Total Components,Size of Largest\n')
 
-    diGraphFile = open(summaryStatsDir+'/'+'DiGraphStatistics.txt', 'w')
+    diGraphFile = open(summaryStatsDir+'/'+mf.shardFileName('DiGraphStatistics.txt', shard), 'w')
     diGraphFile.write('Model,Nodes,Edges,Total Components,Size of Largest\n')
 
-# Create lists to store the graph and digraph objects
-    graphList = []
-    diGraphList = []
-
-# Iterate over the list of genome directories. For each genome, read in the
-# adjacency list and convert it to both a graph and a digraph. Retrieve
-# properties of the (di)graph and record in the appropriate array. Write these
-# statistics to file.
+# Iterate over the statistics for each genome, as yielded by iterGraphStats.
+# Record them in the appropriate array and write them to file.
     count = 0
     print 'Computing graph statistics'
 
-    for curDir in dirList:
-# Read in adjacency list and convert to graph object
-        myGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt',
-                              create_using=nx.Graph())
+    dedupCache = None
+    if dedup:
+        dedupCache = {}
 
-# Read in adjacency list and convert to digraph object
-        myDiGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt',
-                                create_using=nx.DiGraph())
+    for curDir, graphStats, diGraphStats in iterGraphStats(dirList, processedDataDir, dedupCache, conn):
 
-# Append to the appropriate list
-        graphList.append(myGraph)
-        diGraphList.append(myDiGraph)
-
-# Read model statistics by invoking graphFunctions.getGraphStats
-        graphStatArray[count:] = getGraphStats(myGraph)
+        graphStatArray[count:] = graphStats
         graphFile.write('%s,%i,%i,%i,%i\n' % (curDir, graphStatArray[count,0],
                                        graphStatArray[count,1],
                                        graphStatArray[count, 2],
                                        graphStatArray[count, 3] ) )
 
-# Read model statistics by invoking graphFunctions.getDiGraphStats
-        diGraphStatArray[count:] = getDiGraphStats(myDiGraph)
+        diGraphStatArray[count:] = diGraphStats
         diGraphFile.write('%s,%i,%i,%i,%i\n' % (curDir, diGraphStatArray[count,0],
                                        diGraphStatArray[count,1],
                                        diGraphStatArray[count, 2],
                                        diGraphStatArray[count, 3] ) )
 
         count = count + 1
+        if conn is not None:
+            stf.storeGraphStats(conn, curDir, 'graph', graphStats)
+            stf.storeGraphStats(conn, curDir, 'digraph', diGraphStats)
+            stf.commitBatch(conn, count, numSubDir)
 
 # Close files containing summary data
     graphFile.close()
     diGraphFile.close()
 
+    if dedup:
+        reportDedup('Graph statistics', count, len(dedupCache))
+
     return graphStatArray, diGraphStatArray
 
 ################################################################################
@@ -281,9 +701,16 @@ def computeGraphStats(dirList, processedDataDir, summaryStatsDir):
 # reduceToLargeComponent
 # This function iterates over a list of genomes and identifies the largest
 # component of that genome's network graph. Nodes outside of this component are
-# discarded, and the reduced graph is written to file.
+# discarded, and the reduced graph is written to file. If 'shard' is given, the
+# summary files are written as partials for that shard. If 'dedup' is True,
+# genomes with identical graphs share one computation: when working on files,
+# each genome gets a <genome>Fingerprint.txt cache, and a duplicate genome gets
+# copies of the first genome's RedAdjList files, renamed to its own ID. If a
+# result store connection is given as 'conn', the graphs are read from and the
+# reduced graphs and statistics written to the database, in place of the
+# RedAdjList files.
 
-def reduceToLargeComponent(dirList, processedDataDir, summaryStatsDir):
+def reduceToLargeComponent(dirList, processedDataDir, summaryStatsDir, shard=None, dedup=False, conn=None):
 
     numSubDir = len(dirList)
 
@@ -294,69 +721,48 @@ def reduceToLargeComponent(dirList, processedDataDir, summaryStatsDir):
     reducedDiGraphStatArray = np.empty([numSubDir, 4], dtype = int)
 
 # Create files to record the summary statistics.
-    reducedGraphFile = open(summaryStatsDir+'/'+'ReducedGraphStatistics.txt', 'w')
+    reducedGraphFile = open(summaryStatsDir+'/'+mf.shardFileName('ReducedGraphStatistics.txt', shard), 'w')
     reducedGraphFile.write('Model,Nodes,Edges,Total Components,Size of Largest\n')
 
-    reducedDiGraphFile = open(summaryStatsDir+'/'+'ReducedDiGraphStatistics.txt', 'w')
+    reducedDiGraphFile = open(summaryStatsDir+'/'+mf.shardFileName('ReducedDiGraphStatistics.txt', shard), 'w')
     reducedDiGraphFile.write('Model,Nodes,Edges,Total Components,Size of Largest\n')
 
-# Create lists to store the graph and digraph objects
-    reducedGraphList = []
-    reducedDiGraphList = []
-
-# Iterate over the list of genome directories. For each graph, identify its
-# largest component and identify the nodes belonging to each component.
-# Aggregate the remaining nodes and remove them from both the graph and the
-# digraph. Write the graph and diGraph to file as an adjacency list.
+# Iterate over the reduced graphs as yielded by iterReducedGraphs. Record the
+# statistics in the appropriate array and write them to file.
     count = 0
     print 'Reducing to largest component'
 
-    for curDir in dirList:
+    dedupCache = None
+    if dedup:
+        dedupCache = {}
 
-# Read in adjacency list and convert to graph object
-        myGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt',
-                              create_using=nx.Graph())
+    for curDir, graphStats, diGraphStats in iterReducedGraphs(dirList, processedDataDir, dedupCache, conn):
 
-# Read in adjacency list and convert to digraph object
-        myDiGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'AdjList.txt',
-                                create_using=nx.DiGraph())
-
-# Identify the connected components of the graph representation and sort from
-# largest to smallest (subGraphs). Aggregate the nodes in all but the largest
-# component (removeNodes).
-        subGraphs = sorted(nx.connected_components(myGraph), key = len, reverse=True)
-        removeNodes = list(itertools.chain(*subGraphs[1:len(subGraphs)]))
-
-# Remove these nodes from both the graph and digraph
-        myGraph.remove_nodes_from(removeNodes)
-        myDiGraph.remove_nodes_from(removeNodes)
-
-# Append to the appropriate list
-        reducedGraphList.append(myGraph)
-        reducedDiGraphList.append(myDiGraph)
-
-# Read model statistics by invoking graphFunctions.getGraphStats
-        reducedGraphStatArray[count:] = getGraphStats(myGraph)
+        reducedGraphStatArray[count:] = graphStats
         reducedGraphFile.write('%s,%i,%i,%i,%i\n' % (curDir, reducedGraphStatArray[count,0],
                                        reducedGraphStatArray[count,1],
                                        reducedGraphStatArray[count, 2],
                                        reducedGraphStatArray[count, 3] ) )
-# Read model statistics by invoking graphFunctions.getDiGraphStats
-        reducedDiGraphStatArray[count:] = getDiGraphStats(myDiGraph)
+
+        reducedDiGraphStatArray[count:] = diGraphStats
         reducedDiGraphFile.write('%s,%i,%i,%i,%i\n' % (curDir, reducedDiGraphStatArray[count,0],
                                        reducedDiGraphStatArray[count,1],
                                        reducedDiGraphStatArray[count, 2],
                                        reducedDiGraphStatArray[count, 3] ) )
-# Create adjacency list for the reduced digraph and write to file
-        nx.write_adjlist(myDiGraph, processedDataDir+'/'+curDir+'/'+curDir+'RedAdjList.txt')
-        nx.write_graphml(myDiGraph, processedDataDir+'/'+curDir+'/'+curDir+'RedGraph.xml')
 
         count = count + 1
+        if conn is not None:
+            stf.storeGraphStats(conn, curDir, 'reducedGraph', graphStats)
+            stf.storeGraphStats(conn, curDir, 'reducedDigraph', diGraphStats)
+            stf.commitBatch(conn, count, numSubDir)
 
 # Close files containing summary data
     reducedGraphFile.close()
     reducedDiGraphFile.close()
 
+    if dedup:
+        reportDedup('Reduction to largest component', count, len(dedupCache))
+
     return reducedGraphStatArray
 
 ################################################################################
@@ -380,91 +786,33 @@ def reduceToLargeComponent(dirList, processedDataDir, summaryStatsDir):
 # for each seed set. Additional statistics on the reduced graph and digraph
 # are also computed.
 
-def computeSeedSets(dirList, processedDataDir, seedDir):
+# The work for each genome is done by iterSeedSets; this function collects the
+# results into a list. Callers which do not need the full collection at once
+# should iterate over iterSeedSets directly. If 'dedup' is True, genomes with
+# identical graphs share one computation: when working on files, each genome
+# gets a <genome>Fingerprint.txt cache, and a duplicate genome gets copies of
+# the first genome's SCC and SeedCompounds files, renamed to its own ID. If a
+# result store connection is given as 'conn', the reduced graphs are read from
+# the database and the condensations, SCC members and seed compounds are
+# written to it, in place of the SCC and SeedCompounds files.
 
-    # Create lists to store seed sets
-    # seedSetList is a list of lists. Each outer list contains all the seed sets
-    # for that graph.
-    seedSetList = []
+def computeSeedSets(dirList, processedDataDir, seedDir, dedup=False, conn=None):
 
-    # Iterate over the list of genome directories. For each reduced digraph,
-    # identify its condensation (SCCs). For each node of the SCC, check if it
-    # is a seed set by computing its in-degree. If yes, append the SCC (as a list
-    # of nodes) to the list of seed sets. Then compute some summary statistics.
-    count = 0
     print 'Computing seed sets'
 
-    for curDir in dirList:
-
-        # Read in adjacency list and convert to digraph object
-        myDiGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'RedAdjList.txt',
-                                create_using=nx.DiGraph())
-
-        # Compute the list of SCCs for the digraph as well as its condensation
-        myCondensation = nx.condensation(myDiGraph)
-        nx.write_adjlist(myCondensation, processedDataDir+'/'+curDir+'/'+curDir+'SCCAdjList.txt')
-
-        # For some reason, the condensation cannot be written to GraphML. Instead, re-read the
-        # adjacency list and write that to GraphML.
-        myTempGraph = nx.read_adjlist(processedDataDir+'/'+curDir+'/'+curDir+'SCCAdjList.txt',
-                                create_using=nx.DiGraph())
-        nx.write_graphml(myTempGraph, processedDataDir+'/'+curDir+'/'+curDir+'SCCGraph.xml')
-
-
-        # Invert the mapping dictionary to map SCC nodes to their original compoundsm
-        mapDict = dict()
-        for key in myCondensation.graph.items()[0][1].keys():
-            value = str(myCondensation.graph.items()[0][1][key])
-            # If the value exists as a key in mapDict, append the new value
-            if value in mapDict.keys():
-                mapDict[value].append(str(key))
-                # Otherwise create it
-            else:
-                mapDict[value] = [str(key)]
-
-        dictFile=open(processedDataDir+'/'+curDir+'/'+curDir+'SCCDict.txt', "w")
-        for key in mapDict.keys():
-            dictFile.write(str(key)+',')
-            dictFile.write(",".join(str(value) for value in mapDict[key]))
-            dictFile.write('\n')
-        dictFile.close()
+    dedupCache = None
+    if dedup:
+        dedupCache = {}
 
-        # "List of lists" of seed metabolites. Each element is a list of nodes belonging
-        # to an SCC which is also a seed set.
-        mySeeds = []
-
-        # For each node (SCC) of the condensation, examine each its in-degree. If the
-        # in-degree is zero (only outgoing edges), the SCC is a seed set. Append the
-        # SCC (as a list of nodes) to the list of seed sets.
-        for node in myCondensation.nodes():
-            inDeg = myCondensation.in_degree(node)
-            if inDeg == 0:
-                mySeeds.append(mapDict[str(node)])
+    # seedSetList is a list of lists. Each outer list contains all the seed sets
+    # for that graph.
+    seedSetList = []
+    for curDir, mySeeds in iterSeedSets(dirList, processedDataDir, seedDir, dedupCache, conn):
         seedSetList.append(mySeeds)
+        if conn is not None:
+            stf.commitBatch(conn, len(seedSetList), len(dirList))
 
-        # Update the list of seed metabolites: replace the Model SEED metabolite
-        # identifier with its common name. Note: The file metabMap.csv was created
-        # manually from the seed database, and should be updated to reflect the
-        # particulars of your data set. As above, record the seed metabolite for each
-        # graph.
-
-        # First read metabMap.csv in as a dictionary
-        with open(dataPath+'/metabMap.csv', mode='rU') as inFile:
-            reader = csv.reader(inFile)
-            namesDict = dict((rows[0],rows[1]) for rows in reader)
-
-        # Compute weights for each seed metabolite and write to file. Each row of the
-        # output file contains a metabolite and its weight (1 / size of the seed set).
-
-        if not os.path.exists(seedDir+'/'+curDir):
-            os.makedirs(seedDir+'/'+curDir)
-        seedFile = open(seedDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt', 'w')
-        for seed in mySeeds:
-            myWeight = 1 / float(len(seed))
-            for metab in seed:
-                seedFile.write('%s\t%s\t%f\n' % (metab, namesDict[re.sub('_[a-d]', '', metab)], myWeight) )
-        seedFile.close()
-
-        count = count + 1
+    if dedup:
+        reportDedup('Seed sets', len(seedSetList), len(dedupCache))
 
     return seedSetList
@@ -0,0 +1,92 @@
+###############################################################################
+# idFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for parsing ModelSEED metabolite and reaction identifiers.
+# Identifiers have the form <compound>_<compartment><index>, e.g. cpd00001_c0,
+# or cpd00001_c once the trailing index has been removed. Patterns are compiled
+# once, and parsed identifiers are kept in a bounded cache, since the same
+# identifiers are parsed many times per run.
+################################################################################
+
+# Import Python packages.
+import re
+
+################################################################################
+
+# Precompiled patterns
+idPattern = re.compile('^(.+?)_([a-z])(\d*)$')
+trailingDigitPattern = re.compile('\d$')
+nameSuffixPattern = re.compile('_[a-z]\d$')
+
+# Cache of parsed identifiers. When the cache reaches maxCacheSize entries it
+# is emptied, which bounds memory without the bookkeeping of an LRU cache.
+maxCacheSize = 65536
+parseCache = {}
+
+################################################################################
+
+# parseId
+# Split an identifier into its compound (or reaction), compartment, and index.
+# Identifiers without a compartment suffix are returned whole, with empty
+# compartment and index.
+# Input: identifier, e.g. 'cpd00001_c0'
+# Output: tuple of strings, e.g. ('cpd00001', 'c', '0')
+
+def parseId(modelId):
+    try:
+        return parseCache[modelId]
+    except KeyError:
+        pass
+
+    match = idPattern.match(modelId)
+    if match is None:
+        parsed = (modelId, '', '')
+    else:
+        parsed = match.groups()
+
+    if len(parseCache) >= maxCacheSize:
+        parseCache.clear()
+    parseCache[modelId] = parsed
+    return parsed
+
+################################################################################
+
+# compoundId
+# Input: identifier, e.g. 'cpd00001_c0' or 'cpd00001_c'
+# Output: identifier without compartment or index, e.g. 'cpd00001'
+
+def compoundId(modelId):
+    return parseId(modelId)[0]
+
+# dropIndex
+# Remove the trailing compartment index from an identifier. Identifiers which
+# do not parse (e.g., compartment IDs such as 'c0') lose a trailing digit.
+# Input: identifier, e.g. 'cpd00001_c0'
+# Output: identifier without index, e.g. 'cpd00001_c'
+
+def dropIndex(modelId):
+    compound, compartment, index = parseId(modelId)
+    if compartment == '':
+        return trailingDigitPattern.sub('', modelId)
+    return compound+'_'+compartment
+
+# inCompartment
+# Input: identifier, compartment letter, optional index
+# Output: True if the identifier lies in that compartment (and index)
+
+def inCompartment(modelId, compartment, index=None):
+    parsed = parseId(modelId)
+    return parsed[1] == compartment and (index is None or parsed[2] == index)
+
+# stripNameSuffix
+# Remove a compartment suffix (e.g. '_c0') from a metabolite or reaction name
+# Input: name
+# Output: name without suffix
+
+def stripNameSuffix(name):
+    return nameSuffixPattern.sub('', name)
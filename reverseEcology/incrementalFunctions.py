@@ -0,0 +1,470 @@
+###############################################################################
+# incrementalFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for maintaining a genome's seed sets under reaction edits.
+# During gap-filling and curation, reactions are added to and dropped from a
+# genome a few at a time. Rather than re-running dirListToAdjacencyList,
+# reduceToLargeComponent and computeSeedSets, the functions here keep the
+# genome's digraph, its strongly connected components (SCCs), its weakly
+# connected components, and the condensation (edge counts between SCCs, the
+# in-degree of each SCC, and a topological order of the SCCs) in memory, and
+# update only the components touched by an edit.
+#
+# The topological order is maintained as in Pearce and Kelly's dynamic
+# topological sort. Each SCC has an order value, and an edge which agrees with
+# the order changes nothing. For an edge against the order, only the SCCs whose
+# values lie between those of its endpoints are searched and reordered; if
+# the sink's SCC reaches the source's, the SCCs on the cycle are merged. Order
+# values are tuples: an SCC which splits passes its value on to its pieces by
+# appending their position, so no other SCC needs to be renumbered.
+#
+# The seed sets are the SCCs with no incoming edges which lie in the largest
+# weakly connected component, exactly as in graphFunctions. If two weakly
+# connected components tie for largest, the older one is kept. The largest
+# component is found from a heap of component sizes, and the seed sets are
+# kept in the state: whenever an SCC is created or deleted, its in-degree
+# changes, or its nodes change component, only that SCC is re-examined, and
+# any seed set it gains or loses is logged. The changes reported for a batch
+# of edits are read from this log, so their cost stays with the affected
+# components rather than the whole genome.
+################################################################################
+
+# Import Python packages.
+import collections
+import heapq
+import networkx as nx
+
+################################################################################
+
+# initSeedState
+# Build the in-memory state for a genome from its reaction edges.
+# Input: iterable of (source, sink, reaction) tuples, as returned by
+# sbmlFunctions.reactionEdges or read from RxnEdges.txt
+# Output: state dictionary, used by the other functions in this module
+
+def initSeedState(rxnEdgeList):
+
+    state = {'rxnEdges': collections.defaultdict(list),
+             'edgeCount': collections.defaultdict(int),
+             'graph': nx.DiGraph(),
+             'nodeScc': {}, 'sccMembers': {}, 'sccInDeg': {}, 'seedIds': set(),
+             'sccSucc': {}, 'sccPred': {}, 'sccOrder': {},
+             'nodeWcc': {}, 'wccMembers': {}, 'wccHeap': [], 'largestWcc': None,
+             'reportedIds': set(), 'seedLog': collections.Counter(),
+             'nextId': 0, 'nextOrder': 0}
+
+    for source, sink, rxn in rxnEdgeList:
+        state['rxnEdges'][rxn].append((source, sink))
+        state['edgeCount'][(source, sink)] += 1
+        state['graph'].add_edge(source, sink)
+
+    for members in nx.weakly_connected_components(state['graph']):
+        wccId = newId(state)
+        state['wccMembers'][wccId] = set(members)
+        for node in members:
+            state['nodeWcc'][node] = wccId
+        pushWcc(state, wccId)
+    state['largestWcc'] = largestComponent(state)
+
+    sccList = createSccs(state, [set(members) for members in nx.strongly_connected_components(state['graph'])])
+
+# Order the SCCs topologically (Kahn's algorithm on the condensation)
+    inDegDict = dict((sccId, len(state['sccPred'][sccId])) for sccId in sccList)
+    frontier = [sccId for sccId in sccList if inDegDict[sccId] == 0]
+    while frontier:
+        sccId = frontier.pop()
+        state['sccOrder'][sccId] = (state['nextOrder'],)
+        state['nextOrder'] = state['nextOrder'] + 1
+        for succId in state['sccSucc'][sccId]:
+            inDegDict[succId] = inDegDict[succId] - 1
+            if inDegDict[succId] == 0:
+                frontier.append(succId)
+
+    state['seedLog'].clear()
+    return state
+
+################################################################################
+
+# getSeedSets
+# Retrieve the current seed sets of the genome.
+# Input: state dictionary
+# Output: "list of lists" of seed metabolites, each list sorted
+
+def getSeedSets(state):
+    return sorted(sorted(state['sccMembers'][sccId]) for sccId in state['reportedIds'])
+
+################################################################################
+
+# applyReactionEdits
+# Apply a batch of reaction edits and update the affected components. Edges
+# shared by several reactions are only removed from the graph once no reaction
+# supports them.
+# Input: state dictionary, iterable of (source, sink, reaction) tuples to add,
+# iterable of reaction IDs to remove
+# Output: dictionary with keys 'added' and 'removed', each a "list of lists" of
+# the seed sets gained and lost by the edits
+
+def applyReactionEdits(state, addEdges=(), removeReactions=()):
+
+    state['seedLog'].clear()
+
+    for rxn in removeReactions:
+        for source, sink in state['rxnEdges'].pop(rxn, []):
+            removeEdge(state, source, sink)
+
+    for source, sink, rxn in addEdges:
+        state['rxnEdges'][rxn].append((source, sink))
+        addEdge(state, source, sink)
+
+# A seed set lost and regained within the batch (or the reverse) nets to zero
+    seedLog = state['seedLog']
+    return {'added': sorted(sorted(seed) for seed in seedLog if seedLog[seed] > 0),
+            'removed': sorted(sorted(seed) for seed in seedLog if seedLog[seed] < 0)}
+
+################################################################################
+
+# Helper functions for maintaining the state. These assume the state is
+# consistent on entry and leave it consistent on exit.
+
+def newId(state):
+    state['nextId'] = state['nextId'] + 1
+    return state['nextId']
+
+# pushWcc, largestComponent
+# The heap holds (-size, ID) entries, so its top is the largest component,
+# and the oldest among equals. An entry is pushed whenever a component is
+# created or changes size; outdated entries are discarded when they reach the
+# top, and the heap is rebuilt if they come to outnumber the components.
+
+def pushWcc(state, wccId):
+    heap = state['wccHeap']
+    if len(heap) > 4*len(state['wccMembers']) + 16:
+        heap[:] = [(-len(members), otherId) for otherId, members in state['wccMembers'].items()]
+        heapq.heapify(heap)
+    else:
+        heapq.heappush(heap, (-len(state['wccMembers'][wccId]), wccId))
+
+def largestComponent(state):
+    heap = state['wccHeap']
+    while heap:
+        negSize, wccId = heap[0]
+        if wccId in state['wccMembers'] and len(state['wccMembers'][wccId]) == -negSize:
+            return wccId
+        heapq.heappop(heap)
+    return None
+
+# updateLargest
+# Called after components change size. If a different component has become
+# the largest, the seed sets of the old one are dropped and those of the new
+# one added.
+
+def updateLargest(state):
+    largestWcc = largestComponent(state)
+    if largestWcc == state['largestWcc']:
+        return
+    state['largestWcc'] = largestWcc
+    for sccId in list(state['reportedIds']):
+        refreshSeed(state, sccId)
+    if largestWcc is not None:
+        refreshNodes(state, state['wccMembers'][largestWcc])
+
+# refreshSeed, refreshNodes
+# Re-examine whether an SCC (or the SCCs of a set of nodes) is a seed set in
+# the largest component, and log the change if its status differs from the
+# one last reported.
+
+def refreshSeed(state, sccId):
+    members = state['sccMembers'][sccId]
+    isSeed = sccId in state['seedIds'] and state['nodeWcc'][next(iter(members))] == state['largestWcc']
+    if isSeed and sccId not in state['reportedIds']:
+        state['reportedIds'].add(sccId)
+        state['seedLog'][frozenset(members)] += 1
+    elif not isSeed and sccId in state['reportedIds']:
+        state['reportedIds'].discard(sccId)
+        state['seedLog'][frozenset(members)] -= 1
+
+def refreshNodes(state, nodeSet):
+    for sccId in set(state['nodeScc'][node] for node in nodeSet):
+        refreshSeed(state, sccId)
+
+# createSccs
+# Register sets of nodes as new SCCs, and add their edges to the condensation
+# by scanning the edges of their members. Edges between two new SCCs are
+# counted once, from the successors of their source. The caller assigns the
+# order values.
+# Input: state dictionary, list of sets of nodes
+# Output: list of new SCC IDs
+
+def createSccs(state, memberList):
+    idList = []
+    for members in memberList:
+        sccId = newId(state)
+        state['sccMembers'][sccId] = members
+        state['sccSucc'][sccId] = {}
+        state['sccPred'][sccId] = {}
+        for node in members:
+            state['nodeScc'][node] = sccId
+        idList.append(sccId)
+
+    newSet = set(idList)
+    for sccId in idList:
+        for node in state['sccMembers'][sccId]:
+            for succ in state['graph'].successors(node):
+                if state['nodeScc'][succ] != sccId:
+                    linkScc(state, sccId, state['nodeScc'][succ])
+            for pred in state['graph'].predecessors(node):
+                if state['nodeScc'][pred] != sccId and state['nodeScc'][pred] not in newSet:
+                    linkScc(state, state['nodeScc'][pred], sccId)
+    for sccId in idList:
+        setInDeg(state, sccId, sum(state['sccPred'][sccId].values()))
+    return idList
+
+def deleteScc(state, sccId):
+    if sccId in state['reportedIds']:
+        state['reportedIds'].discard(sccId)
+        state['seedLog'][frozenset(state['sccMembers'][sccId])] -= 1
+    for succId in state['sccSucc'].pop(sccId):
+        del state['sccPred'][succId][sccId]
+    for predId in state['sccPred'].pop(sccId):
+        del state['sccSucc'][predId][sccId]
+    del state['sccMembers'][sccId]
+    del state['sccInDeg'][sccId]
+    state['sccOrder'].pop(sccId, None)
+    state['seedIds'].discard(sccId)
+
+# linkScc, unlinkScc
+# Count one more (or one fewer) graph edge from one SCC to another.
+
+def linkScc(state, sccA, sccB):
+    state['sccSucc'][sccA][sccB] = state['sccSucc'][sccA].get(sccB, 0) + 1
+    state['sccPred'][sccB][sccA] = state['sccPred'][sccB].get(sccA, 0) + 1
+
+def unlinkScc(state, sccA, sccB):
+    state['sccSucc'][sccA][sccB] = state['sccSucc'][sccA][sccB] - 1
+    state['sccPred'][sccB][sccA] = state['sccPred'][sccB][sccA] - 1
+    if state['sccSucc'][sccA][sccB] == 0:
+        del state['sccSucc'][sccA][sccB]
+        del state['sccPred'][sccB][sccA]
+
+def setInDeg(state, sccId, inDeg):
+    state['sccInDeg'][sccId] = inDeg
+    if inDeg == 0:
+        state['seedIds'].add(sccId)
+    else:
+        state['seedIds'].discard(sccId)
+    refreshSeed(state, sccId)
+
+# addNode
+# Add a previously unseen metabolite as its own SCC and weakly connected
+# component.
+
+def addNode(state, node):
+    state['graph'].add_node(node)
+    wccId = newId(state)
+    state['wccMembers'][wccId] = set([node])
+    state['nodeWcc'][node] = wccId
+    pushWcc(state, wccId)
+    sccId = createSccs(state, [set([node])])[0]
+    state['sccOrder'][sccId] = (state['nextOrder'],)
+    state['nextOrder'] = state['nextOrder'] + 1
+    updateLargest(state)
+
+# dropNodeIfIsolated
+# Remove a metabolite which no longer has any edges, as it would not appear
+# in a graph built from scratch.
+
+def dropNodeIfIsolated(state, node):
+    if state['graph'].degree(node) > 0:
+        return
+    state['graph'].remove_node(node)
+    deleteScc(state, state['nodeScc'].pop(node))
+    wccId = state['nodeWcc'].pop(node)
+    del state['wccMembers'][wccId]
+    updateLargest(state)
+
+# relabelWcc
+# Move a set of nodes into a new weakly connected component.
+
+def relabelWcc(state, oldWcc, members):
+    state['wccMembers'][oldWcc] -= members
+    if len(state['wccMembers'][oldWcc]) == 0:
+        del state['wccMembers'][oldWcc]
+    else:
+        pushWcc(state, oldWcc)
+    newWcc = newId(state)
+    state['wccMembers'][newWcc] = members
+    for node in members:
+        state['nodeWcc'][node] = newWcc
+    pushWcc(state, newWcc)
+    refreshNodes(state, members)
+    updateLargest(state)
+
+################################################################################
+
+# addEdge
+# Add one edge. If the endpoints lie in different weakly connected components,
+# the smaller is merged into the larger. If the edge agrees with the
+# topological order of the SCCs, only the sink SCC's in-degree changes.
+# Otherwise the SCCs reachable from the sink's SCC and those reaching the
+# source's SCC are found, searching the condensation only among SCCs whose
+# order lies between the two, and reordered; if the sink's SCC reaches the
+# source's, every SCC on such a path is merged into one.
+
+def addEdge(state, source, sink):
+
+    state['edgeCount'][(source, sink)] += 1
+    if state['edgeCount'][(source, sink)] > 1:
+        return
+
+    for node in (source, sink):
+        if node not in state['nodeScc']:
+            addNode(state, node)
+    graph = state['graph']
+    graph.add_edge(source, sink)
+
+# Merge weakly connected components
+    wccA = state['nodeWcc'][source]
+    wccB = state['nodeWcc'][sink]
+    if wccA != wccB:
+        if len(state['wccMembers'][wccA]) < len(state['wccMembers'][wccB]):
+            wccA, wccB = wccB, wccA
+        for node in state['wccMembers'][wccB]:
+            state['nodeWcc'][node] = wccA
+        movedSet = state['wccMembers'].pop(wccB)
+        state['wccMembers'][wccA] |= movedSet
+        pushWcc(state, wccA)
+        refreshNodes(state, movedSet)
+        updateLargest(state)
+
+    sccA = state['nodeScc'][source]
+    sccB = state['nodeScc'][sink]
+    if sccA == sccB:
+        return
+
+    linkScc(state, sccA, sccB)
+    setInDeg(state, sccB, state['sccInDeg'][sccB] + 1)
+    sccOrder = state['sccOrder']
+    if sccOrder[sccA] < sccOrder[sccB]:
+        return
+
+# SCCs reachable from the sink's SCC, and SCCs reaching the source's SCC,
+# within the window of the order affected by the edge
+    forwardSet = searchSccs(state['sccSucc'], sccB, lambda sccId: sccOrder[sccId] <= sccOrder[sccA])
+    backwardSet = searchSccs(state['sccPred'], sccA, lambda sccId: sccOrder[sccId] >= sccOrder[sccB])
+    orderPool = sorted(sccOrder[sccId] for sccId in forwardSet | backwardSet)
+
+# The new edge closes a cycle through every SCC both reachable from the sink
+# and able to reach the source; merge them
+    cycleSet = forwardSet & backwardSet
+    mergeList = []
+    if len(cycleSet) > 0:
+        members = set()
+        for sccId in cycleSet:
+            members |= state['sccMembers'][sccId]
+            deleteScc(state, sccId)
+        mergeList = createSccs(state, [members])
+
+# Reorder: SCCs reaching the source first, then the merged SCC, then SCCs
+# reachable from the sink, reusing the order values of the window
+    leftList = sorted(backwardSet - cycleSet, key=sccOrder.get)
+    rightList = sorted(forwardSet - cycleSet, key=sccOrder.get)
+    newList = leftList + mergeList
+    for sccId, order in zip(newList, orderPool[:len(newList)]):
+        sccOrder[sccId] = order
+    for sccId, order in zip(rightList, orderPool[len(orderPool)-len(rightList):]):
+        sccOrder[sccId] = order
+
+    return
+
+# searchSccs
+# Depth-first search of the condensation from one SCC, following the given
+# adjacency (successors or predecessors) and visiting only SCCs accepted by
+# 'inWindow'.
+# Output: set of SCCs reached, including the start
+
+def searchSccs(adjDict, start, inWindow):
+    visitedSet = set([start])
+    frontier = [start]
+    while frontier:
+        sccId = frontier.pop()
+        for nbrId in adjDict[sccId]:
+            if nbrId not in visitedSet and inWindow(nbrId):
+                visitedSet.add(nbrId)
+                frontier.append(nbrId)
+    return visitedSet
+
+################################################################################
+
+# removeEdge
+# Remove one edge. An edge inside an SCC may split it, in which case only that
+# SCC's members are re-examined. An edge between SCCs only changes the sink
+# SCC's in-degree. Weak connectivity is re-checked by searching outward from
+# both endpoints at once, stopping as soon as the searches meet or one side is
+# exhausted, so the cost is bounded by the smaller piece.
+
+def removeEdge(state, source, sink):
+
+    state['edgeCount'][(source, sink)] -= 1
+    if state['edgeCount'][(source, sink)] > 0:
+        return
+    del state['edgeCount'][(source, sink)]
+
+    graph = state['graph']
+    graph.remove_edge(source, sink)
+
+    sccA = state['nodeScc'][source]
+    sccB = state['nodeScc'][sink]
+    if sccA != sccB:
+        unlinkScc(state, sccA, sccB)
+        setInDeg(state, sccB, state['sccInDeg'][sccB] - 1)
+    else:
+        subgraph = graph.subgraph(state['sccMembers'][sccA])
+        pieceList = list(nx.strongly_connected_components(subgraph))
+        if len(pieceList) > 1:
+# The pieces take the place of the old SCC in the order, in topological order
+# among themselves
+            pieceCondensation = nx.condensation(subgraph, pieceList)
+            pieceList = [set(pieceList[index]) for index in nx.topological_sort(pieceCondensation)]
+            order = state['sccOrder'][sccA]
+            deleteScc(state, sccA)
+            for index, sccId in enumerate(createSccs(state, pieceList)):
+                state['sccOrder'][sccId] = order + (index,)
+
+# Within one SCC the endpoints remain weakly connected through the rest of the
+# cycle; otherwise search for a remaining path
+    if sccA != sccB and not graph.has_edge(sink, source):
+        pieceSet = exhaustedSide(graph, source, sink)
+        if pieceSet is not None:
+            relabelWcc(state, state['nodeWcc'][source], pieceSet)
+
+    dropNodeIfIsolated(state, source)
+    if sink != source:
+        dropNodeIfIsolated(state, sink)
+
+    return
+
+# exhaustedSide
+# Alternate undirected searches from two nodes. Returns None if they meet, or
+# the set of nodes reached by whichever search ran out of nodes first (the
+# component which has split off).
+
+def exhaustedSide(graph, nodeA, nodeB):
+    visitedList = [set([nodeA]), set([nodeB])]
+    frontierList = [[nodeA], [nodeB]]
+    side = 0
+    while True:
+        if not frontierList[side]:
+            return visitedList[side]
+        node = frontierList[side].pop()
+        for nbr in list(graph.successors(node)) + list(graph.predecessors(node)):
+            if nbr in visitedList[1-side]:
+                return None
+            if nbr not in visitedList[side]:
+                visitedList[side].add(nbr)
+                frontierList[side].append(nbr)
+        side = 1 - side
@@ -0,0 +1,229 @@
+###############################################################################
+# ioFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for reading and writing compressed text files. The
+# adjacency, edge, and seed files are highly repetitive, so compressing them
+# reduces the bytes moved to and from storage. The codec is detected from the
+# file extension:
+#   .gz: gzip (standard library)
+#   .xz: xz (lzma in Python 3, or the backports.lzma package)
+#   .zst: zstd (the zstandard package)
+# Readers are given the plain file name and open whichever variant exists.
+# Writers use the codec set in 'outputCodec' (None for plain text). Graphs are
+# written by writeGraph in the formats set in 'outputFormats'.
+################################################################################
+
+# Import Python packages.
+import gzip
+import io
+import networkx as nx
+import numpy as np
+import os
+import shutil
+import time
+
+################################################################################
+
+# Extension used by each codec
+codecDict = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+
+# Codec used for output files: None, 'gzip', 'xz', or 'zstd'
+outputCodec = None
+
+# Formats in which graphs are written (see writeGraph). GraphML is large and
+# slow to produce, so it is off by default; add 'graphml' to this list to
+# restore it.
+outputFormats = ['adjlist']
+
+################################################################################
+
+# fileCodec
+# Input: file name
+# Output: codec implied by the file's extension, or None
+
+def fileCodec(fileName):
+    for codec in codecDict:
+        if fileName.endswith(codecDict[codec]):
+            return codec
+    return None
+
+# openFile
+# Open a file for reading ('r') or writing ('w'), compressing or decompressing
+# according to its extension.
+# Input: file name, mode
+# Output: file object
+
+def openFile(fileName, mode='r'):
+
+    codec = fileCodec(fileName)
+    mode = mode.replace('b', '')
+
+    if codec is None:
+        return open(fileName, mode)
+
+    elif codec == 'gzip':
+        return gzip.open(fileName, mode+'b')
+
+    elif codec == 'xz':
+        try:
+            import lzma
+        except ImportError:
+            from backports import lzma
+        return lzma.LZMAFile(fileName, mode)
+
+    elif codec == 'zstd':
+        import zstandard
+        if mode == 'r':
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(fileName, 'rb')))
+        else:
+            return zstandard.ZstdCompressor().stream_writer(open(fileName, 'wb'))
+
+# findFile
+# Locate the variant of a file which exists on disk: the plain file, or a
+# compressed variant with one of the known extensions.
+# Input: plain file name
+# Output: name of the existing variant (the plain name if none exists)
+
+def findFile(fileName):
+    if os.path.exists(fileName):
+        return fileName
+    for codec in sorted(codecDict):
+        if os.path.exists(fileName+codecDict[codec]):
+            return fileName+codecDict[codec]
+    return fileName
+
+# fileExists
+# Input: plain file name
+# Output: True if the file or one of its compressed variants exists
+
+def fileExists(fileName):
+    return os.path.exists(findFile(fileName))
+
+# openOutput
+# Open a file for writing with the current output codec. Other variants of
+# the same file are removed, so readers never pick up a stale copy.
+# Input: plain file name, codec (defaults to outputCodec)
+# Output: file object
+
+def openOutput(fileName, codec=None):
+    if codec is None:
+        codec = outputCodec
+    outputName = fileName
+    if codec is not None:
+        outputName = fileName+codecDict[codec]
+    for variant in [fileName]+[fileName+codecDict[other] for other in codecDict]:
+        if variant != outputName and os.path.exists(variant):
+            os.remove(variant)
+    return openFile(outputName, 'w')
+
+# copyOutput
+# Copy a file, removing any other variants of the target so that readers do
+# not pick up a stale copy.
+# Input: name of the existing source file, name of the target file (with the
+# same extension)
+# Output: None
+
+def copyOutput(sourceName, targetName):
+    codec = fileCodec(targetName)
+    plainName = targetName
+    if codec is not None:
+        plainName = targetName[:-len(codecDict[codec])]
+    for variant in [plainName]+[plainName+codecDict[other] for other in codecDict]:
+        if variant != targetName and os.path.exists(variant):
+            os.remove(variant)
+    shutil.copyfile(sourceName, targetName)
+    return
+
+# writeGraph
+# Write a graph in each of the requested formats. Formats are produced
+# directly from the in-memory graph, and file names are formed by appending a
+# suffix to 'fileStem' (e.g., <genome>/<genome>Red):
+#   adjlist: <stem>AdjList.txt, networkx adjacency list
+#   graphml: <stem>Graph.xml, GraphML
+#   edgelist: <stem>EdgeList.txt.gz, gzip-compressed edge list (nodes without
+#     edges are not recorded)
+#   npz: <stem>Graph.npz, numpy archive with arrays 'nodes', 'sources', and
+#     'sinks', the latter two indexing into 'nodes'
+# Input: networkx graph, file stem, list of formats (defaults to
+# outputFormats), list of formats always written because later stages read them
+# Output: None
+
+def writeGraph(graph, fileStem, formats=None, requiredFormats=()):
+
+    if formats is None:
+        formats = outputFormats
+    formats = set(formats) | set(requiredFormats)
+
+    unknownList = formats - set(['adjlist', 'graphml', 'edgelist', 'npz'])
+    if len(unknownList) > 0:
+        raise ValueError('Unknown output formats: '+', '.join(sorted(unknownList)))
+
+    if 'adjlist' in formats:
+        with openOutput(fileStem+'AdjList.txt') as outFile:
+            nx.write_adjlist(graph, outFile)
+    if 'graphml' in formats:
+        nx.write_graphml(graph, fileStem+'Graph.xml')
+    if 'edgelist' in formats:
+        nx.write_edgelist(graph, fileStem+'EdgeList.txt.gz', data=False)
+    if 'npz' in formats:
+        nodeList = list(graph.nodes())
+        nodeIndex = dict((node, index) for index, node in enumerate(nodeList))
+        edgeList = list(graph.edges())
+        np.savez_compressed(fileStem+'Graph.npz', nodes=np.array([str(node) for node in nodeList]),
+                            sources=np.array([nodeIndex[edge[0]] for edge in edgeList], dtype=int),
+                            sinks=np.array([nodeIndex[edge[1]] for edge in edgeList], dtype=int))
+
+    return
+
+################################################################################
+
+# benchmarkCodecs
+# Compare the on-disk size and read/write throughput of a file under each
+# codec. Codecs whose packages are not installed are skipped.
+# Input: path to a plain text file, list of codecs (defaults to all), number
+# of repetitions
+# Output: list of (codec, size in bytes, write MB/s, read MB/s) tuples, with
+# None as the codec for plain text
+
+def benchmarkCodecs(fileName, codecList=None, numReps=3):
+
+    if codecList is None:
+        codecList = sorted(codecDict)
+    with open(fileName) as inFile:
+        content = inFile.read()
+    megabytes = len(content) / float(1 << 20)
+
+    resultList = []
+    for codec in [None]+list(codecList):
+        outputName = fileName+'.bench'
+        if codec is not None:
+            outputName = outputName+codecDict[codec]
+        try:
+            writeTime = 0
+            readTime = 0
+            for rep in range(numReps):
+                startTime = time.time()
+                outFile = openFile(outputName, 'w')
+                outFile.write(content)
+                outFile.close()
+                writeTime = writeTime + time.time() - startTime
+
+                startTime = time.time()
+                inFile = openFile(outputName, 'r')
+                for line in inFile:
+                    pass
+                inFile.close()
+                readTime = readTime + time.time() - startTime
+        except ImportError:
+            continue
+        resultList.append((codec, os.path.getsize(outputName),
+                           megabytes*numReps / max(writeTime, 1e-9),
+                           megabytes*numReps / max(readTime, 1e-9)))
+        os.remove(outputName)
+
+    return resultList
@@ -10,8 +10,13 @@
 ################################################################################
 
 # Import Python packages.
+import numpy as np
 import os
 import pandas as pd
+import scipy.sparse as sp
+
+# Import custom Python modules
+import storeFunctions as stf
 
 ################################################################################
 
@@ -19,15 +24,198 @@ import pandas as pd
 # Retrieve list of genomes to process by examing the contents of 'inputDir,'
 # ignoring hidden folders. Each folder contains data files for that genome 
 # (e.g., metabolic models, network graphs, etc), and calculations are performed
-# performed by iterating over this list.
+# performed by iterating over this list. The list is sorted, so that every
+# process sees genomes in the same order.
 
 def getDirList(inputDir):
     dirList =[]
     for item in os.listdir(inputDir):
         if not item.startswith('.'):
             dirList.append(item)
+    dirList.sort()
             
     return dirList
+
+################################################################################
+
+# Sharding
+# For cluster array jobs, a collection of genomes can be split into N shards,
+# each processed by a separate job. A shard is given as a tuple (i, N), with
+# i counting from 0. Each shard writes its own partial summary files (see
+# shardFileName), which mergeShardSummaries combines into the canonical
+# outputs once all shards are finished. Stages which take a list of genomes
+# should be given the shard's list from shardDirList along with the shard; for
+# example, in array job i of N:
+#   dirList = mf.shardDirList(mf.getDirList(modelDir), modelDir, (i, N))
+#   sf.dirListToAdjacencyList(dirList, modelDir, summaryStatsDir, shard=(i, N))
+# The first call for a directory and N records the assignment in a shard
+# manifest (see shardManifestName), and later calls read it back. Array jobs
+# which start after others have begun rewriting the folders, or a re-run of
+# one failed shard, therefore get the same genomes as the original run.
+# Stages given a result store connection (see storeFunctions) also store each
+# genome's statistics rows directly. Each shard should then use its own
+# database file, since SQLite does not support concurrent writers on a shared
+# file system; mergeShardSummaries can load the merged statistics into the
+# final database.
+
+# Summary files written by the pipeline stages
+summaryFileList = ['ModelStatistics.txt', 'GraphStatistics.txt',
+                   'DiGraphStatistics.txt', 'ReducedGraphStatistics.txt',
+                   'ReducedDiGraphStatistics.txt', 'modelStats.tsv',
+                   'prunedModelStats.tsv']
+
+# shardManifestName
+# Name of the file recording the shard assignment of a directory for N shards.
+# The name starts with a dot, so getDirList does not list it as a genome.
+# Input: directory containing the genome folders, number of shards
+# Output: path to the manifest
+
+def shardManifestName(inputDir, numShards):
+    return '%s/.shardManifest%i.txt' % (inputDir, numShards)
+
+# assignShards
+# Split a list of genomes into N shards of similar total input size. Genomes
+# are assigned largest first to the shard with the smallest total so far,
+# breaking ties by name and shard index.
+# Input: list of genomes, directory containing the genome folders (used to
+# measure input size), number of shards
+# Output: dictionary of {genome: shard index}
+
+def assignShards(dirList, inputDir, numShards):
+
+# Measure the size of each genome's input folder
+    sizeDict = {}
+    for curDir in dirList:
+        genomeSize = 0
+        for root, dirs, files in os.walk(inputDir+'/'+curDir):
+            for fileName in files:
+                genomeSize = genomeSize + os.path.getsize(os.path.join(root, fileName))
+        sizeDict[curDir] = genomeSize
+
+    shardSize = [0]*numShards
+    shardDict = {}
+    for curDir in sorted(dirList, key=lambda genome: (-sizeDict[genome], genome)):
+        target = min(range(numShards), key=lambda index: (shardSize[index], index))
+        shardSize[target] = shardSize[target] + sizeDict[curDir]
+        shardDict[curDir] = target
+
+    return shardDict
+
+# readShardManifest
+# Input: path to a shard manifest
+# Output: dictionary of {genome: shard index}
+
+def readShardManifest(manifestFile):
+    shardDict = {}
+    with open(manifestFile) as inFile:
+        for line in inFile:
+            genome, shardIndex = line.rstrip('\n').split('\t')
+            shardDict[genome] = int(shardIndex)
+    return shardDict
+
+# shardDirList
+# Return the genomes belonging to one shard. The assignment is made by
+# assignShards on the first call for a directory and N, and saved to the shard
+# manifest; every later call reads the manifest, so the assignment does not
+# change as the stages rewrite the folders it was measured on. The manifest is
+# written under a temporary name and hard-linked into place, so of several
+# jobs starting together only the first to finish writes it, and the others
+# use its assignment. An error is raised if the manifest does not list exactly
+# the given genomes; delete it to shard a different collection.
+# Input: list of genomes, directory containing the genome folders (used to
+# measure input size), shard tuple (i, N) or None
+# Output: sorted list of genomes in the shard (the full list if shard is None)
+
+def shardDirList(dirList, inputDir, shard=None):
+
+    if shard is None:
+        return dirList
+    shardIndex, numShards = shard
+
+    manifestFile = shardManifestName(inputDir, numShards)
+    if not os.path.exists(manifestFile):
+        shardDict = assignShards(dirList, inputDir, numShards)
+        tempFile = '%s.%i.tmp' % (manifestFile, os.getpid())
+        with open(tempFile, 'w') as outFile:
+            for curDir in sorted(shardDict):
+                outFile.write('%s\t%i\n' % (curDir, shardDict[curDir]))
+        try:
+            os.link(tempFile, manifestFile)
+        except OSError:
+            if not os.path.exists(manifestFile):
+                raise
+        finally:
+            os.remove(tempFile)
+
+    shardDict = readShardManifest(manifestFile)
+    if set(shardDict) != set(dirList):
+        raise ValueError('Shard manifest '+manifestFile+' does not match the genomes in '+inputDir+
+                         '; delete it to compute a new assignment')
+
+    return sorted(curDir for curDir in dirList if shardDict[curDir] == shardIndex)
+
+# shardFileName
+# Name of the partial summary file written by one shard, e.g.
+# GraphStatistics.txt -> GraphStatistics.shard2of8.txt
+# Input: file name, shard tuple (i, N) or None
+# Output: file name (unchanged if shard is None)
+
+def shardFileName(fileName, shard=None):
+    if shard is None:
+        return fileName
+    base, ext = os.path.splitext(fileName)
+    return '%s.shard%iof%i%s' % (base, shard[0], shard[1], ext)
+
+################################################################################
+
+# mergeShardSummaries
+# Combine the partial summary files written by N shards into the canonical
+# summary files. Rows are sorted by genome, so the merged files match those of
+# an unsharded run. Summary files for which no shard wrote a partial are
+# skipped; an error is raised if only some of the shards did. If a result
+# store connection is given as 'conn', the merged statistics are loaded into
+# the database.
+# Input: directory containing summary statistics, number of shards, connection
+# or None
+# Output: list of summary files written
+
+def mergeShardSummaries(summaryStatsDir, numShards, conn=None):
+
+    print 'Merging shard summaries'
+
+    mergedList = []
+    for fileName in summaryFileList:
+        partList = [summaryStatsDir+'/'+shardFileName(fileName, (index, numShards)) for index in range(numShards)]
+        existList = [os.path.exists(partFile) for partFile in partList]
+        if not any(existList):
+            continue
+        if not all(existList):
+            missingList = [partFile for partFile, exists in zip(partList, existList) if not exists]
+            raise IOError('Missing shard summaries: '+', '.join(missingList))
+
+        if fileName.endswith('.tsv'):
+            mergedDF = pd.concat([pd.read_csv(partFile, sep='\t', index_col=0) for partFile in partList])
+            mergedDF.sort_index().to_csv(summaryStatsDir+'/'+fileName, sep='\t')
+        else:
+            header = None
+            rowList = []
+            for partFile in partList:
+                with open(partFile) as inFile:
+                    header = inFile.readline()
+                    rowList.extend(line for line in inFile if line.strip())
+            rowList.sort(key=lambda line: line.split(',')[0])
+            with open(summaryStatsDir+'/'+fileName, 'w') as outFile:
+                outFile.write(header)
+                outFile.writelines(rowList)
+
+        for partFile in partList:
+            os.remove(partFile)
+        mergedList.append(fileName)
+
+    if conn is not None:
+        stf.importSummaryStats(conn, summaryStatsDir)
+
+    return mergedList
     
 ################################################################################
 
@@ -37,27 +225,66 @@ def getDirList(inputDir):
 # as follows:
 # Sample	Lineage	Clade	Tribe
 # AAA023D18	acI	acI-B	acI-B1
-# The function could be updated to take (lineage, clade, tribe) as input
+# To retrieve several levels at once, use importTaxonomyLevels
 
 def importTaxonomy(taxonFile, level):
 
+    return importTaxonomyLevels(taxonFile, [level])[level]
+
+################################################################################
+
+# importTaxonomyLevels
+# Reads in a taxonomy file (see importTaxonomy) once and returns the genomes
+# associated with each group at every requested taxonomic level. Groups are
+# found with a single groupby per level rather than filtering the table once
+# per group.
+# Input: taxonomy file, list of levels (defaults to every column of the file)
+# Output: dictionary of {level: {group: [samples]}}
+
+def importTaxonomyLevels(taxonFile, levelList=None):
+
 # Read in the taxonomic classification
     taxonClass = pd.DataFrame.from_csv(taxonFile, sep=',')
     taxonClass = taxonClass.dropna()
-    
-# Extract the unique tribes found in the dataset
-    groupList = pd.unique(taxonClass[level].values)
-    groupList.sort(axis=0)
-    groupList = [ group for group in groupList if not group.startswith('Unknown') ]
-    
-# For each tribe, return the list of samples. Creates a dict and adds an entry
-# for each tribe.
-    groupSampleDict = {}
-
-    for group in groupList:
-# Identify the samples belonging to this tribe
-        samples = taxonClass.loc[taxonClass[level] == group]
-        samples = [sample for sample in samples.index]
-        groupSampleDict[group] = samples
-        
-    return groupSampleDict
+
+    if levelList is None:
+        levelList = list(taxonClass.columns)
+
+    levelDict = {}
+    for level in levelList:
+        groupSampleDict = {}
+        for group, samples in taxonClass.groupby(level):
+            if not group.startswith('Unknown'):
+                groupSampleDict[group] = [sample for sample in samples.index]
+        levelDict[level] = groupSampleDict
+
+    return levelDict
+
+################################################################################
+
+# taxonomyIndicators
+# Builds a sparse genome-by-group indicator matrix for each taxonomic level.
+# Entry (i, j) is 1 if genome i belongs to group j. Genomes absent from the
+# taxonomy (or in 'Unknown' groups) have empty rows.
+# Input: dictionary from importTaxonomyLevels, ordered list of genomes
+# Output: dictionary of {level: (sorted list of groups, CSR indicator matrix)}
+
+def taxonomyIndicators(levelDict, genomeList):
+
+    genomeIndex = dict((genome, index) for index, genome in enumerate(genomeList))
+
+    indicatorDict = {}
+    for level in levelDict:
+        groupList = sorted(levelDict[level].keys())
+        rowList = []
+        colList = []
+        for col, group in enumerate(groupList):
+            for sample in levelDict[level][group]:
+                if sample in genomeIndex:
+                    rowList.append(genomeIndex[sample])
+                    colList.append(col)
+        indicator = sp.csr_matrix((np.ones(len(rowList)), (rowList, colList)),
+                                  shape=(len(genomeList), len(groupList)))
+        indicatorDict[level] = (groupList, indicator)
+
+    return indicatorDict
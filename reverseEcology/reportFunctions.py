@@ -0,0 +1,258 @@
+###############################################################################
+# reportFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for summarizing graph statistics and seed sets. All
+# distributions are computed with numpy from the statistics arrays, and
+# figures are rendered to files with matplotlib's Agg canvas, without using
+# pyplot. Reports can therefore be produced in batch, in parallel, and on
+# machines without a display.
+#
+# A distribution is a dictionary with keys 'edges' (bin edges), 'fractions'
+# (fraction of items in each bin), 'xlabel' and 'ylabel', and optionally
+# 'xlim' and 'ylim'.
+################################################################################
+
+# Import Python packages.
+import multiprocessing
+import numpy as np
+import os
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+################################################################################
+
+# integerHistogram
+# Histogram of integer values with bins of a fixed width, aligned to
+# multiples of the width.
+# Input: array of integers, bin width
+# Output: array of bin edges, array of counts
+
+def integerHistogram(values, binWidth):
+    values = np.asarray(values, dtype=int)
+    if len(values) == 0:
+        return np.array([0, binWidth]), np.zeros(1, dtype=int)
+    binMin = (values.min() // binWidth) * binWidth
+    counts = np.bincount((values - binMin) // binWidth)
+    return binMin + binWidth*np.arange(len(counts) + 1), counts
+
+def countsToFractions(counts):
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(len(counts))
+    return counts / float(total)
+
+# summarizeValues
+# Quartiles are interpolated as by np.percentile. Values may also be given as
+# a (values, counts) tuple, giving the number of times each value occurs; the
+# quartiles are then read off the cumulative counts, without expanding them.
+# Input: array of values, or tuple of arrays of values and counts
+# Output: list of the count, mean, minimum, quartiles and maximum
+
+def summarizeValues(values):
+    if not isinstance(values, tuple):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return [0] + [np.nan]*6
+        return [len(values), values.mean()] + np.percentile(values, [0, 25, 50, 75, 100]).tolist()
+
+    values, counts = values
+    order = np.argsort(values, kind='mergesort')
+    values = np.asarray(values, dtype=float)[order]
+    counts = np.asarray(counts, dtype=int)[order]
+    cumCounts = np.cumsum(counts)
+    total = cumCounts[-1] if len(cumCounts) > 0 else 0
+    if total == 0:
+        return [0] + [np.nan]*6
+
+# Positions of the quartiles in the sorted (expanded) values, and the values
+# found at the positions on either side of each
+    positions = np.array([0, 0.25, 0.5, 0.75, 1]) * (total - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, total - 1)
+    lowerValues = values[np.searchsorted(cumCounts, lower, side='right')]
+    upperValues = values[np.searchsorted(cumCounts, upper, side='right')]
+    quartiles = lowerValues + (positions - lower)*(upperValues - lowerValues)
+    return [int(total), np.dot(values, counts) / float(total)] + quartiles.tolist()
+
+summaryColumns = ['Count', 'Mean', 'Min', 'Q1', 'Median', 'Q3', 'Max']
+
+################################################################################
+
+# graphStatDistributions
+# Distributions of the statistics of a collection of graphs: number of nodes,
+# number of components, and fraction of nodes in the largest component.
+# Input: array with one row per graph and columns for the number of nodes,
+# edges, total components, and size of the largest component (as written by
+# graphFunctions.computeGraphStats), prefix for the distribution names
+# Output: dictionary of {name: distribution}, dictionary of {name: values}
+
+def graphStatDistributions(graphStatArray, prefix='graph'):
+
+    graphStatArray = np.asarray(graphStatArray, dtype=int).reshape(-1, 4)
+    nodeArray = graphStatArray[:,0]
+    componentArray = graphStatArray[:,2]
+    fractionArray = np.true_divide(graphStatArray[:,3], np.maximum(nodeArray, 1))
+
+    distDict = {}
+    edges, counts = integerHistogram(nodeArray, 10)
+    distDict[prefix+'Nodes'] = {'edges': edges, 'fractions': countsToFractions(counts),
+                                'xlabel': 'Total Nodes', 'ylabel': 'Fraction of Graphs'}
+    edges, counts = integerHistogram(componentArray, 1)
+    distDict[prefix+'Components'] = {'edges': edges, 'fractions': countsToFractions(counts),
+                                     'xlabel': 'Number of Components', 'ylabel': 'Fraction of Graphs'}
+    counts, edges = np.histogram(fractionArray, bins=10, range=(0, 1))
+    distDict[prefix+'LargestFraction'] = {'edges': edges, 'fractions': countsToFractions(counts),
+                                          'xlabel': 'Fraction of Nodes in Largest Component',
+                                          'ylabel': 'Fraction of Graphs'}
+
+    valueDict = {prefix+'Nodes': nodeArray, prefix+'Edges': graphStatArray[:,1],
+                 prefix+'Components': componentArray, prefix+'LargestFraction': fractionArray}
+    return distDict, valueDict
+
+################################################################################
+
+# seedSetArrays
+# Input: "list of lists of lists" of seed sets, as returned by
+# graphFunctions.computeSeedSets
+# Output: array of the number of seed sets of each genome, array of the number
+# of seed sets of each size (indexed by size)
+
+def seedSetArrays(seedSetList):
+    numSeedSets = np.fromiter((len(mySeeds) for mySeeds in seedSetList), dtype=int, count=len(seedSetList))
+    seedSizes = np.fromiter((len(seed) for mySeeds in seedSetList for seed in mySeeds),
+                            dtype=int, count=numSeedSets.sum())
+    return numSeedSets, np.bincount(seedSizes)
+
+# seedWeightArrays
+# Equivalent of seedSetArrays computed from a matrix of seed weights (one
+# column per genome, as written by seedFunctions.consolidateSeeds). Each seed
+# set's weights sum to one, and a metabolite with weight w lies in a seed set
+# of size 1/w.
+# Input: numpy array of seed weights (metabolites x genomes)
+# Output: same as seedSetArrays
+
+def seedWeightArrays(weightArray):
+    weightArray = np.asarray(weightArray, dtype=float)
+    numSeedSets = np.rint(weightArray.sum(axis=0)).astype(int)
+    weights = weightArray[weightArray > 0]
+    seedSizes = np.rint(1 / weights).astype(int)
+    return numSeedSets, np.rint(np.bincount(seedSizes, weights=weights)).astype(int)
+
+# seedStatDistributions
+# Distributions of the number of seed sets per genome and the size of
+# individual seed sets, with a second view of the sizes zoomed to exclude the
+# (dominant) seed sets of size one.
+# Input: outputs of seedSetArrays or seedWeightArrays
+# Output: dictionary of {name: distribution}, dictionary of {name: values},
+# where the seed set sizes are given as a (sizes, counts) tuple (see
+# summarizeValues)
+
+def seedStatDistributions(numSeedSets, seedSizeCounts):
+
+    distDict = {}
+    edges, counts = integerHistogram(numSeedSets, 10)
+    distDict['seedSetCount'] = {'edges': edges, 'fractions': countsToFractions(counts),
+                                'xlabel': 'Number of Seed Sets', 'ylabel': 'Fraction of Graphs'}
+
+    seedSizeCounts = np.asarray(seedSizeCounts, dtype=int)
+    fractions = countsToFractions(seedSizeCounts)
+    edges = np.arange(len(seedSizeCounts) + 1)
+    distDict['seedSetSize'] = {'edges': edges, 'fractions': fractions,
+                               'xlabel': 'Metabolites in Seed Set', 'ylabel': 'Fraction of Seed Sets',
+                               'xlim': (0, len(seedSizeCounts)), 'ylim': (0, 1)}
+    zoomMax = fractions[2:].max() if len(fractions) > 2 else 1
+    distDict['seedSetSizeZoomed'] = {'edges': edges, 'fractions': fractions,
+                                     'xlabel': 'Metabolites in Seed Set (Zoomed)',
+                                     'ylabel': 'Fraction of Seed Sets (Zoomed)',
+                                     'xlim': (0, len(seedSizeCounts)), 'ylim': (0, 1.1*zoomMax)}
+
+# Seed set sizes are summarized from their counts without expanding them
+    valueDict = {'seedSetCount': numSeedSets,
+                 'seedSetSize': (np.arange(len(seedSizeCounts)), seedSizeCounts)}
+    return distDict, valueDict
+
+################################################################################
+
+# drawHistogram
+# Draw a distribution as a bar chart on a matplotlib axes object.
+# Input: axes, distribution
+# Output: None
+
+def drawHistogram(ax, distribution):
+    edges = distribution['edges']
+    ax.bar(edges[:-1], distribution['fractions'], width=np.diff(edges), align='edge')
+    ax.set_xlabel(distribution['xlabel'])
+    ax.set_ylabel(distribution['ylabel'])
+    ax.set_xlim(distribution.get('xlim', (edges[0], edges[-1])))
+    if 'ylim' in distribution:
+        ax.set_ylim(distribution['ylim'])
+    return
+
+# renderHistogram
+# Render one distribution to an image file, using a figure which is not
+# registered with pyplot.
+# Input: (distribution, file name) tuple, so that it can be mapped over a pool
+# Output: file name
+
+def renderHistogram(job):
+    distribution, fileName = job
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    drawHistogram(fig.add_subplot(111), distribution)
+    canvas.print_figure(fileName)
+    return fileName
+
+################################################################################
+
+# writeReport
+# Compute the distributions of graph and seed statistics, write a table of
+# their quantiles to <reportDir>/ReportSummary.csv, and render one figure per
+# distribution to <reportDir>/<name>.<format>.
+# Input: output directory, graph statistics array, reduced graph statistics
+# array, seed sets ("list of lists of lists") or a tuple from seedSetArrays /
+# seedWeightArrays, figure format, number of processes used for rendering
+# Output: list of files written
+
+def writeReport(reportDir, graphStatArray=None, reducedGraphStatArray=None, seedSets=None,
+                fileFormat='png', numProcs=1):
+
+    if not os.path.exists(reportDir):
+        os.makedirs(reportDir)
+
+    distDict = {}
+    valueDict = {}
+    if graphStatArray is not None:
+        myDists, myValues = graphStatDistributions(graphStatArray, 'graph')
+        distDict.update(myDists)
+        valueDict.update(myValues)
+    if reducedGraphStatArray is not None:
+        myDists, myValues = graphStatDistributions(reducedGraphStatArray, 'reducedGraph')
+        distDict.update(myDists)
+        valueDict.update(myValues)
+    if seedSets is not None:
+        if not isinstance(seedSets, tuple):
+            seedSets = seedSetArrays(seedSets)
+        myDists, myValues = seedStatDistributions(*seedSets)
+        distDict.update(myDists)
+        valueDict.update(myValues)
+
+    summaryDF = pd.DataFrame([summarizeValues(valueDict[name]) for name in sorted(valueDict)],
+                             index=sorted(valueDict), columns=summaryColumns)
+    summaryDF.to_csv(reportDir+'/ReportSummary.csv')
+
+    jobList = [(distDict[name], reportDir+'/'+name+'.'+fileFormat) for name in sorted(distDict)]
+    if numProcs > 1:
+        pool = multiprocessing.Pool(numProcs)
+        fileList = pool.map(renderHistogram, jobList)
+        pool.close()
+        pool.join()
+    else:
+        fileList = map(renderHistogram, jobList)
+
+    return [reportDir+'/ReportSummary.csv'] + list(fileList)
@@ -12,14 +12,22 @@
 import cobra
 import cobra.core.Formula
 import collections
+import cPickle
 import fileinput
+import hashlib
 import numpy as np
 import os
 import pandas as pd
 import re
+import xml.sax.saxutils
+import zlib
 
 # Import custom Python modules 
+import bipartiteFunctions as bf
+import idFunctions as idf
+import ioFunctions as iof
 import metadataFunctions as mf
+import storeFunctions as stf
 
 # Define path for data included in the package
 dataPath = os.path.dirname(os.path.abspath(__file__))+'/packageData'
@@ -31,9 +39,15 @@ dataPath = os.path.dirname(os.path.abspath(__file__))+'/packageData'
 # genome scale model from an SBML file to an adjacency list. Adjacency lists 
 # for each genome-scale model are written as text files in each genome 
 # directory. Summary statistics about each graph are written in the
-# summaryStatsDir as well.
+# summaryStatsDir as well, as partials if 'shard' is given. If 'expand' is
+# False, only the compact reaction-metabolite incidence is written (see
+# bipartiteFunctions), and the adjacency lists can be exported from it later.
+# If a result store connection is given as 'conn', the adjacency lists,
+# reaction edges and model statistics are written to the database in batched
+# transactions instead, and no per-genome files are created (see
+# storeFunctions).
 
-def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir):
+def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir, shard=None, expand=True, conn=None):
 
     numSubDir = len(dirList)
 
@@ -43,7 +57,7 @@ def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir):
     modelStatArray = np.empty([numSubDir, 3], dtype = int)
 
 # Create a file to record the summary statistics.
-    modelFile = open(summaryStatsDir+'/'+'ModelStatistics.txt', 'w')
+    modelFile = open(summaryStatsDir+'/'+mf.shardFileName('ModelStatistics.txt', shard), 'w')
     modelFile.write('Model,Genes,Metabolites,Reactions\n')
 
 # Iterate over the list of genome directories. For each genome, read in the
@@ -59,7 +73,7 @@ def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir):
     
     for curDir in dirList:
 # Read in SBML file    
-        model = cobra.io.read_sbml_model(processedDataDir+'/'+curDir+'/'+curDir+'.xml')
+        model = loadModel(processedDataDir+'/'+curDir+'/'+curDir+'.xml')
 
 # Create dictionary of metabolite names
         for metab in model.metabolites:
@@ -74,10 +88,20 @@ def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir):
                                     modelStatArray[count,1], 
                                     modelStatArray[count, 2] ) )
 
-# Create adjacency list and write to file
-        adjacencyListFromModel(model, processedDataDir)
-        reactionEdgesFromModel(model, processedDataDir)
+# Create adjacency list and write to file, or store the incidence in its place
+        if expand and conn is not None:
+            stf.storeEdges(conn, curDir, 'adj', adjacencyRows(model))
+            stf.storeEdges(conn, curDir, 'rxn', reactionEdges(model))
+        elif expand:
+            adjacencyListFromModel(model, processedDataDir)
+            reactionEdgesFromModel(model, processedDataDir)
+        else:
+            bf.writeIncidence(bf.incidenceFromModel(model),
+                              processedDataDir+'/'+curDir+'/'+curDir+'Incidence.npz')
         count = count + 1
+        if conn is not None:
+            stf.storeModelStats(conn, curDir, modelStatArray[count-1])
+            stf.commitBatch(conn, count, numSubDir)
 
 # Close files containing summary data
     modelFile.close()
@@ -97,7 +121,7 @@ def dirListToAdjacencyList(dirList, processedDataDir, summaryStatsDir):
 def adjacencyListFromModel(model, processedDataDir):
 
 # Establish a file for the adjacency list
-    myFile = open(processedDataDir+'/'+model.id+'/'+model.id+'AdjList.txt', 'w')
+    myFile = iof.openOutput(processedDataDir+'/'+model.id+'/'+model.id+'AdjList.txt')
 
 # For each reaction, loop over the reactants. For each reactant, loop over the 
 # reaction products and create an edge between the reactant and products. If a 
@@ -118,38 +142,67 @@ def adjacencyListFromModel(model, processedDataDir):
     myFile.close()
     return
     
+# adjacencyRows
+# Generator over the rows of the adjacency list written by
+# adjacencyListFromModel, as (source, sink) pairs. A reactant written without
+# any products is yielded with a sink of None, as storeFunctions stores
+# isolated nodes.
+# Input: cobrapy model object
+# Output: yields (source, sink) tuples
+
+def adjacencyRows(model):
+    for myRxn in model.reactions:
+        for myReactant in myRxn.reactants:
+            if len(myRxn.products) == 0:
+                yield myReactant.id, None
+            for myProduct in myRxn.products:
+                yield myReactant.id, myProduct.id
+        if myRxn.reversibility == True:
+            for myProduct in myRxn.products:
+                if len(myRxn.reactants) == 0:
+                    yield myProduct.id, None
+                for myReactant in myRxn.reactants:
+                    yield myProduct.id, myReactant.id
+
+################################################################################
+
+# reactionEdges
+# Generator over the (source, sink, reaction) edges of a cobrapy model. For
+# each reaction, creates an edge between all (reactant, product) pairs and
+# indicates the reaction. If a reaction is reversible, also creates edges
+# between all (product, reactant) pairs.
+# Input: cobrapy model object
+# Output: yields (source, sink, reaction) tuples
+
+def reactionEdges(model):
+    for myRxn in model.reactions:
+        for myReactant in myRxn.reactants:
+            for myProduct in myRxn.products:
+                yield myReactant.id, myProduct.id, myRxn.id
+        if myRxn.reversibility == True:
+            for myProduct in myRxn.products:
+                for myReactant in myRxn.reactants:
+                    yield myProduct.id, myReactant.id, myRxn.id
+
 ################################################################################
 
 # reactionEdgesFromModel
 # Function to convert a cobrapy model object to a list of (source, sink) pairs
-# for reaction in the model. For each reaciton, creates an edge between all 
-# (reactant, product) pairs and indicates the reaction. If a reaction is 
-# reversible, also creates edges between all (product, reactant) pairs.
+# for reaction in the model, as given by reactionEdges, and write the list to
+# file.
 # Input: cobrapy model object, model directory
 # Output: None.
 
 def reactionEdgesFromModel(model, processedDataDir):
 
 # Establish a file for the adjacency list
-    myFile = open(processedDataDir+'/'+model.id+'/'+model.id+'RxnEdges.txt', 'w')
+    myFile = iof.openOutput(processedDataDir+'/'+model.id+'/'+model.id+'RxnEdges.txt')
 
-# For each reaction, loop over the reactants. For each reactant, loop over the 
-# reaction products and create an edge between the reactant and products. If a 
-# reaction is reversible, repeat the process in reverse, creating an edge
-# between each product and reactant. Also record reaction associated with each
-# edge.
-    for myRxn in model.reactions:
-        for myReactant in myRxn.reactants:
-            for myProduct in myRxn.products:
-                myFile.write(myReactant.id+'\t')
-                myFile.write(myProduct.id+'\t')
-                myFile.write(myRxn.id+'\n')
-        if myRxn.reversibility == True:
-            for myProduct in myRxn.products:
-                for myReactant in myRxn.reactants:
-                    myFile.write(myProduct.id+'\t')
-                    myFile.write(myReactant.id+'\t')
-                    myFile.write(myRxn.id+'\n')
+# Write each edge along with its reaction
+    for mySource, mySink, myRxnId in reactionEdges(model):
+        myFile.write(mySource+'\t')
+        myFile.write(mySink+'\t')
+        myFile.write(myRxnId+'\n')
     myFile.close()
     return
     
@@ -170,6 +223,284 @@ def getModelStats(model):
 
 ################################################################################
 
+# Binary model snapshots
+# Reading and writing SBML is the most expensive step in the pipeline. Each
+# stage therefore also saves a compact binary snapshot of the model next to its
+# SBML file (<genome>.snapshot), holding the fields the pipeline uses:
+# reactions, stoichiometry, bounds, metabolites, formulas, charges,
+# compartments, and GPR strings. Later stages load the snapshot instead of the
+# SBML. The snapshot records the MD5 hash of the SBML file written alongside
+# it, if any; if the SBML on disk no longer matches (or is newer than a
+# snapshot written without SBML), the SBML is read instead.
+
+snapshotVersion = 1
+
+# snapshotFileName
+# Input: path to an SBML file
+# Output: path to the corresponding snapshot file
+
+def snapshotFileName(modelFile):
+    return re.sub('\.xml$', '', modelFile)+'.snapshot'
+
+# fileHash
+# Input: path to a file
+# Output: MD5 hex digest of the file contents
+
+def fileHash(fileName):
+    myHash = hashlib.md5()
+    with open(fileName, 'rb') as inFile:
+        for block in iter(lambda: inFile.read(1 << 20), b''):
+            myHash.update(block)
+    return myHash.hexdigest()
+
+################################################################################
+
+# writeModelSnapshot
+# Write a cobrapy model to a binary snapshot file.
+# Input: cobrapy model object, snapshot file name, MD5 hash of the SBML file
+# written alongside the snapshot (or None)
+# Output: None
+
+def writeModelSnapshot(model, fileName, sourceHash=None):
+
+    modelDict = {'id': model.id,
+                 'compartments': dict(model.compartments),
+                 'metabolites': [(metab.id, metab.name, str(metab.formula) if metab.formula else None,
+                                  metab.charge, metab.compartment) for metab in model.metabolites],
+                 'reactions': [(rxn.id, rxn.name, rxn.lower_bound, rxn.upper_bound,
+                                rxn.gene_reaction_rule,
+                                [(metab.id, coeff) for metab, coeff in rxn.metabolites.items()])
+                               for rxn in model.reactions]}
+
+    payload = zlib.compress(cPickle.dumps(modelDict, cPickle.HIGHEST_PROTOCOL), 1)
+    header = {'version': snapshotVersion,
+              'sourceHash': sourceHash,
+              'payloadHash': hashlib.md5(payload).hexdigest()}
+
+# Write to a temporary file and rename, so an interrupted write never leaves a
+# truncated snapshot in place
+    with open(fileName+'.tmp', 'wb') as outFile:
+        cPickle.dump((header, payload), outFile, cPickle.HIGHEST_PROTOCOL)
+    os.rename(fileName+'.tmp', fileName)
+
+    return
+
+################################################################################
+
+# readModelSnapshot
+# Read a cobrapy model from a binary snapshot file.
+# Input: snapshot file name
+# Output: cobrapy model object and the snapshot header, or (None, None) if the
+# snapshot is of an unknown version or is corrupt
+
+def readModelSnapshot(fileName):
+
+    with open(fileName, 'rb') as inFile:
+        header, payload = cPickle.load(inFile)
+    if header.get('version') != snapshotVersion or hashlib.md5(payload).hexdigest() != header['payloadHash']:
+        return None, None
+    modelDict = cPickle.loads(zlib.decompress(payload))
+
+    model = cobra.Model(modelDict['id'])
+    model.compartments = modelDict['compartments']
+
+    metabDict = {}
+    for metabId, name, formula, charge, compartment in modelDict['metabolites']:
+        metab = cobra.Metabolite(metabId, formula=formula, name=name, compartment=compartment)
+        metab.charge = charge
+        metabDict[metabId] = metab
+    model.add_metabolites(metabDict.values())
+
+    rxnList = []
+    for rxnId, name, lowerBound, upperBound, gpr, stoichList in modelDict['reactions']:
+        rxn = cobra.Reaction(rxnId)
+        rxn.name = name
+        rxn.lower_bound = lowerBound
+        rxn.upper_bound = upperBound
+        rxn.add_metabolites(dict((metabDict[metabId], coeff) for metabId, coeff in stoichList))
+        rxn.gene_reaction_rule = gpr
+        rxnList.append(rxn)
+    model.add_reactions(rxnList)
+
+    return model, header
+
+################################################################################
+
+# loadModel
+# Load a model, preferring its binary snapshot over the SBML file. The SBML is
+# read if there is no valid snapshot, or if the SBML on disk has changed since
+# the snapshot was written. A fresh snapshot is saved after reading SBML.
+# Input: path to the SBML file
+# Output: cobrapy model object
+
+def loadModel(modelFile):
+
+    snapshotFile = snapshotFileName(modelFile)
+    if os.path.exists(snapshotFile):
+        model, header = readModelSnapshot(snapshotFile)
+        if model is not None:
+            if not os.path.exists(modelFile):
+                return model
+            if header['sourceHash'] is None:
+                if os.path.getmtime(modelFile) <= os.path.getmtime(snapshotFile):
+                    return model
+            elif header['sourceHash'] == fileHash(modelFile):
+                return model
+
+    model = cobra.io.read_sbml_model(modelFile)
+    writeModelSnapshot(model, snapshotFile, fileHash(modelFile))
+    return model
+
+################################################################################
+
+# Streaming SBML writer
+# cobra.io.write_sbml_model builds a complete libSBML document in memory before
+# serializing it. writeSBMLStream instead writes the fields the pipeline uses
+# (compartments; metabolites with formulas and charges; reactions with bounds,
+# stoichiometry and GPR strings) directly to a buffered file, as SBML level 2
+# in the COBRA layout read by cobra.io.read_sbml_model: formulas, charges and
+# gene associations in the notes, and bounds and objective coefficients as
+# kinetic law parameters. Set 'sbmlWriter' to 'cobra' to use cobrapy's writer.
+
+sbmlWriter = 'stream'
+
+sbmlNotesFormat = '<notes><html:p>%s</html:p></notes>'
+
+# Compartment declared for metabolites without one, since SBML requires every
+# species to be placed in a declared compartment
+sbmlMissingCompartment = 'missing'
+
+def xmlText(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return xml.sax.saxutils.escape(str(value))
+
+def xmlAttr(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return xml.sax.saxutils.quoteattr(str(value))
+
+def sbmlNumber(value):
+    value = float(value)
+    if np.isinf(value):
+        return '-INF' if value < 0 else 'INF'
+    return repr(value)
+
+# writeSBMLStream
+# Write a model to SBML. The file is written under a temporary name and
+# renamed, so an interrupted write never leaves a truncated model in place.
+# Metabolites, reactions and compartments are written in model order, as by
+# cobrapy's writer; if 'sortIds' is True, they are sorted by ID instead, so the
+# output (and its hash) does not depend on the order of the model. Metabolites
+# with no compartment are placed in 'sbmlMissingCompartment', and compartments
+# used by metabolites but absent from model.compartments are declared.
+# Input: cobrapy model object, path to the SBML file, sortIds flag
+# Output: None
+
+def writeSBMLStream(model, modelFile, sortIds=False):
+
+    def ordered(items, key):
+        if sortIds:
+            return sorted(items, key=key)
+        return list(items)
+
+    compDict = dict(model.compartments)
+    compList = ordered(compDict, lambda compId: compId)
+    for metab in model.metabolites:
+        compId = metab.compartment
+        if compId is None:
+            compId = sbmlMissingCompartment
+        if compId not in compDict:
+            compDict[compId] = compId
+            compList.append(compId)
+
+    outFile = open(modelFile+'.tmp', 'w', 1 << 20)
+    outFile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    outFile.write('<sbml xmlns="http://www.sbml.org/sbml/level2" level="2" version="1" '
+                  'xmlns:html="http://www.w3.org/1999/xhtml">\n')
+    outFile.write('<model id=%s name=%s>\n' % (xmlAttr(model.id), xmlAttr(model.id)))
+    outFile.write('<listOfUnitDefinitions>\n<unitDefinition id="mmol_per_gDW_per_hr">\n<listOfUnits>\n'
+                  '<unit kind="mole" scale="-3"/>\n<unit kind="gram" exponent="-1"/>\n'
+                  '<unit kind="second" multiplier="0.00027777" exponent="-1"/>\n'
+                  '</listOfUnits>\n</unitDefinition>\n</listOfUnitDefinitions>\n')
+
+    outFile.write('<listOfCompartments>\n')
+    for compId in compList:
+        outFile.write('<compartment id=%s name=%s/>\n' % (xmlAttr(compId), xmlAttr(compDict[compId])))
+    outFile.write('</listOfCompartments>\n')
+
+    outFile.write('<listOfSpecies>\n')
+    for metab in ordered(model.metabolites, lambda metab: metab.id):
+        compId = metab.compartment
+        if compId is None:
+            compId = sbmlMissingCompartment
+        chargeAttr = ''
+        noteList = []
+        if metab.formula:
+            noteList.append('FORMULA: '+xmlText(metab.formula))
+        if metab.charge is not None:
+            chargeAttr = ' charge="%i"' % int(metab.charge)
+            noteList.append('CHARGE: %i' % int(metab.charge))
+        outFile.write('<species id=%s name=%s compartment=%s%s boundaryCondition="false">' %
+                      (xmlAttr(metab.id), xmlAttr(metab.name), xmlAttr(compId), chargeAttr))
+        if len(noteList) > 0:
+            outFile.write(sbmlNotesFormat % '</html:p><html:p>'.join(noteList))
+        outFile.write('</species>\n')
+    outFile.write('</listOfSpecies>\n')
+
+    outFile.write('<listOfReactions>\n')
+    for rxn in ordered(model.reactions, lambda rxn: rxn.id):
+        outFile.write('<reaction id=%s name=%s reversible="%s">' %
+                      (xmlAttr(rxn.id), xmlAttr(rxn.name), str(rxn.reversibility == True).lower()))
+        outFile.write(sbmlNotesFormat % ('GENE_ASSOCIATION: '+xmlText(rxn.gene_reaction_rule)))
+        stoichList = ordered(((metab.id, coeff) for metab, coeff in rxn.metabolites.items()),
+                             lambda stoich: stoich[0])
+        for listName, sign in [('listOfReactants', -1), ('listOfProducts', 1)]:
+            refList = [(metabId, sign*coeff) for metabId, coeff in stoichList if sign*coeff > 0]
+            if len(refList) > 0:
+                outFile.write('\n<%s>' % listName)
+                for metabId, coeff in refList:
+                    outFile.write('<speciesReference species=%s stoichiometry="%s"/>' % (xmlAttr(metabId), sbmlNumber(coeff)))
+                outFile.write('</%s>' % listName)
+        outFile.write('\n<kineticLaw><math xmlns="http://www.w3.org/1998/Math/MathML"><ci>FLUX_VALUE</ci></math>'
+                      '<listOfParameters>')
+        for paramId, value in [('LOWER_BOUND', rxn.lower_bound), ('UPPER_BOUND', rxn.upper_bound),
+                               ('OBJECTIVE_COEFFICIENT', getattr(rxn, 'objective_coefficient', 0)),
+                               ('FLUX_VALUE', 0)]:
+            outFile.write('<parameter id="%s" value="%s" units="mmol_per_gDW_per_hr"/>' % (paramId, sbmlNumber(value)))
+        outFile.write('</listOfParameters></kineticLaw></reaction>\n')
+    outFile.write('</listOfReactions>\n')
+
+    outFile.write('</model>\n</sbml>\n')
+    outFile.close()
+    os.rename(modelFile+'.tmp', modelFile)
+
+    return
+
+################################################################################
+
+# saveModel
+# Save a model as a binary snapshot and, if requested, as SBML (written by the
+# writer selected in 'sbmlWriter'). Stages which produce intermediate models
+# should pass writeSBML=False.
+# Input: cobrapy model object, path to the SBML file, writeSBML flag
+# Output: None
+
+def saveModel(model, modelFile, writeSBML=True):
+
+    sourceHash = None
+    if writeSBML:
+        if sbmlWriter == 'stream':
+            writeSBMLStream(model, modelFile)
+        else:
+            cobra.io.write_sbml_model(model, modelFile)
+        sourceHash = fileHash(modelFile)
+    writeModelSnapshot(model, snapshotFileName(modelFile), sourceHash)
+
+    return
+
+################################################################################
+
 # Draft reconstructions from Kbase require some post-processing. This script 
 # does several important things:
 # 1. Reformat gene locus tags
@@ -188,11 +519,14 @@ def getModelStats(model):
 # Each model should be in its own directory in the 'RawModelFiles' folder. Both
 # SBMl and TSV versions from KBase are required.
 
-# As output, the code returns processed SBML files in the 'processedDataDir'
+# As output, the code returns processed models in the 'processedDataDir'
 # folder. Also returns a summary of the model sizes, in the 'summaryStatsDir'
-# folder.
+# folder. Processed models are saved as binary snapshots; SBML is only written
+# if 'writeSBML' is True, since pruneCurrencyMetabs produces the final model.
+# If 'shard' is given, only that shard's genomes are processed and the summary
+# is written as a partial (see metadataFunctions.mergeShardSummaries).
 
-def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
+def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir, writeSBML=False, shard=None):
 
     # # Check that folders exist and create them if necessary
     if not os.path.exists(processedDataDir):
@@ -200,8 +534,8 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
     if not os.path.exists(summaryStatsDir):
         os.makedirs(summaryStatsDir)
     
-    # Import the list of models
-    dirList = mf.getDirList(rawModelDir)
+    # Import the list of models, restricted to this shard
+    dirList = mf.shardDirList(mf.getDirList(rawModelDir), rawModelDir, shard)
     numSubDir = len(dirList)
     
     # Import the list of metabolies to revise
@@ -280,7 +614,7 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
         # Transport reactions, where a metabolite with the same ID is on both sides
             metabList = []
             for curMetab in curRxn.metabolites:
-                metabList.append(re.sub('_[a-z]\d', '', curMetab.id))
+                metabList.append(idf.compoundId(curMetab.id))
             # Count number of appearences each list element
             metabList = [metab for metab in metabList if metab != 'cpd00067']
             if len(metabList) > 0:        
@@ -295,7 +629,7 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
     
         print 'The remaining extracellular metabolites are:'
         for curMetab in model.metabolites:
-            if re.search('_e0', curMetab.id):
+            if idf.inCompartment(curMetab.id, 'e', '0'):
                 print curMetab.id
     
     ################################################################################                   
@@ -305,8 +639,8 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
         for curMetab in model.metabolites:
         # Retrieve the metabolite name w/o compartment info
         # Look up the appropriate index in the cpdData DF
-            curMetab.formula = cobra.core.Formula.Formula(cpdData.loc[re.sub('_[a-z]\d', '', curMetab.id)][1])
-            curMetab.formula.id = cpdData.loc[re.sub('_[a-z]\d', '', curMetab.id)][1]
+            curMetab.formula = cobra.core.Formula.Formula(cpdData.loc[idf.compoundId(curMetab.id)][1])
+            curMetab.formula.id = cpdData.loc[idf.compoundId(curMetab.id)][1]
     
     ################################################################################                   
     
@@ -360,16 +694,16 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
     ### Update names to remove trailing zeros
         for curComp in model.compartments:
             model.compartments[curComp] = re.sub('_\d', '', model.compartments[curComp])
-            model.compartments[re.sub('\d', '', curComp)] = model.compartments.pop(curComp)
+            model.compartments[idf.dropIndex(curComp)] = model.compartments.pop(curComp)
         
         for curMetab in model.metabolites:
-            curMetab.id = re.sub('\d$', '', curMetab.id)
-            curMetab.name = re.sub('_[a-z]\d$', '', curMetab.name)
-            curMetab.compartment = re.sub('\d$', '', curMetab.compartment)
+            curMetab.id = idf.dropIndex(curMetab.id)
+            curMetab.name = idf.stripNameSuffix(curMetab.name)
+            curMetab.compartment = idf.dropIndex(curMetab.compartment)
         
         for curRxn in model.reactions:
-            curRxn.id = re.sub('\d$', '', curRxn.id)
-            curRxn.name = re.sub('_[a-z]\d$', '', curRxn.name)
+            curRxn.id = idf.dropIndex(curRxn.id)
+            curRxn.name = idf.stripNameSuffix(curRxn.name)
                 
     ################################################################################                   
     
@@ -384,11 +718,11 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
             os.makedirs(processedDataDir+'/'+curDir)
     
     #        print 'Writing to file'
-        cobra.io.write_sbml_model(model, processedDataDir+'/'+curDir+'/'+curDir+'.xml')
+        saveModel(model, processedDataDir+'/'+curDir+'/'+curDir+'.xml', writeSBML)
         count = count + 1
     
     # Write the results to file
-    modelSizeDF.to_csv(summaryStatsDir+'/modelStats.tsv', sep='\t')    
+    modelSizeDF.to_csv(summaryStatsDir+'/'+mf.shardFileName('modelStats.tsv', shard), sep='\t')    
 
     return
     
@@ -406,10 +740,14 @@ def processSBMLforRE(rawModelDir, processedDataDir, summaryStatsDir):
 # proton or functional group transfer. Then, we remove additional singletom
 # metabolites (protons and the like.)
 
-def pruneCurrencyMetabs(modelDir, summaryStatsDir):
+# The pruned model is the final deliverable, and is written as SBML unless
+# 'writeSBML' is False. A binary snapshot is always saved for later stages.
+# As in processSBMLforRE, 'shard' restricts processing to one shard.
+
+def pruneCurrencyMetabs(modelDir, summaryStatsDir, writeSBML=True, shard=None):
     
-    # Import the list of models
-    dirList = mf.getDirList(modelDir)
+    # Import the list of models, restricted to this shard
+    dirList = mf.shardDirList(mf.getDirList(modelDir), modelDir, shard)
     
     # Create an array to store results
     # Columns: genes, metabs, rxns, balanced (binary)
@@ -422,7 +760,7 @@ def pruneCurrencyMetabs(modelDir, summaryStatsDir):
     for curDir in dirList:
 
     # Read in model from SBML
-        model = cobra.io.read_sbml_model(modelDir+'/'+curDir+'/'+curDir+'.xml')
+        model = loadModel(modelDir+'/'+curDir+'/'+curDir+'.xml')
     
     # Write the original model to a text file for inspection.
     #    with open(modelDir+'/'+curDir+'/'+curDir+'Original.txt', 'w') as outFile:
@@ -497,10 +835,10 @@ def pruneCurrencyMetabs(modelDir, summaryStatsDir):
     #            outFile.write(curRxn.id+'\t'+curRxn.build_reaction_string(use_metabolite_names=True)+'\n')
                 
         print 'Processing model '+str(count)+' of '+str(len(dirList))
-        cobra.io.write_sbml_model(model, modelDir+'/'+curDir+'/'+curDir+'.xml')
+        saveModel(model, modelDir+'/'+curDir+'/'+curDir+'.xml', writeSBML)
         count = count + 1
    
    # Write the results to file
-    modelSizeDF.to_csv(summaryStatsDir+'/prunedModelStats.tsv', sep='\t')
+    modelSizeDF.to_csv(summaryStatsDir+'/'+mf.shardFileName('prunedModelStats.tsv', shard), sep='\t')
      
     return
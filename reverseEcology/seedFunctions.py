@@ -10,8 +10,15 @@
 ################################################################################ 
 
 # Import Python packages.
+import numpy as np
 import os
 import pandas as pd
+import scipy.sparse as sp
+
+# Import custom Python modules
+import idFunctions as idf
+import ioFunctions as iof
+import metadataFunctions as mf
 
 # Define path for data included in the package
 dataPath = os.path.dirname(os.path.abspath(__file__))+'/packageData'
@@ -40,15 +47,16 @@ def consolidateSeeds(dirList, processedDataDir, summaryStatsDir):
     # Read in list of seed weights into a temporary data frame. Perform an outer
     # join with the existing data frame to incorporate the new list of weights.
     for curDir in dirList:
-        tempDF = pd.read_csv(processedDataDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt', names=['Metabolite','Name',curDir], sep='\t')
+        with iof.openFile(iof.findFile(processedDataDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt')) as inFile:
+            tempDF = pd.read_csv(inFile, names=['Metabolite','Name',curDir], sep='\t')
         tempDF =  tempDF.drop('Name', axis=1)
         revEcolMatrixDF = pd.merge(revEcolMatrixDF, tempDF, how='outer', on="Metabolite")
     
     # Replace all the NaN values with zeros
     revEcolMatrixDF.fillna(0, inplace=True)
     
-    # Strip '_c' from metab names to facilitate the merge
-    revEcolMatrixDF['Metabolite'] = revEcolMatrixDF['Metabolite'].str.rstrip('_c')
+    # Strip the compartment from metab names to facilitate the merge
+    revEcolMatrixDF['Metabolite'] = revEcolMatrixDF['Metabolite'].map(idf.compoundId)
     
     # Append a new column containing common names associated with metabolite IDs.
     # The file metabMap.csv was created manually from the seed database, and should
@@ -65,3 +73,50 @@ def consolidateSeeds(dirList, processedDataDir, summaryStatsDir):
     pd.DataFrame.to_csv(revEcolMatrixDF, summaryStatsDir+'/'+'seedMatrixWeighted.csv')    
 
     return revEcolMatrixDF
+
+################################################################################
+
+# aggregateSeedsByTaxonomy
+# Aggregates the consolidated seed matrix (from consolidateSeeds) to every
+# requested taxonomic level without rebuilding merged graphs. The taxonomy is
+# read once, and each level costs one sparse matrix multiply against a
+# genome-by-group indicator matrix. For each level two data frames are written
+# and returned, with metabolites as rows and groups as columns:
+#   seedMatrix<Level>.csv: mean seed weight across genomes in the group
+#   seedFrequency<Level>.csv: fraction of genomes in the group for which the
+#   metabolite is a seed
+# Input: data frame from consolidateSeeds, taxonomy file, list of levels,
+# output directory
+# Output: dictionary of {level: (weight data frame, frequency data frame)}
+
+def aggregateSeedsByTaxonomy(revEcolMatrixDF, taxonFile, levelList, summaryStatsDir):
+
+    print 'Aggregating seed sets by taxonomy'
+
+    # Split off the metabolite identifiers and names; the remaining columns are
+    # genomes
+    labelDF = revEcolMatrixDF[['CommonName', 'Metabolite']]
+    genomeList = [col for col in revEcolMatrixDF.columns if col not in ['CommonName', 'Metabolite']]
+    seedMatrix = sp.csr_matrix(revEcolMatrixDF[genomeList].values.astype(float))
+    presenceMatrix = (seedMatrix > 0).astype(float)
+
+    levelDict = mf.importTaxonomyLevels(taxonFile, levelList)
+    indicatorDict = mf.taxonomyIndicators(levelDict, genomeList)
+
+    aggregateDict = {}
+    for level in levelList:
+        groupList, indicator = indicatorDict[level]
+        groupSize = np.asarray(indicator.sum(axis=0)).ravel()
+        groupSize[groupSize == 0] = 1
+
+        weightArray = (seedMatrix * indicator).toarray() / groupSize
+        freqArray = (presenceMatrix * indicator).toarray() / groupSize
+
+        weightDF = pd.concat([labelDF, pd.DataFrame(weightArray, index=labelDF.index, columns=groupList)], axis=1)
+        freqDF = pd.concat([labelDF, pd.DataFrame(freqArray, index=labelDF.index, columns=groupList)], axis=1)
+
+        pd.DataFrame.to_csv(weightDF, summaryStatsDir+'/'+'seedMatrix'+level+'.csv')
+        pd.DataFrame.to_csv(freqDF, summaryStatsDir+'/'+'seedFrequency'+level+'.csv')
+        aggregateDict[level] = (weightDF, freqDF)
+
+    return aggregateDict
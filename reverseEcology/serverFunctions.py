@@ -0,0 +1,239 @@
+###############################################################################
+# serverFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for serving seed sets and graph statistics from memory.
+# A processed collection is loaded once into compact indexes, and a local HTTP
+# server answers queries from them. Genomes whose output files change on disk
+# are reloaded individually.
+#
+# Queries (all return JSON):
+#   /seeds?genome=X&genome=Y   seed metabolites and weights of each genome
+#   /stats?genome=X&genome=Y   graph statistics of each genome
+#   /genomes?seed=M            genomes in which metabolite M is a seed
+#   /reload?genome=X           force a genome to be reloaded
+################################################################################
+
+# Import Python packages.
+import BaseHTTPServer
+import json
+import os
+import SocketServer
+import threading
+import time
+import urlparse
+
+# Import custom Python modules
+import graphFunctions as gf
+import ioFunctions as iof
+
+################################################################################
+
+# genomeFiles
+# Input: genome name, directory containing graph files, directory containing
+# seed compounds
+# Output: list of files from which the genome's entry is built (the existing
+# compressed variant, if any)
+
+def genomeFiles(genome, processedDataDir, seedDir):
+    return [iof.findFile(processedDataDir+'/'+genome+'/'+genome+'AdjList.txt'),
+            iof.findFile(processedDataDir+'/'+genome+'/'+genome+'RedAdjList.txt'),
+            iof.findFile(seedDir+'/'+genome+'/'+genome+'SeedCompounds.txt')]
+
+def fileTimes(fileList):
+    return tuple(os.path.getmtime(fileName) if os.path.exists(fileName) else None
+                 for fileName in fileList)
+
+################################################################################
+
+# loadGenomeEntry
+# Read one genome's seed compounds and compute statistics of its graph and
+# reduced graph (see graphFunctions.getEdgeStreamStats).
+# Input: genome name, directory containing graph files, directory containing
+# seed compounds
+# Output: dictionary with keys 'seeds' ({metabolite: weight}), 'graphStats',
+# 'reducedGraphStats', and 'mtimes'
+
+def loadGenomeEntry(genome, processedDataDir, seedDir):
+
+    fileList = genomeFiles(genome, processedDataDir, seedDir)
+    entry = {'seeds': {}, 'graphStats': None, 'reducedGraphStats': None,
+             'mtimes': fileTimes(fileList)}
+
+    for key, fileName in [('graphStats', fileList[0]), ('reducedGraphStats', fileList[1])]:
+        if os.path.exists(fileName):
+            nodeList, sources, sinks = gf.readEdgeArrays(fileName)
+            entry[key] = gf.getEdgeStreamStats(len(nodeList), sources, sinks)[0]
+
+    if os.path.exists(fileList[2]):
+        with iof.openFile(fileList[2]) as inFile:
+            for line in inFile:
+                tokens = line.rstrip('\n').split('\t')
+                if len(tokens) == 3:
+                    entry['seeds'][tokens[0]] = float(tokens[2])
+
+    return entry
+
+################################################################################
+
+# Collection index
+# The index is a dictionary holding each genome's entry and an inverted index
+# from seed metabolite to the set of genomes in which it is a seed. A lock
+# guards updates, since the server answers queries from several threads.
+
+def loadCollectionIndex(dirList, processedDataDir, seedDir):
+
+    print 'Loading collection into memory'
+
+    index = {'processedDataDir': processedDataDir, 'seedDir': seedDir,
+             'genomes': {}, 'seedIndex': {}, 'lock': threading.Lock()}
+    for genome in dirList:
+        setGenomeEntry(index, genome, loadGenomeEntry(genome, processedDataDir, seedDir))
+    return index
+
+def setGenomeEntry(index, genome, entry):
+    with index['lock']:
+        oldEntry = index['genomes'].get(genome)
+        if oldEntry is not None:
+            for metab in oldEntry['seeds']:
+                index['seedIndex'][metab].discard(genome)
+                if len(index['seedIndex'][metab]) == 0:
+                    del index['seedIndex'][metab]
+        index['genomes'][genome] = entry
+        for metab in entry['seeds']:
+            index['seedIndex'].setdefault(metab, set()).add(genome)
+
+# refreshGenome
+# Reload a genome if any of its files have changed since it was loaded.
+# Input: index, genome name, force flag
+# Output: True if the genome was reloaded. Raises KeyError for a genome with
+# no output files.
+
+def refreshGenome(index, genome, force=False):
+    fileList = genomeFiles(genome, index['processedDataDir'], index['seedDir'])
+    entry = index['genomes'].get(genome)
+    if entry is None and not any(os.path.exists(fileName) for fileName in fileList):
+        raise KeyError('Unknown genome: '+genome)
+    if force or entry is None or entry['mtimes'] != fileTimes(fileList):
+        setGenomeEntry(index, genome, loadGenomeEntry(genome, index['processedDataDir'], index['seedDir']))
+        return True
+    return False
+
+################################################################################
+
+# Query functions. These can be called directly on an index, and are also
+# used by the server.
+
+def querySeeds(index, genomeList):
+    resultDict = {}
+    for genome in genomeList:
+        refreshGenome(index, genome)
+        resultDict[genome] = index['genomes'][genome]['seeds']
+    return resultDict
+
+def queryStats(index, genomeList):
+    resultDict = {}
+    for genome in genomeList:
+        refreshGenome(index, genome)
+        entry = index['genomes'][genome]
+        resultDict[genome] = {'graph': entry['graphStats'], 'reducedGraph': entry['reducedGraphStats']}
+    return resultDict
+
+def querySeedGenomes(index, metab):
+    with index['lock']:
+        return sorted(index['seedIndex'].get(metab, set()))
+
+################################################################################
+
+# Request handler for the query server
+
+class QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        index = self.server.index
+        url = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(url.query)
+        try:
+            if url.path == '/seeds':
+                result = querySeeds(index, params.get('genome', []))
+            elif url.path == '/stats':
+                result = queryStats(index, params.get('genome', []))
+            elif url.path == '/genomes':
+                result = dict((metab, querySeedGenomes(index, metab)) for metab in params.get('seed', []))
+            elif url.path == '/reload':
+                result = dict((genome, refreshGenome(index, genome, force=True)) for genome in params.get('genome', []))
+            else:
+                self.sendJSON(404, {'error': 'Unknown query: '+url.path})
+                return
+        except (KeyError, IOError) as error:
+            self.sendJSON(400, {'error': str(error)})
+            return
+# Malformed output files (e.g. a genome being rewritten) raise other errors
+        except Exception as error:
+            self.sendJSON(500, {'error': '%s: %s' % (type(error).__name__, error)})
+            return
+        self.sendJSON(200, result)
+
+    def sendJSON(self, status, result):
+        body = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return
+
+class QueryServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+################################################################################
+
+# pollCollection
+# Periodically check every genome for changed files, so that queries across
+# the collection (e.g. /genomes) also see updated results. A genome which
+# cannot be reloaded (e.g. because its files are only partly written) keeps
+# its previous entry and is retried at the next check.
+
+def pollCollection(index, pollInterval):
+    while True:
+        time.sleep(pollInterval)
+        for genome in list(index['genomes'].keys()):
+            try:
+                refreshGenome(index, genome)
+            except Exception as error:
+                print 'Error reloading %s: %s: %s' % (genome, type(error).__name__, error)
+
+################################################################################
+
+# runQueryServer
+# Load a processed collection and serve queries on localhost until
+# interrupted.
+# Input: list of genomes, directory containing graph files, directory
+# containing seed compounds, port, interval (in seconds) between checks for
+# changed files
+# Output: None
+
+def runQueryServer(dirList, processedDataDir, seedDir, port=8765, pollInterval=30):
+
+    index = loadCollectionIndex(dirList, processedDataDir, seedDir)
+
+    pollThread = threading.Thread(target=pollCollection, args=(index, pollInterval))
+    pollThread.daemon = True
+    pollThread.start()
+
+    server = QueryServer(('127.0.0.1', port), QueryHandler)
+    server.index = index
+    print 'Serving queries on http://127.0.0.1:'+str(port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+    return
@@ -0,0 +1,277 @@
+###############################################################################
+# similarityFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for comparing genomes by their seed profiles. Similarities
+# are computed from the sparse seed matrix in row blocks, so the full pairwise
+# matrix is never held in memory. Each genome's top-k neighbors are stored in
+# an index file which can be queried with new genomes and used for clustering.
+################################################################################
+
+# Import Python packages.
+import multiprocessing
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.csgraph as csgraph
+import scipy.cluster.hierarchy as hier
+
+################################################################################
+
+# seedProfileMatrix
+# Convert the data frame from seedFunctions.consolidateSeeds into a sparse
+# genome-by-metabolite matrix of seed weights.
+# Input: data frame from consolidateSeeds
+# Output: list of genomes, list of metabolites, CSR matrix of seed weights
+
+def seedProfileMatrix(revEcolMatrixDF):
+    genomeList = [col for col in revEcolMatrixDF.columns if col not in ['CommonName', 'Metabolite']]
+    metabList = list(revEcolMatrixDF['Metabolite'])
+    profileMatrix = sp.csr_matrix(revEcolMatrixDF[genomeList].values.T.astype(float))
+    profileMatrix.eliminate_zeros()
+    return genomeList, metabList, profileMatrix
+
+################################################################################
+
+# blockSimilarity
+# Similarity between each row of 'rowBlock' and each row of 'profileMatrix'.
+# Jaccard similarity is computed on seed presence; cosine similarity on seed
+# weights.
+# Input: CSR row block, CSR profile matrix, metric ('jaccard' or 'cosine')
+# Output: dense array of similarities, one row per row of 'rowBlock'
+
+def blockSimilarity(rowBlock, profileMatrix, metric):
+
+    if metric == 'jaccard':
+        rowBlock = (rowBlock > 0).astype(float)
+        profileMatrix = (profileMatrix > 0).astype(float)
+        interArray = (rowBlock * profileMatrix.T).toarray()
+        rowSize = np.asarray(rowBlock.sum(axis=1)).ravel()
+        colSize = np.asarray(profileMatrix.sum(axis=1)).ravel()
+        unionArray = rowSize[:, np.newaxis] + colSize[np.newaxis, :] - interArray
+        unionArray[unionArray == 0] = 1
+        return interArray / unionArray
+
+    elif metric == 'cosine':
+        dotArray = (rowBlock * profileMatrix.T).toarray()
+        rowNorm = np.sqrt(np.asarray(rowBlock.multiply(rowBlock).sum(axis=1)).ravel())
+        colNorm = np.sqrt(np.asarray(profileMatrix.multiply(profileMatrix).sum(axis=1)).ravel())
+        normArray = rowNorm[:, np.newaxis] * colNorm[np.newaxis, :]
+        normArray[normArray == 0] = 1
+        return dotArray / normArray
+
+    else:
+        raise ValueError('Unknown similarity metric: '+str(metric))
+
+################################################################################
+
+# topNeighbors
+# Select the k most similar columns in each row of a similarity block.
+# Input: dense similarity block, k, optional array of column indices to exclude
+# (one per row, used to drop self-matches)
+# Output: arrays of neighbor indices and similarities, sorted by decreasing
+# similarity
+
+def topNeighbors(simArray, k, excludeArray=None):
+    k = min(k, simArray.shape[1])
+    if k == 0:
+        return np.zeros((simArray.shape[0], 0), dtype=int), np.zeros((simArray.shape[0], 0))
+    simArray = simArray.copy()
+    if excludeArray is not None:
+        simArray[np.arange(len(excludeArray)), excludeArray] = -np.inf
+    nbrArray = np.argpartition(-simArray, k-1, axis=1)[:, :k]
+    scoreArray = simArray[np.arange(simArray.shape[0])[:, np.newaxis], nbrArray]
+    order = np.argsort(-scoreArray, axis=1, kind='mergesort')
+    nbrArray = nbrArray[np.arange(simArray.shape[0])[:, np.newaxis], order]
+    scoreArray = scoreArray[np.arange(simArray.shape[0])[:, np.newaxis], order]
+    return nbrArray, scoreArray
+
+################################################################################
+
+# Worker state and function for computing top-k neighbors in parallel. The
+# profile matrix is handed to each worker once, through the pool initializer.
+
+workerState = {}
+
+def initWorker(profileMatrix, k, metric):
+    workerState['profileMatrix'] = profileMatrix
+    workerState['k'] = k
+    workerState['metric'] = metric
+
+def blockNeighbors(blockRange):
+    start, stop = blockRange
+    profileMatrix = workerState['profileMatrix']
+    simArray = blockSimilarity(profileMatrix[start:stop], profileMatrix, workerState['metric'])
+    return topNeighbors(simArray, workerState['k'], np.arange(start, stop))
+
+################################################################################
+
+# buildSimilarityIndex
+# Compute each genome's top-k neighbors by seed profile and save them, along
+# with the profile matrix, to an index file (.npz). Similarities are computed
+# in blocks of 'blockSize' genomes, so peak memory is proportional to
+# blockSize times the number of genomes. Blocks are distributed over
+# 'numProcs' processes.
+# Input: data frame from consolidateSeeds, index file name, k, metric, block
+# size, number of processes
+# Output: index dictionary (see loadSimilarityIndex)
+
+def buildSimilarityIndex(revEcolMatrixDF, indexFile, k=10, metric='jaccard',
+                         blockSize=500, numProcs=1):
+
+    print 'Building seed profile similarity index'
+
+    genomeList, metabList, profileMatrix = seedProfileMatrix(revEcolMatrixDF)
+    numGenomes = len(genomeList)
+    k = min(k, numGenomes-1)
+    blockList = [(start, min(start+blockSize, numGenomes)) for start in range(0, numGenomes, blockSize)]
+
+    if numProcs > 1:
+        pool = multiprocessing.Pool(numProcs, initWorker, (profileMatrix, k, metric))
+        resultList = pool.map(blockNeighbors, blockList)
+        pool.close()
+        pool.join()
+    else:
+        initWorker(profileMatrix, k, metric)
+        resultList = [blockNeighbors(blockRange) for blockRange in blockList]
+
+    nbrArray = np.vstack([result[0] for result in resultList])
+    scoreArray = np.vstack([result[1] for result in resultList])
+
+    np.savez_compressed(indexFile, genomes=np.array(genomeList), metabolites=np.array(metabList),
+                        data=profileMatrix.data, indices=profileMatrix.indices,
+                        indptr=profileMatrix.indptr, shape=np.array(profileMatrix.shape),
+                        neighbors=nbrArray, scores=scoreArray, metric=np.array(metric))
+
+    return loadSimilarityIndex(indexFile)
+
+################################################################################
+
+# loadSimilarityIndex
+# Input: index file name
+# Output: dictionary with keys 'genomes', 'metabolites', 'profileMatrix',
+# 'neighbors', 'scores', and 'metric'
+
+def loadSimilarityIndex(indexFile):
+    with np.load(indexFile) as indexData:
+        index = {'genomes': list(indexData['genomes']),
+                 'metabolites': list(indexData['metabolites']),
+                 'profileMatrix': sp.csr_matrix((indexData['data'], indexData['indices'], indexData['indptr']),
+                                                shape=tuple(indexData['shape'])),
+                 'neighbors': indexData['neighbors'],
+                 'scores': indexData['scores'],
+                 'metric': str(indexData['metric'])}
+    return index
+
+################################################################################
+
+# getNeighbors
+# Retrieve the stored top-k neighbors of a genome in the index.
+# Input: index dictionary, genome name
+# Output: list of (genome, similarity) tuples
+
+def getNeighbors(index, genome):
+    row = index['genomes'].index(genome)
+    return [(index['genomes'][nbr], float(score))
+            for nbr, score in zip(index['neighbors'][row], index['scores'][row])]
+
+################################################################################
+
+# querySimilarityIndex
+# Find the genomes in the index most similar to a new seed profile, without
+# recomputing the index. Metabolites not in the index still count towards the
+# size (or norm) of the query profile.
+# Input: index dictionary, dictionary of {metabolite: seed weight} for the new
+# genome (seed weights are only used by the cosine metric), k
+# Output: list of (genome, similarity) tuples
+
+def querySimilarityIndex(index, seedDict, k=10):
+
+    metabIndex = dict((metab, col) for col, metab in enumerate(index['metabolites']))
+    seedList = [metab for metab in seedDict if seedDict[metab] > 0]
+    colList = [metabIndex[metab] for metab in seedList if metab in metabIndex]
+    valueList = [seedDict[metab] for metab in seedList if metab in metabIndex]
+    queryRow = sp.csr_matrix((valueList, ([0]*len(colList), colList)),
+                             shape=(1, len(index['metabolites'])))
+    profileMatrix = index['profileMatrix']
+
+    if index['metric'] == 'jaccard':
+        presenceMatrix = (profileMatrix > 0).astype(float)
+        interArray = ((queryRow > 0).astype(float) * presenceMatrix.T).toarray()
+        unionArray = len(seedList) + np.asarray(presenceMatrix.sum(axis=1)).T - interArray
+        unionArray[unionArray == 0] = 1
+        simArray = interArray / unionArray
+    else:
+        dotArray = (queryRow * profileMatrix.T).toarray()
+        queryNorm = np.sqrt(np.sum(np.square([seedDict[metab] for metab in seedList])))
+        colNorm = np.sqrt(np.asarray(profileMatrix.multiply(profileMatrix).sum(axis=1)).T)
+        normArray = queryNorm * colNorm
+        normArray[normArray == 0] = 1
+        simArray = dotArray / normArray
+
+    nbrArray, scoreArray = topNeighbors(simArray, k)
+    return [(index['genomes'][nbr], float(score)) for nbr, score in zip(nbrArray[0], scoreArray[0])]
+
+################################################################################
+
+# clusterSimilarityIndex
+# Hierarchical clustering of the genomes in the index, using only the stored
+# top-k neighbor graph. The minimum spanning tree of the k-NN graph
+# (distance = 1 - similarity) gives the merge order, so memory is proportional
+# to the number of genomes times k. Note that this is single linkage over the
+# k-NN graph's MST, not exact single linkage over all pairs: it matches the
+# exact clustering only where the full MST's edges are among the stored
+# neighbors, and merge distances can otherwise be larger. Genomes not
+# connected in the k-NN graph are joined at an arbitrary distance of 1.0, which
+# is not a measured distance. The result is a linkage matrix in the format of
+# scipy.cluster.hierarchy.
+# Input: index dictionary, optional distance threshold at which to cut the
+# tree into flat clusters
+# Output: linkage matrix, and array of flat cluster labels (or None)
+
+def clusterSimilarityIndex(index, threshold=None):
+
+    numGenomes = len(index['genomes'])
+    rowArray = np.repeat(np.arange(numGenomes), index['neighbors'].shape[1])
+    colArray = index['neighbors'].ravel()
+# A small offset keeps zero-distance edges from being dropped as sparse zeros
+    distArray = 1 - index['scores'].ravel() + 1e-12
+    knnGraph = sp.csr_matrix((distArray, (rowArray, colArray)), shape=(numGenomes, numGenomes))
+    mst = csgraph.minimum_spanning_tree(knnGraph).tocoo()
+
+# Join any remaining components at distance 1
+    numComp, labels = csgraph.connected_components(mst, directed=False)
+    edgeList = [(max(dist - 1e-12, 0), row, col) for row, col, dist in zip(mst.row, mst.col, mst.data)]
+    firstArray = np.unique(labels, return_index=True)[1]
+    edgeList.extend((1.0, firstArray[0], first) for first in firstArray[1:])
+    edgeList.sort()
+
+# Convert the MST edges into a linkage matrix by merging in order of distance.
+# Each cluster's root is its newest linkage node; paths are compressed along
+# the way, as in graphFunctions.unionFindComponents.
+    parent = range(2*numGenomes - 1)
+    size = [1]*(2*numGenomes - 1)
+    linkage = np.zeros((numGenomes - 1, 4))
+    for step, (dist, row, col) in enumerate(edgeList):
+        rootA = row
+        while parent[rootA] != rootA:
+            parent[rootA] = parent[parent[rootA]]
+            rootA = parent[rootA]
+        rootB = col
+        while parent[rootB] != rootB:
+            parent[rootB] = parent[parent[rootB]]
+            rootB = parent[rootB]
+        newNode = numGenomes + step
+        parent[rootA] = newNode
+        parent[rootB] = newNode
+        size[newNode] = size[rootA] + size[rootB]
+        linkage[step] = [min(rootA, rootB), max(rootA, rootB), dist, size[newNode]]
+
+    labelArray = None
+    if threshold is not None:
+        labelArray = hier.fcluster(linkage, threshold, criterion='distance')
+
+    return linkage, labelArray
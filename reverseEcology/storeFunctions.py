@@ -0,0 +1,489 @@
+###############################################################################
+# storeFunctions.py
+# Copyright (c) 2016, Joshua J Hamilton and Katherine D McMahon
+# Affiliation: Department of Bacteriology
+#              University of Wisconsin-Madison, Madison, Wisconsin, USA
+# URL: http://http://mcmahonlab.wisc.edu/
+# All rights reserved.
+################################################################################
+# Set of functions for storing per-genome results in a single SQLite database.
+# The database replaces the per-genome text files (AdjList.txt, RxnEdges.txt,
+# RedAdjList.txt, SCCAdjList.txt, SCCDict.txt, SeedCompounds.txt) and the
+# summary statistics tables, and can export the original file layout on demand.
+#
+# The pipeline stages (sbmlFunctions.dirListToAdjacencyList,
+# graphFunctions.computeGraphStats, reduceToLargeComponent and
+# computeSeedSets) take an optional connection 'conn'. When it is given, they
+# read their inputs from the database and write their results to it in
+# batched transactions, and the per-genome files are never created. Results
+# already written as files can be loaded with importCollection.
+################################################################################
+
+# Import Python packages.
+import networkx as nx
+import numpy as np
+import os
+import pandas as pd
+import sqlite3
+
+# Import custom Python modules
+import ioFunctions as iof
+
+################################################################################
+
+# Edge kinds stored in the 'edges' table and the file each one corresponds to.
+# The 'rxn' kind carries a reaction identifier; the other kinds do not.
+edgeFileDict = {'adj': 'AdjList.txt',
+                'rxn': 'RxnEdges.txt',
+                'red': 'RedAdjList.txt',
+                'scc': 'SCCAdjList.txt'}
+
+# Summary statistics files and the graph type under which each is stored
+statFileDict = {'GraphStatistics.txt': 'graph',
+                'DiGraphStatistics.txt': 'digraph',
+                'ReducedGraphStatistics.txt': 'reducedGraph',
+                'ReducedDiGraphStatistics.txt': 'reducedDigraph'}
+
+schemaSQL = '''
+CREATE TABLE IF NOT EXISTS edges (
+    genome TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    sink TEXT,
+    reaction TEXT);
+CREATE INDEX IF NOT EXISTS edgesGenomeIdx ON edges (genome, kind);
+CREATE TABLE IF NOT EXISTS sccMembers (
+    genome TEXT NOT NULL,
+    scc TEXT NOT NULL,
+    metabolite TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS sccGenomeIdx ON sccMembers (genome);
+CREATE TABLE IF NOT EXISTS seeds (
+    genome TEXT NOT NULL,
+    metabolite TEXT NOT NULL,
+    name TEXT,
+    weight REAL);
+CREATE INDEX IF NOT EXISTS seedsGenomeIdx ON seeds (genome);
+CREATE INDEX IF NOT EXISTS seedsMetabIdx ON seeds (metabolite);
+CREATE TABLE IF NOT EXISTS graphStats (
+    genome TEXT NOT NULL,
+    graphType TEXT NOT NULL,
+    nodes INTEGER,
+    edges INTEGER,
+    components INTEGER,
+    largest INTEGER,
+    PRIMARY KEY (genome, graphType));
+CREATE TABLE IF NOT EXISTS modelStats (
+    genome TEXT PRIMARY KEY,
+    genes INTEGER,
+    metabolites INTEGER,
+    reactions INTEGER);
+'''
+
+################################################################################
+
+# openResultStore
+# Open (creating if necessary) a result database. The database is placed in
+# write-ahead-logging mode so readers are not blocked while results are loaded.
+# Input: path to the database file
+# Output: sqlite3 connection object
+
+def openResultStore(dbPath):
+    dbDir = os.path.dirname(os.path.abspath(dbPath))
+    if not os.path.exists(dbDir):
+        os.makedirs(dbDir)
+    conn = sqlite3.connect(dbPath)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(schemaSQL)
+    conn.commit()
+    return conn
+
+# Number of genomes written by a pipeline stage between commits
+storeBatchSize = 100
+
+################################################################################
+
+# readAdjacencyFile
+# Parse an adjacency list (either the tab-delimited lists written by
+# sbmlFunctions or the space-delimited lists written by networkx) into a list
+# of (source, sink) pairs. Nodes without neighbors are returned with a sink of
+# None so that isolated nodes survive a round trip.
+# Input: path to the adjacency list
+# Output: list of (source, sink) tuples
+
+def readAdjacencyFile(fileName):
+    edgeList = []
+    with iof.openFile(iof.findFile(fileName)) as inFile:
+        for line in inFile:
+            if line.startswith('#'):
+                continue
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            if len(tokens) == 1:
+                edgeList.append((tokens[0], None))
+            for sink in tokens[1:]:
+                edgeList.append((tokens[0], sink))
+    return edgeList
+
+################################################################################
+
+# storeEdges, storeSCCDict, storeSeeds, storeGraphStats, storeModelStats
+# Write one genome's results into the database. Existing rows for the genome
+# are replaced. These functions do not commit; callers group several genomes
+# into a single transaction.
+
+def storeEdges(conn, genome, kind, edgeList):
+    conn.execute('DELETE FROM edges WHERE genome=? AND kind=?', (genome, kind))
+    if kind == 'rxn':
+        conn.executemany('INSERT INTO edges VALUES (?,?,?,?,?)',
+                         ((genome, kind, source, sink, rxn) for source, sink, rxn in edgeList))
+    else:
+        conn.executemany('INSERT INTO edges VALUES (?,?,?,?,NULL)',
+                         ((genome, kind, source, sink) for source, sink in edgeList))
+    return
+
+def storeSCCDict(conn, genome, mapDict):
+    conn.execute('DELETE FROM sccMembers WHERE genome=?', (genome,))
+    conn.executemany('INSERT INTO sccMembers VALUES (?,?,?)',
+                     ((genome, scc, metab) for scc in mapDict for metab in mapDict[scc]))
+    return
+
+def storeSeeds(conn, genome, seedRows):
+    conn.execute('DELETE FROM seeds WHERE genome=?', (genome,))
+    conn.executemany('INSERT INTO seeds VALUES (?,?,?,?)',
+                     ((genome, metab, name, weight) for metab, name, weight in seedRows))
+    return
+
+def storeGraphStats(conn, genome, graphType, statRow):
+    conn.execute('INSERT OR REPLACE INTO graphStats VALUES (?,?,?,?,?,?)',
+                 (genome, graphType) + tuple(int(x) for x in statRow))
+    return
+
+def storeModelStats(conn, genome, statRow):
+    conn.execute('INSERT OR REPLACE INTO modelStats VALUES (?,?,?,?)',
+                 (genome,) + tuple(int(x) for x in statRow))
+    return
+
+# graphAdjacencyRows
+# Rows of a networkx digraph in the layout of its adjacency list (as written
+# by nx.write_adjlist): each node followed by its successors, or by None if it
+# has none.
+# Input: networkx digraph
+# Output: list of (source, sink) tuples
+
+def graphAdjacencyRows(graph):
+    rowList = []
+    for node in graph.nodes():
+        succList = list(graph.successors(node))
+        if len(succList) == 0:
+            rowList.append((str(node), None))
+        for succ in succList:
+            rowList.append((str(node), str(succ)))
+    return rowList
+
+def storeGraph(conn, genome, kind, graph):
+    storeEdges(conn, genome, kind, graphAdjacencyRows(graph))
+    return
+
+# copyGenomeRows
+# Copy the rows of one genome to another genome with the same fingerprint,
+# the database counterpart of graphFunctions.copyGenomeFiles.
+# Input: connection, source genome, target genome, list of edge kinds,
+# flag to also copy the SCC members and seeds
+# Output: None
+
+def copyGenomeRows(conn, sourceGenome, targetGenome, kindList, copySeeds=False):
+    for kind in kindList:
+        conn.execute('DELETE FROM edges WHERE genome=? AND kind=?', (targetGenome, kind))
+        conn.execute('INSERT INTO edges SELECT ?, kind, source, sink, reaction FROM edges '
+                     'WHERE genome=? AND kind=? ORDER BY rowid', (targetGenome, sourceGenome, kind))
+    if copySeeds:
+        for table, columns in [('sccMembers', 'scc, metabolite'), ('seeds', 'metabolite, name, weight')]:
+            conn.execute('DELETE FROM %s WHERE genome=?' % table, (targetGenome,))
+            conn.execute('INSERT INTO %s SELECT ?, %s FROM %s WHERE genome=? ORDER BY rowid' %
+                         (table, columns, table), (targetGenome, sourceGenome))
+    return
+
+# commitBatch
+# Commit after every 'storeBatchSize' genomes, and after the last genome.
+# Input: connection, number of genomes written so far, total number of genomes
+# Output: None
+
+def commitBatch(conn, count, numGenomes):
+    if count % storeBatchSize == 0 or count == numGenomes:
+        conn.commit()
+    return
+
+################################################################################
+
+# importGenomeFiles
+# Load the per-genome text files of one genome into the database. Files which
+# do not exist (e.g., because a stage has not yet been run) are skipped.
+# Input: connection, genome name, directory containing graph files, directory
+# containing seed compounds
+# Output: list of files which were imported
+
+def importGenomeFiles(conn, genome, processedDataDir, seedDir):
+    importedList = []
+    genomeDir = processedDataDir+'/'+genome+'/'+genome
+
+    for kind in ['adj', 'red', 'scc']:
+        fileName = iof.findFile(genomeDir+edgeFileDict[kind])
+        if os.path.exists(fileName):
+            storeEdges(conn, genome, kind, readAdjacencyFile(fileName))
+            importedList.append(fileName)
+
+    fileName = iof.findFile(genomeDir+edgeFileDict['rxn'])
+    if os.path.exists(fileName):
+        with iof.openFile(fileName) as inFile:
+            rxnEdgeList = [tuple(line.rstrip('\n').split('\t')) for line in inFile if line.strip()]
+        storeEdges(conn, genome, 'rxn', rxnEdgeList)
+        importedList.append(fileName)
+
+    fileName = iof.findFile(genomeDir+'SCCDict.txt')
+    if os.path.exists(fileName):
+        mapDict = {}
+        with iof.openFile(fileName) as inFile:
+            for line in inFile:
+                tokens = line.strip().split(',')
+                if len(tokens) > 1:
+                    mapDict[tokens[0]] = tokens[1:]
+        storeSCCDict(conn, genome, mapDict)
+        importedList.append(fileName)
+
+    fileName = iof.findFile(seedDir+'/'+genome+'/'+genome+'SeedCompounds.txt')
+    if os.path.exists(fileName):
+        with iof.openFile(fileName) as inFile:
+            seedRows = []
+            for line in inFile:
+                tokens = line.rstrip('\n').split('\t')
+                if len(tokens) == 3:
+                    seedRows.append((tokens[0], tokens[1], float(tokens[2])))
+        storeSeeds(conn, genome, seedRows)
+        importedList.append(fileName)
+
+    return importedList
+
+################################################################################
+
+# importSummaryStats
+# Load the summary statistics tables (ModelStatistics.txt and the four graph
+# statistics files) into the database.
+# Input: connection, directory containing the summary statistics
+# Output: None
+
+def importSummaryStats(conn, summaryStatsDir):
+
+    fileName = summaryStatsDir+'/ModelStatistics.txt'
+    if os.path.exists(fileName):
+        statDF = pd.read_csv(fileName, index_col=0)
+        for model, row in statDF.iterrows():
+            storeModelStats(conn, os.path.basename(model), row.values)
+
+    for statFile in statFileDict:
+        fileName = summaryStatsDir+'/'+statFile
+        if os.path.exists(fileName):
+            statDF = pd.read_csv(fileName, index_col=0)
+            for model, row in statDF.iterrows():
+                storeGraphStats(conn, model, statFileDict[statFile], row.values)
+
+    conn.commit()
+    return
+
+################################################################################
+
+# importCollection
+# Load the results for a collection of genomes into the database. Genomes are
+# grouped into transactions of 'batchSize' genomes. If 'removeFiles' is True,
+# the per-genome text files are deleted once their transaction has committed.
+# Input: connection, list of genome directories, directory containing graph
+# files, directory containing seed compounds, directory containing summary
+# statistics (or None), batch size, removeFiles flag
+# Output: None
+
+def importCollection(conn, dirList, processedDataDir, seedDir, summaryStatsDir=None,
+                     batchSize=100, removeFiles=False):
+
+    print 'Importing results into database'
+
+    pendingList = []
+    count = 0
+    for curDir in dirList:
+        pendingList.extend(importGenomeFiles(conn, curDir, processedDataDir, seedDir))
+        count = count + 1
+        if count % batchSize == 0 or count == len(dirList):
+            conn.commit()
+            if removeFiles:
+                for fileName in pendingList:
+                    os.remove(fileName)
+            pendingList = []
+
+    if summaryStatsDir is not None:
+        importSummaryStats(conn, summaryStatsDir)
+
+    return
+
+################################################################################
+
+# loadEdges
+# Retrieve the edges of one kind for one genome as a networkx digraph. Nodes
+# are in the order nx.read_adjlist gives when reading the corresponding file.
+# If 'writtenOrder' is True, they are instead in the order of the graph that
+# was stored (each node of a stored graph has rows of its own, in order).
+# Input: connection, genome name, edge kind ('adj', 'red', 'scc'), flag
+# Output: networkx digraph
+
+def loadEdges(conn, genome, kind, writtenOrder=False):
+    diGraph = nx.DiGraph()
+    if writtenOrder:
+        diGraph.add_nodes_from(str(row[0]) for row in
+                               conn.execute('SELECT source FROM edges WHERE genome=? AND kind=? ORDER BY rowid',
+                                            (genome, kind)))
+    for source, sink in conn.execute('SELECT source, sink FROM edges WHERE genome=? AND kind=? ORDER BY rowid',
+                                     (genome, kind)):
+        if sink is None:
+            diGraph.add_node(str(source))
+        else:
+            diGraph.add_edge(str(source), str(sink))
+    return diGraph
+
+# loadEdgeArrays
+# Equivalent of graphFunctions.readEdgeArrays for edges held in the database.
+# Nodes are interned in order of first appearance, as when reading the
+# corresponding file.
+# Input: connection, genome name, edge kind ('adj', 'red', 'scc')
+# Output: list of node names, and integer numpy arrays of edge sources and sinks
+
+def loadEdgeArrays(conn, genome, kind):
+    nodeIndex = {}
+    nodeList = []
+    sourceList = []
+    sinkList = []
+    for source, sink in conn.execute('SELECT source, sink FROM edges WHERE genome=? AND kind=? ORDER BY rowid',
+                                     (genome, kind)):
+        for node in (source, sink):
+            if node is not None and node not in nodeIndex:
+                nodeIndex[node] = len(nodeList)
+                nodeList.append(str(node))
+        if sink is not None:
+            sourceList.append(nodeIndex[source])
+            sinkList.append(nodeIndex[sink])
+    return nodeList, np.array(sourceList, dtype=int), np.array(sinkList, dtype=int)
+
+################################################################################
+
+# queryResultStore
+# Run an arbitrary query against the database and return a data frame. For
+# example, to retrieve every genome in which a metabolite is a seed:
+#   queryResultStore(conn, 'SELECT genome, weight FROM seeds WHERE metabolite=?', ('cpd00027_c',))
+# Input: connection, SQL statement, optional parameters
+# Output: pandas data frame
+
+def queryResultStore(conn, sql, params=()):
+    return pd.read_sql_query(sql, conn, params=params)
+
+# getGraphStatTable
+# Retrieve the statistics table for one graph type across all genomes, in the
+# same layout as the corresponding summary statistics file.
+# Input: connection, graph type ('graph', 'digraph', 'reducedGraph',
+# 'reducedDigraph')
+# Output: pandas data frame indexed by genome
+
+def getGraphStatTable(conn, graphType):
+    statDF = queryResultStore(conn, 'SELECT genome AS Model, nodes AS Nodes, edges AS Edges, '
+                              'components AS "Total Components", largest AS "Size of Largest" '
+                              'FROM graphStats WHERE graphType=? ORDER BY genome', (graphType,))
+    return statDF.set_index('Model')
+
+################################################################################
+
+# exportResultStore
+# Reproduce the per-genome file layout from the database. Graph files are
+# written to 'processedDataDir' and seed compounds to 'seedDir'. If
+# 'summaryStatsDir' is given, the summary statistics files are also written.
+# Input: connection, output directories, optional list of genomes to export
+# Output: None
+
+def exportResultStore(conn, processedDataDir, seedDir, summaryStatsDir=None, dirList=None):
+
+    print 'Exporting results from database'
+
+    if dirList is None:
+        dirList = [row[0] for row in conn.execute('SELECT DISTINCT genome FROM edges UNION '
+                                                  'SELECT DISTINCT genome FROM seeds ORDER BY 1')]
+
+    for curDir in dirList:
+        if not os.path.exists(processedDataDir+'/'+curDir):
+            os.makedirs(processedDataDir+'/'+curDir)
+        genomeDir = processedDataDir+'/'+curDir+'/'+curDir
+
+# Adjacency list of the full graph, in the tab-delimited layout written by
+# sbmlFunctions.adjacencyListFromModel
+        with iof.openOutput(genomeDir+'AdjList.txt') as outFile:
+            curSource = None
+            for source, sink in conn.execute('SELECT source, sink FROM edges WHERE genome=? AND kind=? ORDER BY rowid',
+                                             (curDir, 'adj')):
+                if source != curSource:
+                    if curSource is not None:
+                        outFile.write('\n')
+                    outFile.write(source+'\t')
+                    curSource = source
+                if sink is not None:
+                    outFile.write(sink+'\t')
+            if curSource is not None:
+                outFile.write('\n')
+
+        with iof.openOutput(genomeDir+'RxnEdges.txt') as outFile:
+            for source, sink, rxn in conn.execute('SELECT source, sink, reaction FROM edges WHERE genome=? AND kind=? ORDER BY rowid',
+                                                  (curDir, 'rxn')):
+                outFile.write(source+'\t'+sink+'\t'+rxn+'\n')
+
+# Reduced graph and condensation, written in the configured formats (see
+# ioFunctions.writeGraph)
+        redDiGraph = loadEdges(conn, curDir, 'red', writtenOrder=True)
+        if redDiGraph.number_of_nodes() > 0:
+            iof.writeGraph(redDiGraph, genomeDir+'Red', requiredFormats=['adjlist'])
+
+        sccDiGraph = loadEdges(conn, curDir, 'scc', writtenOrder=True)
+        if sccDiGraph.number_of_nodes() > 0:
+            iof.writeGraph(sccDiGraph, genomeDir+'SCC', requiredFormats=['adjlist'])
+
+        mapDict = {}
+        for scc, metab in conn.execute('SELECT scc, metabolite FROM sccMembers WHERE genome=? ORDER BY rowid',
+                                       (curDir,)):
+            mapDict.setdefault(scc, []).append(metab)
+        if len(mapDict) > 0:
+            with iof.openOutput(genomeDir+'SCCDict.txt') as dictFile:
+                for key in mapDict.keys():
+                    dictFile.write(str(key)+',')
+                    dictFile.write(",".join(str(value) for value in mapDict[key]))
+                    dictFile.write('\n')
+
+        seedRows = conn.execute('SELECT metabolite, name, weight FROM seeds WHERE genome=? ORDER BY rowid',
+                                (curDir,)).fetchall()
+        if len(seedRows) > 0:
+            if not os.path.exists(seedDir+'/'+curDir):
+                os.makedirs(seedDir+'/'+curDir)
+            with iof.openOutput(seedDir+'/'+curDir+'/'+curDir+'SeedCompounds.txt') as seedFile:
+                for metab, name, weight in seedRows:
+                    seedFile.write('%s\t%s\t%f\n' % (metab, name, weight))
+
+    if summaryStatsDir is not None:
+        if not os.path.exists(summaryStatsDir):
+            os.makedirs(summaryStatsDir)
+        for statFile in statFileDict:
+            statDF = getGraphStatTable(conn, statFileDict[statFile])
+            if len(statDF) > 0:
+                with open(summaryStatsDir+'/'+statFile, 'w') as outFile:
+                    outFile.write('Model,Nodes,Edges,Total Components,Size of Largest\n')
+                    for model, row in statDF.iterrows():
+                        outFile.write('%s,%i,%i,%i,%i\n' % ((model,) + tuple(row.values)))
+        modelRows = conn.execute('SELECT genome, genes, metabolites, reactions FROM modelStats ORDER BY genome').fetchall()
+        if len(modelRows) > 0:
+            with open(summaryStatsDir+'/ModelStatistics.txt', 'w') as outFile:
+                outFile.write('Model,Genes,Metabolites,Reactions\n')
+                for row in modelRows:
+                    outFile.write('%s,%i,%i,%i\n' % ((processedDataDir+'/'+row[0],) + tuple(row[1:])))
+
+    return
@@ -23,5 +23,6 @@ setup(name='reverseEcology',
           'networkx>=1.11',
           'numpy',
           'pandas',
+          'scipy',
           ],
       include_package_data=True)